@@ -1,3 +1,8 @@
-from django.test import TestCase
+from django.urls import reverse
+from delivery.benchmarks import ViewBudgetTestCase
 
-# Create your tests here.
+
+class DashboardQueryBudgetTests(ViewBudgetTestCase):
+    def test_dashboard(self):
+        self.client.force_login(self.user)
+        self.assertBudget('dashboard', 9, lambda: self.client.get(reverse('dashboard')))
@@ -2,8 +2,9 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Prefetch
 from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm
-from delivery.models import Package
+from delivery.models import Package, TrackingEvent
 
 
 def register(request):
@@ -63,11 +64,20 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """User dashboard showing sent and received packages"""
-    # Get packages sent by user
-    sent_packages = Package.objects.filter(sender_user=request.user).order_by('-created_at')
+    # Tracking histories are rendered with their location names
+    history = Prefetch('tracking_events', queryset=TrackingEvent.objects.select_related('location'))
+
+    # Get packages sent by user; each card names the other party
+    sent_packages = (
+        Package.objects.filter(sender_user=request.user).select_related('receiver')
+        .prefetch_related(history).order_by('-created_at')
+    )
     
     # Get packages received by user (match by email)
-    received_packages = Package.objects.filter(receiver_user=request.user).order_by('-created_at')
+    received_packages = (
+        Package.objects.filter(receiver_user=request.user).select_related('sender')
+        .prefetch_related(history).order_by('-created_at')
+    )
     
     # Calculate statistics
     total_sent = sent_packages.count()
@@ -1,5 +1,35 @@
-from django.contrib import admin
-from .models import Customer, Package, TrackingEvent
+import re
+
+from django.contrib import admin, messages
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db.models import Case, IntegerField, When
+from django.db.models.functions import Upper
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.html import format_html
+from .bulk import bulk_update_payment_status, bulk_update_status
+from .eta import eta_engine
+from .exports import EXPORT_FORMATS, stream_packages
+from .forms import PackageAdminForm, UpdateTrackingForm
+from .images import stage_upload
+from .api_auth import key_cache
+from .models import (
+    ApiKey, Courier, Customer, DailyRevenueFact, GeocodedAddress, Location, Package, PickupSlot, TrackingEvent,
+    WebhookEvent, WebhookSubscription,
+)
+from .notifications import queue_status_notifications
+from .pagination import EstimatedCountPaginator
+from .pickups import forget as forget_pickup_slot
+from .search import get_search_backend
+from .tasks import process_image
+from .webhooks import queue_webhook_events
+
+
+TRACKING_NUMBER_RE = re.compile(r'^[A-Z0-9]{12}$')
+PHONE_NUMBER_RE = re.compile(r'^\+?[\d\s().-]+$')
 
 
 class TrackingEventInline(admin.TabularInline):
@@ -7,24 +37,100 @@ class TrackingEventInline(admin.TabularInline):
     model = TrackingEvent
     extra = 1
     fields = ['status', 'location', 'notes', 'timestamp']
+    autocomplete_fields = ['location']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('location')
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    """Admin configuration for interned hubs and scan locations"""
+    list_display = ['name', 'is_hub', 'latitude', 'longitude', 'created_at']
+    list_filter = ['is_hub']
+    search_fields = ['^name']
+    readonly_fields = ['created_at']
+
+
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    """Admin configuration for the local geocoding table used by route planning"""
+    list_display = ['address', 'latitude', 'longitude']
+    search_fields = ['address']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(PickupSlot)
+class PickupSlotAdmin(admin.ModelAdmin):
+    """Admin configuration for pickup capacity; slots are created at the default capacity as they are booked"""
+    list_display = ['area', 'date', 'window', 'capacity', 'booked']
+    list_editable = ['capacity']
+    list_filter = ['window', 'date']
+    search_fields = ['=area']
+    readonly_fields = ['booked']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        forget_pickup_slot(obj)
+
+
+@admin.register(Courier)
+class CourierAdmin(admin.ModelAdmin):
+    """Admin configuration for couriers; a blank zone helps out wherever a zone runs short"""
+    list_display = ['name', 'zone', 'capacity', 'is_active', 'created_at']
+    list_editable = ['capacity', 'is_active']
+    list_filter = ['is_active', 'zone']
+    search_fields = ['name', '=zone']
+    raw_id_fields = ['user']
+    readonly_fields = ['created_at']
 
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     """Admin configuration for Customer model"""
     list_display = ['name', 'email', 'phone', 'created_at']
-    search_fields = ['name', 'email', 'phone']
+    search_fields = ['=email', '=phone']
+    search_help_text = "Start of a name, or an exact email or phone number"
     list_filter = ['created_at']
     readonly_fields = ['created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # A '^name' search compiles to LIKE, which SQLite never answers from
+        # customer_name_upper_idx, so name prefixes are matched as a range
+        # over the same Upper('name') expression the index holds.
+        term = search_term.strip()
+        if not term or '@' in term or PHONE_NUMBER_RE.match(term):
+            return super().get_search_results(request, queryset, search_term)
+        prefix = term.upper()
+        matches = queryset.annotate(name_upper=Upper('name')).filter(
+            name_upper__gte=prefix, name_upper__lt=prefix + '\U0010ffff'
+        )
+        return matches, False
 
 
 @admin.register(Package)
 class PackageAdmin(admin.ModelAdmin):
     """Admin configuration for Package model"""
-    list_display = ['tracking_number', 'sender', 'receiver', 'service_tier', 'price', 'status', 'payment_status', 'created_at']
-    search_fields = ['tracking_number', 'sender__name', 'receiver__name', 'sender_user__username']
+    form = PackageAdminForm
+    list_display = ['thumbnail', 'tracking_number', 'sender', 'receiver', 'service_tier', 'price', 'status', 'payment_status', 'created_at']
+    list_display_links = ['tracking_number']
+    list_select_related = ['sender', 'receiver']
+    # Only the username lookup runs here; everything else is answered by the search backend.
+    search_fields = ['=sender_user__username']
+    search_help_text = (
+        "Tracking number, description, or a sender/receiver name, email, phone or address "
+        "(words may be partial); best matches first. Falls back to an exact username."
+    )
     list_filter = ['status', 'service_tier', 'payment_status', 'created_at']
-    readonly_fields = ['tracking_number', 'price', 'created_at', 'updated_at']
+    readonly_fields = ['tracking_number', 'price', 'thumbnail', 'pickup_slot', 'created_at', 'updated_at']
+    raw_id_fields = ['sender', 'receiver', 'sender_user', 'receiver_user', 'pickup_courier', 'delivery_courier']
+    autocomplete_fields = ['current_location']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['update_status', 'mark_paid', 'mark_refunded', 'export_csv', 'export_ndjson']
     inlines = [TrackingEventInline]
     fieldsets = (
         ('Package Information', {
@@ -34,7 +140,13 @@ class PackageAdmin(admin.ModelAdmin):
             'fields': ('sender', 'sender_user', 'receiver', 'receiver_user')
         }),
         ('Status & Location', {
-            'fields': ('status', 'current_location', 'estimated_delivery')
+            'fields': ('status', 'current_location', 'estimated_delivery', 'pickup_slot')
+        }),
+        ('Couriers', {
+            'fields': ('pickup_courier', 'delivery_courier')
+        }),
+        ('Image', {
+            'fields': ('package_image', 'thumbnail')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -42,14 +154,209 @@ class PackageAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.display(description="Image")
+    def thumbnail(self, obj):
+        if not obj.package_thumbnail:
+            return ""
+        return format_html(
+            '<img src="{}" alt="" loading="lazy" style="height: 48px; border-radius: 4px;">',
+            obj.package_thumbnail.url
+        )
+
+    def save_model(self, request, obj, form, change):
+        # Uploads go through the same staging and re-encoding as the site's.
+        if 'package_image' in form.changed_data:
+            upload = form.cleaned_data.get('package_image')
+            if upload:
+                obj.package_image, obj.package_thumbnail = stage_upload(upload)
+            else:
+                obj.package_thumbnail = None
+        if not change and not obj.estimated_delivery and obj.status != 'delivered':
+            obj.estimated_delivery = eta_engine.estimate_package(obj).date
+        super().save_model(request, obj, form, change)
+        if obj.package_image and not obj.package_thumbnail:
+            process_image.enqueue(obj.pk)
+        if change and 'status' in form.changed_data:
+            now = timezone.now()
+            location = obj.current_location.name if obj.current_location else ''
+            queue_status_notifications([(obj.pk, obj.receiver.email, obj.status, location, '', now)])
+            queue_webhook_events([(obj.pk, obj.status, location, '', now)])
+
+    def get_search_results(self, request, queryset, search_term):
+        # Tracking-number-shaped terms are answered from the unique index
+        # before asking the search backend, which ranks at most
+        # SEARCH_ADMIN_MAX_RESULTS matches.
+        term = search_term.strip().upper()
+        if TRACKING_NUMBER_RE.match(term):
+            matches = queryset.filter(tracking_number=term)
+            if matches.exists():
+                return matches, False
+        if not search_term.strip():
+            return queryset, False
+        ids = get_search_backend().search(search_term, limit=settings.SEARCH_ADMIN_MAX_RESULTS).ids
+        if not ids:
+            return super().get_search_results(request, queryset, search_term)
+        matches = queryset.filter(pk__in=ids)
+        if ORDER_VAR not in request.GET:
+            # Keep the backend's ranking unless a column header was clicked.
+            matches = matches.order_by(Case(
+                *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+                output_field=IntegerField()
+            ))
+        return matches, False
+
+    @admin.action(description="Update status/location of selected packages", permissions=['change'])
+    def update_status(self, request, queryset):
+        """Set a new status and location on every selected package"""
+        if 'apply' in request.POST:
+            form = UpdateTrackingForm(request.POST)
+            if form.is_valid():
+                updated = bulk_update_status(
+                    queryset,
+                    form.cleaned_data['status'],
+                    form.cleaned_data['current_location'],
+                    form.cleaned_data['notes']
+                )
+                self.message_user(request, f"Updated tracking for {updated} package(s).", messages.SUCCESS)
+                return None
+        else:
+            form = UpdateTrackingForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Update package status",
+            'opts': self.model._meta,
+            'form': form,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        }
+        return TemplateResponse(request, 'admin/delivery/package/update_status.html', context)
+
+    @admin.action(description="Mark selected packages as paid", permissions=['change'])
+    def mark_paid(self, request, queryset):
+        updated = bulk_update_payment_status(queryset, 'pending', 'paid')
+        self.message_user(request, f"Marked {updated} package(s) as paid.", messages.SUCCESS)
+
+    @admin.action(description="Refund selected paid packages", permissions=['change'])
+    def mark_refunded(self, request, queryset):
+        updated = bulk_update_payment_status(queryset, 'paid', 'refunded')
+        self.message_user(request, f"Refunded {updated} package(s).", messages.SUCCESS)
+
+    def _export_response(self, queryset, fmt):
+        content_type, extension = EXPORT_FORMATS[fmt]
+        filename = f"packages-{timezone.now():%Y%m%d-%H%M%S}.{extension}.gz"
+        response = StreamingHttpResponse(
+            stream_packages(queryset, fmt=fmt, compress=True),
+            content_type='application/gzip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description="Export selected packages as CSV (gzip)", permissions=['view'])
+    def export_csv(self, request, queryset):
+        return self._export_response(queryset, 'csv')
+
+    @admin.action(description="Export selected packages as NDJSON (gzip)", permissions=['view'])
+    def export_ndjson(self, request, queryset):
+        return self._export_response(queryset, 'ndjson')
+
 
 @admin.register(TrackingEvent)
 class TrackingEventAdmin(admin.ModelAdmin):
     """Admin configuration for TrackingEvent model"""
     list_display = ['package', 'status', 'location', 'timestamp']
-    search_fields = ['package__tracking_number', 'location']
+    list_select_related = ['package', 'location']
+    search_fields = ['=package__tracking_number', '^location__name']
+    search_help_text = "Exact tracking number or the start of a location"
     list_filter = ['status', 'timestamp']
     readonly_fields = ['timestamp']
+    raw_id_fields = ['package']
+    autocomplete_fields = ['location']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().upper()
+        if TRACKING_NUMBER_RE.match(term):
+            matches = queryset.filter(package__tracking_number=term)
+            if matches.exists():
+                return matches, False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(ApiKey)
+class ApiKeyAdmin(admin.ModelAdmin):
+    """Admin configuration for partner API keys"""
+    list_display = ['name', 'prefix', 'scopes', 'rate_limit', 'burst', 'is_active', 'request_count', 'last_used_at']
+    search_fields = ['name', '=prefix']
+    list_filter = ['is_active']
+    readonly_fields = ['prefix', 'request_count', 'last_used_at', 'created_at']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            raw_key = obj.generate_key()
+            self.message_user(
+                request,
+                f"API key for {obj.name}: {raw_key} (copy it now, it will not be shown again)",
+                messages.WARNING
+            )
+        super().save_model(request, obj, form, change)
+        key_cache.clear()
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    """Admin configuration for partner webhook endpoints"""
+    list_display = ['api_key', 'url', 'is_active', 'created_at']
+    list_select_related = ['api_key']
+    list_filter = ['is_active']
+    search_fields = ['url', 'api_key__name']
+    raw_id_fields = ['api_key']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            self.message_user(request, f"Signing secret for {obj.url}: {obj.secret}", messages.WARNING)
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Admin configuration for pending and dead-lettered webhook events"""
+    list_display = ['pk', 'subscription', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_select_related = ['subscription__api_key']
+    list_filter = ['status']
+    readonly_fields = ['subscription', 'payload', 'attempts', 'locked_until', 'locked_by', 'last_error', 'created_at']
+    actions = ['retry']
+
+    @admin.action(description="Retry selected events now")
+    def retry(self, request, queryset):
+        updated = queryset.update(
+            status=WebhookEvent.STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            locked_until=None,
+            locked_by='',
+            last_error=''
+        )
+        self.message_user(request, f"{updated} webhook events queued for retry.")
+
+
+@admin.register(DailyRevenueFact)
+class DailyRevenueFactAdmin(admin.ModelAdmin):
+    """Read-only view of the daily revenue facts, maintained from package changes"""
+    list_display = ['day', 'service_tier', 'payment_status', 'packages', 'revenue']
+    list_filter = ['service_tier', 'payment_status']
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 # Customize admin site header and title
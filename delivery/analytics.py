@@ -0,0 +1,187 @@
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from .counters import increment
+from .models import HubDwellTime, HubHourlyVolume, Location, Package, RollupCursor, TrackingEvent
+
+HUB_ROLLUP = 'hub-analytics'
+
+# Upper bounds in hours of the dwell-time histogram buckets; the last bucket is open-ended.
+DWELL_BUCKETS = [1, 2, 4, 8, 12, 24, 48, 72, 168]
+DWELL_BUCKET_LABELS = (
+    [f'< {DWELL_BUCKETS[0]}h']
+    + [f'{low}-{high}h' for low, high in zip(DWELL_BUCKETS, DWELL_BUCKETS[1:])]
+    + [f'≥ {DWELL_BUCKETS[-1]}h']
+)
+
+# Statuses in the order a package normally passes through them.
+FUNNEL = [status for status, _ in Package.STATUS_CHOICES]
+
+
+def truncate_hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def dwell_bucket(seconds):
+    return bisect.bisect_right(DWELL_BUCKETS, seconds / 3600)
+
+
+def _last_scans(package_ids, before_pk):
+    """Each package's latest (timestamp, location_id) among events below ``before_pk``"""
+    latest = (
+        TrackingEvent.objects.filter(package_id__in=package_ids, pk__lt=before_pk)
+        .order_by().values('package_id').annotate(last_pk=Max('pk')).values_list('last_pk', flat=True)
+    )
+    return {
+        package_id: (timestamp, location_id)
+        for package_id, timestamp, location_id in TrackingEvent.objects.filter(pk__in=list(latest))
+        .values_list('package_id', 'timestamp', 'location_id')
+    }
+
+
+def update_rollups(chunk_size=None):
+    """
+    Fold the next chunk of tracking events into the hub rollups.
+
+    Events are read in primary key order above the cursor's high-water mark,
+    so every event is counted once however often this runs. A package's dwell
+    time at a location is the time from its scan there to its next scan,
+    counted in the hour of that next scan. Returns the number of events
+    folded in; 0 means the rollups are up to date or another process just
+    folded the same chunk.
+    """
+    chunk_size = chunk_size or settings.ANALYTICS_ROLLUP_CHUNK_SIZE
+    cursor, _ = RollupCursor.objects.get_or_create(name=HUB_ROLLUP)
+    events = list(
+        TrackingEvent.objects.filter(pk__gt=cursor.high_water_id).order_by('pk')
+        .values_list('pk', 'package_id', 'location_id', 'status', 'timestamp')[:chunk_size]
+    )
+    if not events:
+        return 0
+
+    volumes = defaultdict(lambda: {'events': 0})
+    dwells = defaultdict(lambda: {'departures': 0, 'dwell_seconds': 0})
+    last_scan = _last_scans({event[1] for event in events}, events[0][0])
+    for pk, package_id, location_id, status, timestamp in events:
+        hour = truncate_hour(timestamp)
+        volumes[(hour, location_id, status)]['events'] += 1
+        previous = last_scan.get(package_id)
+        if previous is not None:
+            seconds = max(0, int((timestamp - previous[0]).total_seconds()))
+            dwell = dwells[(hour, previous[1], dwell_bucket(seconds))]
+            dwell['departures'] += 1
+            dwell['dwell_seconds'] += seconds
+        last_scan[package_id] = (timestamp, location_id)
+
+    with transaction.atomic():
+        # Advancing the cursor first takes the lock that serialises updaters,
+        # so each chunk is added exactly once.
+        claimed = RollupCursor.objects.filter(pk=cursor.pk, high_water_id=cursor.high_water_id).update(
+            high_water_id=events[-1][0], updated_at=timezone.now()
+        )
+        if not claimed:
+            return 0
+        increment(HubHourlyVolume, ['hour', 'location', 'status'], volumes)
+        increment(HubDwellTime, ['hour', 'location', 'bucket'], dwells)
+    return len(events)
+
+
+def reset_rollups():
+    """Forget all rollup rows so the next updates rebuild them from the first event"""
+    with transaction.atomic():
+        RollupCursor.objects.filter(name=HUB_ROLLUP).delete()
+        HubHourlyVolume.objects.all().delete()
+        HubDwellTime.objects.all().delete()
+
+
+def rollup_status():
+    """The cursor position and how many events are still to be folded in"""
+    cursor = RollupCursor.objects.filter(name=HUB_ROLLUP).first()
+    high_water_id = cursor.high_water_id if cursor else 0
+    return {
+        'high_water_id': high_water_id,
+        'updated_at': cursor.updated_at if cursor else None,
+        'pending_events': TrackingEvent.objects.filter(pk__gt=high_water_id).count(),
+    }
+
+
+def hub_summary(hours=24, location_id=None, now=None):
+    """
+    Scan volumes, dwell times and the status funnel over the last ``hours``, read from the rollups only.
+
+    With ``location_id`` the funnel and hourly series cover that location
+    alone; the per-hub tables always list every location with activity.
+    """
+    now = now or timezone.now()
+    since = truncate_hour(now) - timedelta(hours=hours - 1)
+    volumes = HubHourlyVolume.objects.filter(hour__gte=since)
+    dwells = HubDwellTime.objects.filter(hour__gte=since)
+
+    hubs = {}
+
+    def hub_for(pk):
+        return hubs.setdefault(pk, {
+            'location_id': pk, 'events': 0, 'by_status': dict.fromkeys(FUNNEL, 0),
+            'departures': 0, 'dwell_seconds': 0, 'dwell_histogram': [0] * len(DWELL_BUCKET_LABELS),
+        })
+
+    for pk, status, events in (
+        volumes.order_by().values('location_id', 'status').annotate(total=Sum('events'))
+        .values_list('location_id', 'status', 'total')
+    ):
+        hub = hub_for(pk)
+        hub['events'] += events
+        hub['by_status'][status] = events
+    for pk, bucket, departures, seconds in (
+        dwells.order_by().values('location_id', 'bucket')
+        .annotate(total=Sum('departures'), seconds=Sum('dwell_seconds'))
+        .values_list('location_id', 'bucket', 'total', 'seconds')
+    ):
+        hub = hub_for(pk)
+        hub['departures'] += departures
+        hub['dwell_seconds'] += seconds
+        hub['dwell_histogram'][bucket] += departures
+
+    names = dict(Location.objects.filter(pk__in=hubs).values_list('pk', 'name'))
+    for hub in hubs.values():
+        hub['location'] = names.get(hub['location_id'], '')
+        hub['mean_dwell_hours'] = (
+            round(hub['dwell_seconds'] / hub['departures'] / 3600, 2) if hub['departures'] else None
+        )
+        del hub['dwell_seconds']
+
+    if location_id is not None:
+        volumes = volumes.filter(location_id=location_id)
+        selected = [hubs[location_id]] if location_id in hubs else []
+    else:
+        selected = hubs.values()
+    totals = {status: sum(hub['by_status'][status] for hub in selected) for status in FUNNEL}
+    funnel = []
+    for i, status in enumerate(FUNNEL):
+        count = totals[status]
+        previous = totals[FUNNEL[i - 1]] if i else None
+        funnel.append({
+            'status': status,
+            'label': Package.STATUS_LABELS[status],
+            'events': count,
+            'conversion': round(count / previous, 4) if previous else None,
+        })
+    hourly = [
+        {'hour': hour.isoformat(), 'events': events}
+        for hour, events in volumes.order_by('hour').values('hour').annotate(total=Sum('events'))
+        .values_list('hour', 'total')
+    ]
+
+    return {
+        'since': since.isoformat(),
+        'hours': hours,
+        'location_id': location_id,
+        'dwell_buckets': DWELL_BUCKET_LABELS,
+        'hubs': sorted(hubs.values(), key=lambda hub: hub['events'], reverse=True),
+        'funnel': funnel,
+        'hourly': hourly,
+    }
@@ -0,0 +1,231 @@
+import atexit
+import hmac
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+from .models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+ALL_SCOPES = frozenset(scope for scope, _ in ApiKey.SCOPE_CHOICES)
+
+# Snapshot of an ApiKey row that is safe to share between requests.
+VerifiedKey = namedtuple('VerifiedKey', ['id', 'name', 'scopes', 'rate_limit', 'burst'])
+
+
+class KeyCache:
+    """
+    In-process TTL cache of verified keys, keyed by the hash of the raw key.
+
+    A hit costs one hash and one dict lookup, no query. Unknown keys are
+    cached too (for a shorter time) so repeated bad keys do not reach the
+    database either. Deactivating a key takes effect within the TTL. When
+    full, expired entries are dropped first, then the oldest tenth, so a
+    flood of bad keys cannot flush the verified ones all at once.
+    """
+    max_entries = 10000
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key_hash):
+        entry = self._entries.get(key_hash)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def set(self, key_hash, verified, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key_hash, None)
+            if len(self._entries) >= self.max_entries:
+                for stale in [entry_key for entry_key, (_, expires) in self._entries.items() if expires < now]:
+                    del self._entries[stale]
+            if len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order, so the first entries are the oldest.
+                for oldest in list(self._entries)[:max(1, self.max_entries // 10)]:
+                    del self._entries[oldest]
+            self._entries[key_hash] = (verified, now + ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+key_cache = KeyCache()
+
+
+def verify_api_key(raw_key):
+    """Return a VerifiedKey for a raw API key, or None if it is unknown or inactive"""
+    key_hash = ApiKey.hash_key(raw_key)
+    hit, verified = key_cache.get(key_hash)
+    if hit:
+        return verified
+
+    verified = None
+    prefix = ApiKey.parse_prefix(raw_key)
+    if prefix:
+        api_key = ApiKey.objects.filter(prefix=prefix, is_active=True).first()
+        if api_key and hmac.compare_digest(api_key.key_hash, key_hash):
+            verified = VerifiedKey(
+                id=api_key.pk,
+                name=api_key.name,
+                scopes=api_key.get_scopes(),
+                rate_limit=api_key.rate_limit,
+                burst=api_key.burst,
+            )
+    ttl = settings.API_KEY_CACHE_TTL if verified else settings.API_KEY_NEGATIVE_CACHE_TTL
+    key_cache.set(key_hash, verified, ttl)
+    return verified
+
+
+def legacy_server_key(raw_key):
+    """Accept the single SERVER-KEY environment key that predates per-partner keys"""
+    server_key = os.getenv('SERVER-KEY')
+    if server_key and hmac.compare_digest(raw_key.encode(), server_key.encode()):
+        return VerifiedKey(id=None, name='SERVER-KEY', scopes=ALL_SCOPES, rate_limit=None, burst=None)
+    return None
+
+
+class WindowRateLimiter:
+    """
+    Sliding-window rate limiter whose counters live in a Django cache.
+
+    A key may make ``burst`` requests in any window of ``burst /
+    rate_limit`` minutes, which averages out at ``rate_limit`` a minute.
+    Requests are counted per fixed window, and a request is allowed while
+    the current window's count plus the previous window's count, weighted
+    by how much of it the sliding window still covers, stays within
+    ``burst``, so a burst straddling a window boundary is limited as well.
+    Each request is one atomic cache.add() or cache.incr() on the current
+    counter, so concurrent requests never share the last slot; rejected
+    requests are taken back off it. API_RATELIMIT_CACHE must be shared by
+    every gunicorn worker, or each worker grants the limit on its own.
+    """
+
+    def allow(self, key):
+        """Count a request for the key; return (allowed, seconds until one would be allowed)"""
+        cache = caches[settings.API_RATELIMIT_CACHE]
+        window = key.burst * 60.0 / key.rate_limit if key.rate_limit and key.burst else 60.0
+        number, elapsed = divmod(time.time() / window, 1)
+        cache_key = f'api-ratelimit:{key.id}:{int(number)}'
+        # Each counter is read again as the previous window during the next one.
+        timeout = math.ceil(2 * window) + 1
+
+        if cache.add(cache_key, 1, timeout):
+            count = 1
+        else:
+            try:
+                count = cache.incr(cache_key)
+            except ValueError:
+                # Expired between the two calls.
+                cache.add(cache_key, 1, timeout)
+                count = 1
+        previous = cache.get(f'api-ratelimit:{key.id}:{int(number) - 1}', 0)
+        if previous * (1 - elapsed) + count <= key.burst:
+            return True, 0
+        try:
+            cache.decr(cache_key)
+        except ValueError:
+            pass
+        return False, self._windows_to_wait(key.burst, previous, count - 1, elapsed) * window
+
+    @staticmethod
+    def _windows_to_wait(burst, previous, current, elapsed):
+        """Windows until one more request fits, if no other requests arrive"""
+        if current < burst:
+            # Only the previous window's share has to fade.
+            return 1 - (burst - current - 1) / previous - elapsed
+        if burst < 1:
+            return 1 - elapsed
+        # Wait for the next window, then for this window's share to fade.
+        return 2 - elapsed - (burst - 1) / current
+
+
+rate_limiter = WindowRateLimiter()
+
+
+class UsageRecorder:
+    """
+    Counts requests per key in memory and writes them to ApiKey in batches.
+
+    Pending counts are flushed with one UPDATE per key once
+    API_USAGE_FLUSH_INTERVAL seconds have passed, and at interpreter exit.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, key_id):
+        with self._lock:
+            self._pending[key_id] = self._pending.get(key_id, 0) + 1
+            due = time.monotonic() - self._last_flush >= settings.API_USAGE_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        now = timezone.now()
+        try:
+            for key_id, count in pending.items():
+                ApiKey.objects.filter(pk=key_id).update(
+                    request_count=F('request_count') + count,
+                    last_used_at=now
+                )
+        except DatabaseError:
+            logger.exception("Failed to flush API key usage counters")
+
+
+usage_recorder = UsageRecorder()
+atexit.register(usage_recorder.flush)
+
+
+def _error(message, status):
+    return JsonResponse({'success': False, 'error': message}, status=status)
+
+
+def require_api_key(scope):
+    """Decorator requiring an API-KEY header for a key with the given scope, under its rate limit"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            raw_key = request.headers.get('API-KEY')
+            if not raw_key:
+                return _error('Authentication failed: API-KEY header is required', 401)
+
+            key = verify_api_key(raw_key) or legacy_server_key(raw_key)
+            if key is None:
+                return _error('Authentication failed: Invalid API-KEY', 403)
+            if scope not in key.scopes:
+                return _error(f'Authentication failed: API-KEY lacks the "{scope}" scope', 403)
+
+            if key.id is not None:
+                allowed, retry_after = rate_limiter.allow(key)
+                if not allowed:
+                    response = _error('Rate limit exceeded', 429)
+                    response['Retry-After'] = str(math.ceil(retry_after))
+                    return response
+                usage_recorder.record(key.id)
+
+            request.api_key = key
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+    return decorator
@@ -1,46 +1,22 @@
-import os
 import json
-from functools import wraps
+from django.conf import settings
 from django.http import JsonResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from .models import Package, Customer, TrackingEvent
-from decimal import Decimal
-
-
-def require_api_key(view_func):
-    """Decorator to validate API-KEY header against SERVER-KEY env variable"""
-    @wraps(view_func)
-    def wrapper(request, *args, **kwargs):
-        api_key = request.headers.get('API-KEY')
-        server_key = os.getenv('SERVER-KEY')
-        
-        if not server_key:
-            return JsonResponse({
-                'success': False,
-                'error': 'Server configuration error: SERVER-KEY not configured'
-            }, status=500)
-        
-        if not api_key:
-            return JsonResponse({
-                'success': False,
-                'error': 'Authentication failed: API-KEY header is required'
-            }, status=401)
-        
-        if api_key != server_key:
-            return JsonResponse({
-                'success': False,
-                'error': 'Authentication failed: Invalid API-KEY'
-            }, status=403)
-        
-        return view_func(request, *args, **kwargs)
-    
-    return wrapper
+from .api_auth import require_api_key
+from .eta import eta_engine
+from .locations import resolve_location
+from .models import Package, Customer, normalize_location_name
+from .pricing import MAX_WEIGHT, tariff_engine
+from .tasks import record_tracking_event
+from .tracking_filter import tracking_filter
+from decimal import Decimal, InvalidOperation
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-@require_api_key
+@require_api_key('create')
 def create_package_api(request):
     """
     API endpoint to create a package
@@ -109,21 +85,24 @@ def create_package_api(request):
         )
         
         # Create package
+        service_tier = data.get('service_tier', 'standard')
+        current_location = normalize_location_name(data.get('current_location', 'Processing Center'))
+        estimate = eta_engine.estimate(sender.address, receiver.address, service_tier)
         package = Package.objects.create(
             sender=sender,
             receiver=receiver,
             description=data['description'],
             weight=Decimal(str(data['weight'])),
-            service_tier=data.get('service_tier', 'standard'),
-            current_location=data.get('current_location', 'Processing Center')
+            service_tier=service_tier,
+            current_location_id=resolve_location(current_location),
+            estimated_delivery=estimate.date,
+            api_key_id=request.api_key.id
         )
         
-        # Create initial tracking event
-        TrackingEvent.objects.create(
-            package=package,
-            status='pending',
-            location=package.current_location,
-            notes='Package created via API'
+        # Initial tracking event, written by the task worker
+        record_tracking_event.enqueue(
+            package.pk, 'pending', current_location, 'Package created via API',
+            timezone.now().isoformat()
         )
         
         # Prepare response
@@ -137,8 +116,12 @@ def create_package_api(request):
                 'service_tier': package.service_tier,
                 'price': str(package.price),
                 'payment_status': package.payment_status,
-                'current_location': package.current_location,
-                'estimated_delivery': package.estimated_delivery.isoformat() if package.estimated_delivery else None,
+                'current_location': current_location,
+                'estimated_delivery': package.estimated_delivery.isoformat(),
+                'estimated_delivery_range': {
+                    'earliest': estimate.earliest.isoformat(),
+                    'latest': estimate.latest.isoformat()
+                },
                 'sender': {
                     'name': sender.name,
                     'email': sender.email,
@@ -172,21 +155,95 @@ def create_package_api(request):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_api_key('bulk')
+def quote_api(request):
+    """
+    API endpoint to price packages before creating them
+
+    Expected JSON payload, with up to QUOTE_MAX_ITEMS items:
+    {
+        "items": [
+            {"weight": 2.5, "service_tier": "express"},
+            {"weight": "0.75"}  // service_tier defaults to standard
+        ]
+    }
+    Prices are returned in the order of the items, with their total.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'success': False, 'error': 'items must be a non-empty list'}, status=400)
+    if len(items) > settings.QUOTE_MAX_ITEMS:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {settings.QUOTE_MAX_ITEMS} items can be quoted per request'
+        }, status=400)
+
+    weights, tiers = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or 'weight' not in item:
+            return JsonResponse({'success': False, 'error': f'Item {index}: weight is required'}, status=400)
+        try:
+            weight = Decimal(str(item['weight']))
+        except InvalidOperation:
+            weight = None
+        if weight is None or not weight.is_finite() or not 0 < weight <= MAX_WEIGHT:
+            return JsonResponse({
+                'success': False,
+                'error': f'Item {index}: weight must be a number of kg between 0 and {MAX_WEIGHT}'
+            }, status=400)
+        tier = item.get('service_tier', 'standard')
+        if not isinstance(tier, str) or not tariff_engine.is_known_tier(tier):
+            return JsonResponse({'success': False, 'error': f'Item {index}: unknown service_tier'}, status=400)
+        weights.append(weight)
+        tiers.append(tier)
+
+    cents = tariff_engine.quote_cents(weights, tiers)
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'currency': 'USD',
+            'quotes': [
+                {'weight': str(weight), 'service_tier': tier, 'price': str(Decimal(int(price)).scaleb(-2))}
+                for weight, tier, price in zip(weights, tiers, cents)
+            ],
+            'total': str(Decimal(int(cents.sum())).scaleb(-2)),
+        }
+    })
+
+
 @require_http_methods(["GET"])
-@require_api_key
+@require_api_key('track')
 def track_package_api(request, tracking_number):
     """
     API endpoint to track a package
     
     URL: /api/track/<tracking_number>/
     """
+    if not tracking_filter.might_exist(tracking_number):
+        return JsonResponse({
+            'success': False,
+            'error': f'Package with tracking number {tracking_number} not found'
+        }, status=404)
+
     try:
-        package = Package.objects.select_related('sender', 'receiver').get(
+        package = Package.objects.select_related('sender', 'receiver', 'current_location').get(
             tracking_number=tracking_number
         )
         
         # Get tracking events
-        tracking_events = package.tracking_events.all()
+        tracking_events = package.tracking_events.select_related('location')
+
+        estimate_range = None
+        if package.status != 'delivered':
+            estimate = eta_engine.estimate_package(package)
+            estimate_range = {'earliest': estimate.earliest.isoformat(), 'latest': estimate.latest.isoformat()}
         
         response_data = {
             'success': True,
@@ -198,8 +255,9 @@ def track_package_api(request, tracking_number):
                 'service_tier_display': package.get_service_tier_display(),
                 'price': str(package.price),
                 'payment_status': package.payment_status,
-                'current_location': package.current_location,
+                'current_location': package.current_location.name if package.current_location else '',
                 'estimated_delivery': package.estimated_delivery.isoformat() if package.estimated_delivery else None,
+                'estimated_delivery_range': estimate_range,
                 'is_claimed': package.is_claimed,
                 'claimed_at': package.claimed_at.isoformat() if package.claimed_at else None,
                 'sender': {
@@ -222,7 +280,7 @@ def track_package_api(request, tracking_number):
                     {
                         'status': event.status,
                         'status_display': event.get_status_display(),
-                        'location': event.location,
+                        'location': event.location.name,
                         'notes': event.notes,
                         'timestamp': event.timestamp.isoformat()
                     }
@@ -234,6 +292,7 @@ def track_package_api(request, tracking_number):
         return JsonResponse(response_data, status=200)
     
     except Package.DoesNotExist:
+        tracking_filter.record_miss(tracking_number)
         return JsonResponse({
             'success': False,
             'error': f'Package with tracking number {tracking_number} not found'
@@ -0,0 +1,196 @@
+import heapq
+from itertools import chain
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .eta import address_region
+from .models import Courier, Package, RollupCursor, TrackingEvent
+
+# Cursors of the incremental mode: the last package considered for a pickup,
+# and the last out-for-delivery event considered for a delivery.
+PICKUP_CURSOR = 'courier_pickups'
+DELIVERY_CURSOR = 'courier_deliveries'
+
+# The leg a courier is needed for in each status, and the field recording its courier.
+LEGS = {
+    'pending': 'pickup_courier',
+    'out_for_delivery': 'delivery_courier',
+}
+# Urgent tiers are assigned first, so they get the capacity when a zone runs short.
+TIER_PRIORITY = {'same_day': 0, 'express': 1, 'standard': 2}
+
+
+class CourierQueues:
+    """
+    Couriers of each zone in a min-heap by load relative to capacity.
+
+    Each courier is in its zone's heap exactly once; taking one for a package
+    pops the least loaded and pushes it back with the new load, so a zone's
+    packages are spread evenly. Couriers without a zone take packages from
+    zones that have no courier or no capacity left.
+    """
+
+    def __init__(self, couriers, loads):
+        self.loads = dict(loads)
+        self.capacity = {}
+        self.heaps = defaultdict(list)
+        for courier_id, zone, capacity in couriers:
+            self.capacity[courier_id] = capacity
+            self.loads.setdefault(courier_id, 0)
+            self.heaps[zone.upper()].append((self._ratio(courier_id), courier_id))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def _ratio(self, courier_id):
+        return self.loads[courier_id] / self.capacity[courier_id] if self.capacity[courier_id] else float('inf')
+
+    def _take(self, zone):
+        heap = self.heaps.get(zone)
+        if not heap or heap[0][0] >= 1:
+            return None
+        courier_id = heap[0][1]
+        self.loads[courier_id] += 1
+        heapq.heapreplace(heap, (self._ratio(courier_id), courier_id))
+        return courier_id
+
+    def take(self, zone):
+        """The courier for a package in ``zone``, now one package busier, or None if none has room"""
+        return self._take(zone) or (self._take('') if zone else None)
+
+
+def courier_loads():
+    """Pickups and deliveries currently assigned to each courier"""
+    loads = Counter()
+    for status, field in LEGS.items():
+        loads.update(dict(
+            Package.objects.filter(status=status, **{f'{field}__isnull': False}).order_by()
+            .values_list(field).annotate(count=Count('pk'))
+        ))
+    return loads
+
+
+def _unassigned(status, package_ids=None, after=None, upto=None):
+    """(pk, tier, address) of packages in ``status`` without a courier for its leg, in primary key order"""
+    packages = Package.objects.filter(status=status, **{f'{LEGS[status]}__isnull': True})
+    if package_ids is not None:
+        packages = packages.filter(pk__in=package_ids)
+    if after is not None:
+        packages = packages.filter(pk__gt=after)
+    if upto is not None:
+        packages = packages.filter(pk__lte=upto)
+    address = 'sender__address' if status == 'pending' else 'receiver__address'
+    return packages.order_by('pk').values_list('pk', 'service_tier', address)
+
+
+def assign(queues, packages_by_status):
+    """
+    Choose couriers for packages, greedily, most urgent tier first and then oldest first.
+
+    ``packages_by_status`` maps a status to its (pk, tier, address) rows. The
+    zone of a pickup is the region of the sender's address, that of a
+    delivery the receiver's. Returns the choices as {status: {pk: courier id}}
+    and how many packages found no courier with room.
+    """
+    regions = {}
+    work = []
+    for status, rows in packages_by_status.items():
+        for pk, tier, address in rows:
+            zone = regions.get(address)
+            if zone is None:
+                zone = regions[address] = address_region(address)
+            work.append((TIER_PRIORITY.get(tier, len(TIER_PRIORITY)), pk, status, zone))
+    work.sort()
+
+    chosen = {status: {} for status in packages_by_status}
+    unassigned = 0
+    for _, pk, status, zone in work:
+        courier_id = queues.take(zone)
+        if courier_id is None:
+            unassigned += 1
+        else:
+            chosen[status][pk] = courier_id
+    return chosen, unassigned
+
+
+def write_assignments(status, chosen, batch_size=None):
+    """
+    Save {package pk: courier id} choices for packages in ``status``.
+
+    Packages are grouped by courier, so each statement is a plain
+    ``UPDATE ... SET field = courier WHERE id IN (...)``. bulk_update() would
+    build a CASE over every row and is an order of magnitude slower here.
+    Packages that changed status, or got a courier, since they were read
+    are left alone.
+    """
+    field = LEGS[status]
+    batch_size = batch_size or settings.COURIER_ASSIGNMENT_BATCH_SIZE
+    by_courier = defaultdict(list)
+    for pk, courier_id in chosen.items():
+        by_courier[courier_id].append(pk)
+    for courier_id, pks in by_courier.items():
+        for start in range(0, len(pks), batch_size):
+            Package.objects.filter(
+                pk__in=pks[start:start + batch_size], status=status, **{f'{field}__isnull': True}
+            ).update(**{f'{field}_id': courier_id})
+
+
+def assign_couriers(incremental=False):
+    """
+    Assign couriers to pending pickups and out-for-delivery packages that have none.
+
+    Couriers and their loads are read once, packages in one pass per leg, and
+    every choice is made in memory before the assignments are written in
+    batches. The incremental mode looks at packages created, or sent out
+    for delivery, since the last run, and at those earlier runs found no
+    courier for; partial indexes keep the latter cheap to find. Runs are
+    serialised by the
+    pickup cursor, which each run moves; a run that finds it moved by
+    another writes nothing and returns None. Otherwise returns counts.
+    """
+    started = timezone.now()
+    pickup_cursor, _ = RollupCursor.objects.get_or_create(name=PICKUP_CURSOR)
+    delivery_cursor, _ = RollupCursor.objects.get_or_create(name=DELIVERY_CURSOR)
+    top_package = Package.objects.aggregate(top=Max('pk'))['top'] or 0
+    top_event = TrackingEvent.objects.aggregate(top=Max('pk'))['top'] or 0
+
+    couriers = Courier.objects.filter(is_active=True).values_list('pk', 'zone', 'capacity')
+    queues = CourierQueues(couriers, courier_loads())
+    if incremental:
+        sent_out = TrackingEvent.objects.filter(
+            status='out_for_delivery', pk__gt=delivery_cursor.high_water_id, pk__lte=top_event
+        ).values('package_id')
+        # Packages left over from earlier runs come first, being older.
+        packages = {
+            'pending': [
+                _unassigned('pending', upto=pickup_cursor.high_water_id),
+                _unassigned('pending', after=pickup_cursor.high_water_id, upto=top_package),
+            ],
+            'out_for_delivery': [
+                _unassigned('out_for_delivery').exclude(pk__in=sent_out),
+                _unassigned('out_for_delivery', package_ids=sent_out),
+            ],
+        }
+    else:
+        packages = {status: [_unassigned(status)] for status in LEGS}
+    chosen, unassigned = assign(queues, {
+        status: chain.from_iterable(rows.iterator(chunk_size=5000) for rows in parts)
+        for status, parts in packages.items()
+    })
+
+    with transaction.atomic():
+        claimed = RollupCursor.objects.filter(
+            pk=pickup_cursor.pk, high_water_id=pickup_cursor.high_water_id, updated_at=pickup_cursor.updated_at
+        ).update(high_water_id=top_package, updated_at=started)
+        if not claimed:
+            return None
+        RollupCursor.objects.filter(pk=delivery_cursor.pk).update(high_water_id=top_event, updated_at=started)
+        for status in LEGS:
+            write_assignments(status, chosen[status])
+    return {
+        'pickups': len(chosen['pending']),
+        'deliveries': len(chosen['out_for_delivery']),
+        'unassigned': unassigned,
+        'couriers': len(queues.capacity),
+    }
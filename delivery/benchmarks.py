@@ -0,0 +1,223 @@
+import json
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from .models import Customer, Location, Package, TrackingEvent
+
+
+@contextmanager
+def bench_client(**defaults):
+    """A test client that is allowed to talk to the project outside the test runner"""
+    with override_settings(ALLOWED_HOSTS=['*']):
+        yield Client(**defaults)
+
+
+def measure(func, iterations):
+    """Call ``func`` repeatedly and return throughput and latency figures"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'seconds': round(elapsed, 4),
+        'per_second': round(iterations / elapsed, 1) if elapsed else None,
+        'mean_ms': round(elapsed / iterations * 1000, 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+
+
+class StubWebhookServer:
+    """
+    A local HTTP/1.1 endpoint that records webhook POSTs, for tests and benchmarks.
+
+    Answers every request with ``status`` (change it between deliveries)
+    after ``delay`` seconds, keeping connections alive like a real partner.
+    Use it as a context manager; ``url`` is set while it runs.
+    """
+
+    def __init__(self, status=200, delay=0):
+        self.status = status
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._lock:
+                    stub.requests.append((dict(self.headers), body))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hooks'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(
+    PAGE_CACHE_TIMEOUTS={}, TRACKING_FILTER_ENABLED=False, TASKS_ALWAYS_EAGER=False,
+    STORAGES={**settings.STORAGES, 'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class ViewBudgetTestCase(TestCase):
+    """
+    Checks that a view runs a fixed number of queries however much data there is.
+
+    assertBudget() grows the data through SIZES, calling seed() at each, and
+    counts the queries of one request after a warm-up request, with the
+    caches cleared so cached paths are measured cold. Page caching and
+    the tracking number filter are off, so every request reaches the view.
+    setUp() creates ``self.user``; seed() gives it sent and received
+    packages among packages of strangers.
+
+    Timing is opt-in, as the baseline only holds on the machine that
+    recorded it: with PERFORMANCE_TIME_TOLERANCE set (it defaults to 0, off),
+    the median time of TIMING_ROUNDS requests at the largest size is checked
+    against the JSON baseline in PERFORMANCE_BASELINE, times the tolerance.
+    Run with UPDATE_PERFORMANCE_BASELINE=1 to record the current timings
+    instead, with the query counts alongside for reference.
+    """
+    SIZES = (1, 10, 50)
+    TIMING_ROUNDS = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.recorded = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.recorded:
+            baseline = load_baseline()
+            baseline.update(cls.recorded)
+            with open(settings.PERFORMANCE_BASELINE, 'w') as handle:
+                json.dump(dict(sorted(baseline.items())), handle, indent=2)
+                handle.write('\n')
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = budget_user()
+        self.hubs = [Location.objects.create(name=f'Budget Hub {number}', is_hub=True) for number in range(3)]
+        self.size = 0
+
+    def seed(self, size):
+        """
+        Grow the data to ``size`` packages sent by the user, ``size`` received and ``size`` of strangers.
+
+        Every package has a tracking event at each hub.
+        """
+        count = size - self.size
+        customers = Customer.objects.bulk_create([
+            Customer(name=f'Budget {size}-{number}', email=f'budget{size}-{number}@example.com',
+                     phone='555-0101', address=f'{number} Budget Rd, Testville, TX 75001')
+            for number in range(count * 2)
+        ])
+        packages = []
+        for sender_user, receiver_user in ((self.user, None), (None, self.user), (None, None)):
+            numbers = Package.generate_tracking_numbers(count)
+            packages += [
+                Package(
+                    tracking_number=tracking_number, verification_code='123456',
+                    sender=customers[number], receiver=customers[count + number],
+                    sender_user=sender_user, receiver_user=receiver_user,
+                    description='Budget parcel', weight=1, price=10, status='in_transit',
+                    current_location=self.hubs[-1],
+                )
+                for number, tracking_number in enumerate(numbers)
+            ]
+        packages = Package.objects.bulk_create(packages)
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(package=package, status='in_transit', location=hub)
+            for package in packages for hub in self.hubs
+        ])
+        self.packages = packages
+        self.size = size
+
+    def count_queries(self, request):
+        request()
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400, response.content[:500])
+        return len(queries)
+
+    def assertBudget(self, name, budget, request):
+        """Assert ``request()`` stays within ``budget`` queries at every size, and within its baseline time"""
+        counts = {}
+        for size in self.SIZES:
+            self.seed(size)
+            counts[size] = self.count_queries(request)
+        self.assertEqual(
+            len(set(counts.values())), 1, f"{name}: queries grow with the data, by size {counts}"
+        )
+        self.assertLessEqual(counts[self.SIZES[-1]], budget, f"{name}: over its query budget of {budget}")
+
+        updating = os.environ.get('UPDATE_PERFORMANCE_BASELINE')
+        tolerance = settings.PERFORMANCE_TIME_TOLERANCE
+        if not updating and not tolerance:
+            return
+        timings = []
+        for _ in range(self.TIMING_ROUNDS):
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+        median_ms = round(statistics.median(timings), 2)
+        if updating:
+            self.recorded[name] = {'median_ms': median_ms, 'queries': counts[self.SIZES[-1]]}
+            return
+        recorded = load_baseline().get(name)
+        if recorded:
+            self.assertLessEqual(
+                median_ms, recorded['median_ms'] * tolerance,
+                f"{name}: median {median_ms}ms against a baseline of {recorded['median_ms']}ms"
+            )
+
+
+def load_baseline():
+    try:
+        with open(settings.PERFORMANCE_BASELINE) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def budget_user(username='budget'):
+    """A user with a profile filled in, as the package views need"""
+    user = User.objects.create_user(username, f'{username}@example.com', 'budget-password')
+    user.profile.phone = '555-0100'
+    user.profile.address = '1 Budget Way, Testville, TX 75001'
+    user.profile.save()
+    return user
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import Package, TrackingEvent, normalize_location_name
+from .eta import refresh_estimates
+from .locations import UNKNOWN_LOCATION, resolve_location
+from .notifications import queue_status_notifications
+from .webhooks import queue_webhook_events
+from .page_cache import invalidate_tracking_pages
+from .revenue import REVENUE_FIELDS, record_revenue
+
+
+# Rows written per transaction. Small enough that no single batch holds the
+# write lock for long, large enough to amortise the round trips.
+BULK_BATCH_SIZE = 500
+
+
+def iter_pk_batches(queryset, batch_size=BULK_BATCH_SIZE):
+    """Yield primary keys of a queryset in ascending batches without loading rows"""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        page = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def bulk_update_status(queryset, status, location, notes='', batch_size=BULK_BATCH_SIZE):
+    """
+    Move every undelivered package in the queryset to a new status/location.
+
+    Each batch is one UPDATE plus multi-row INSERTs of tracking events,
+    receiver notifications and partner webhook events, and one UPDATE of
+    the re-estimated delivery dates, committed on its own. Returns the number of
+    packages updated.
+    """
+    updated = 0
+    notes = notes or "Status updated in bulk by staff."
+    location = normalize_location_name(location) or UNKNOWN_LOCATION
+    location_id = resolve_location(location)
+    for batch in iter_pk_batches(queryset.exclude(status='delivered'), batch_size):
+        now = timezone.now()
+        with transaction.atomic():
+            # Packages delivered since the batch was read are left alone.
+            moving = Package.objects.select_for_update().filter(pk__in=batch).exclude(status='delivered')
+            rows = list(moving.values_list('pk', 'tracking_number'))
+            pks = [pk for pk, _ in rows]
+            Package.objects.filter(pk__in=pks).update(
+                status=status,
+                current_location_id=location_id,
+                updated_at=now
+            )
+            TrackingEvent.objects.bulk_create([
+                TrackingEvent(
+                    package_id=pk,
+                    status=status,
+                    location_id=location_id,
+                    notes=notes,
+                    timestamp=now
+                )
+                for pk in pks
+            ])
+            queue_status_notifications(
+                (pk, recipient, status, location, notes, now)
+                for pk, recipient in Package.objects.filter(pk__in=pks).values_list('pk', 'receiver__email')
+            )
+            queue_webhook_events((pk, status, location, notes, now) for pk in pks)
+            refresh_estimates(pks)
+        invalidate_tracking_pages([tracking_number for _, tracking_number in rows])
+        updated += len(rows)
+    return updated
+
+
+def bulk_update_payment_status(queryset, from_status, to_status, batch_size=BULK_BATCH_SIZE):
+    """Move packages from one payment status to another in batches, and their revenue between daily facts"""
+    updated = 0
+    for batch in iter_pk_batches(queryset.filter(payment_status=from_status), batch_size):
+        with transaction.atomic():
+            moving = Package.objects.select_for_update().filter(pk__in=batch, payment_status=from_status)
+            rows = list(moving.values_list('pk', *REVENUE_FIELDS))
+            Package.objects.filter(pk__in=[row[0] for row in rows]).update(
+                payment_status=to_status,
+                updated_at=timezone.now()
+            )
+            record_revenue(
+                added=[(created_at, tier, to_status, price) for _, created_at, tier, _, price in rows],
+                removed=[row[1:] for row in rows]
+            )
+            updated += len(rows)
+    return updated
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can see.
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Settings naming a cache alias that every gunicorn worker and the task
+# worker must see the same contents of.
+SHARED_CACHE_SETTINGS = [
+    'API_RATELIMIT_CACHE', 'PAGE_CACHE_ALIAS', 'PICKUP_AVAILABILITY_CACHE', 'TRACKING_FILTER_CACHE',
+]
+
+
+def cache_is_shared(alias):
+    """Whether every process sees the entries of cache ``alias`` (Redis, Memcached, database or files)"""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Fail `check --deploy` while a cache the processes must share is local to each of them"""
+    errors = []
+    for setting in SHARED_CACHE_SETTINGS:
+        alias = getattr(settings, setting)
+        if not cache_is_shared(alias):
+            errors.append(Error(
+                f"{setting} uses the cache {alias!r}, which each process keeps to itself.",
+                hint="Point SHARED_CACHE_BACKEND and SHARED_CACHE_LOCATION at Redis or Memcached.",
+                id='delivery.E001',
+            ))
+    return errors
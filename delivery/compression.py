@@ -0,0 +1,140 @@
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+# Types worth compressing. Images, archives and already gzipped exports are not.
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+# Random bytes added to gzip headers to blunt BREACH-style attacks, as in
+# Django's GZipMiddleware.
+MAX_RANDOM_BYTES = 100
+
+_QVALUE_RE = re.compile(r'q\s*=\s*([0-9.]+)')
+
+
+def _accepted_codings(header):
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        match = _QVALUE_RE.search(params)
+        try:
+            codings[coding] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            codings[coding] = 0.0
+    return codings
+
+
+def negotiate_encoding(request, allow_brotli=True):
+    """Return 'br', 'gzip' or '' for the encodings the client accepts, preferring brotli"""
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if not header:
+        return ''
+    accepted = _accepted_codings(header)
+    wildcard = accepted.get('*', 0.0)
+    if allow_brotli and brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return ''
+
+
+def _is_compressible(response):
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return False
+    if getattr(response, 'is_async', False) or getattr(response, 'file_to_stream', None) is not None:
+        return False
+    content_type = response.get('Content-Type', '').lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_body(content, encoding):
+    """Compress a complete body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return compress_string(content, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+def compress_response(request, response):
+    """
+    Compress a response in place for the request's negotiated encoding.
+
+    Plain responses are compressed when they are at least
+    COMPRESSION_MIN_SIZE bytes and compression actually saves space.
+    Streaming responses (CSV/NDJSON exports) are compressed chunk by chunk
+    so they keep streaming. Responses that used a CSRF token only get gzip,
+    whose randomised header padding mitigates BREACH; brotli has no
+    equivalent.
+    """
+    if not _is_compressible(response):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    encoding = negotiate_encoding(request, allow_brotli=not request.META.get('CSRF_COOKIE_USED'))
+    if not encoding:
+        return response
+
+    if response.streaming:
+        if encoding == 'br':
+            response.streaming_content = _brotli_sequence(response.streaming_content)
+        else:
+            response.streaming_content = compress_sequence(
+                response.streaming_content, max_random_bytes=MAX_RANDOM_BYTES
+            )
+        del response['Content-Length']
+    else:
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        compressed = compress_body(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    # A strong ETag would claim the compressed bytes equal the original ones.
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = encoding
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip compression for dynamic responses.
+
+    Place it directly after WhiteNoise, which serves its own precompressed
+    static files, and before any middleware that reads response bodies.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return compress_response(request, self.get_response(request))
@@ -0,0 +1,51 @@
+from django.db import connection
+
+
+def increment(model, key_fields, deltas):
+    """
+    Add ``deltas`` ({key tuple: {field: amount}}) to the counter rows with those keys.
+
+    ``key_fields`` must be covered by a unique constraint, and every delta
+    must name the same fields in the same order. Each batch is one INSERT
+    that adds to the rows which already exist, so the database does the
+    arithmetic: nothing is read back, and concurrent writers never lose an
+    increment.
+    """
+    if not deltas:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields + list(next(iter(deltas.values())))]
+    columns = [quote(field.column) for field in fields]
+    key_columns, sum_columns = columns[:len(key_fields)], columns[len(key_fields):]
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            f'{column} = {column} + VALUES({column})' for column in sum_columns
+        )
+    else:
+        # PostgreSQL and SQLite 3.24+
+        conflict = f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET ' + ', '.join(
+            f'{column} = {table}.{column} + EXCLUDED.{column}' for column in sum_columns
+        )
+    # Keys repeat many times in a chunk; adapt each distinct value once.
+    prepared = [{} for _ in fields]
+
+    def prep(i, value):
+        if value not in prepared[i]:
+            prepared[i][value] = fields[i].get_db_prep_save(value, connection)
+        return prepared[i][value]
+
+    rows = [
+        [prep(i, value) for i, value in enumerate(key + tuple(amounts.values()))]
+        for key, amounts in deltas.items()
+    ]
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+                + ', '.join([placeholders] * len(batch)) + ' ' + conflict,
+                [value for row in batch for value in row]
+            )
@@ -0,0 +1,311 @@
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .models import Package, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400.0
+# Quantile levels kept per lane: 0%, 5%, ..., 100%.
+LEVELS = np.linspace(0, 1, 21)
+RANGE_LEVELS = np.array([0.1, 0.5, 0.9])
+
+# (earliest, expected, latest) transit days per tier, used until a tier has
+# ETA_MIN_SAMPLES deliveries in the window.
+DEFAULT_TRANSIT_DAYS = {
+    'standard': (3, 4, 5),
+    'express': (1, 2, 2),
+    'same_day': (0, 0, 1),
+}
+DEFAULT_QUANTILES = {
+    tier: np.interp(LEVELS, [0, 0.1, 0.5, 0.9, 1], [earliest, earliest, expected, latest, latest]).astype(np.float32)
+    for tier, (earliest, expected, latest) in DEFAULT_TRANSIT_DAYS.items()
+}
+
+# A delivery date with its 10th-90th percentile range. ``basis`` is 'lane',
+# 'tier' or 'default' and ``samples`` the deliveries it was learned from.
+Estimate = namedtuple('Estimate', ['date', 'earliest', 'latest', 'basis', 'samples'])
+
+# Quantile tables for lookups, swapped in as a whole after each refresh.
+Tables = namedtuple('Tables', ['lanes', 'lane_quantiles', 'lane_counts', 'tiers', 'tier_quantiles', 'tier_counts'])
+
+_POSTCODE_RE = re.compile(r'[\d-]+')
+
+
+def address_region(address):
+    """Coarse region of a free-text address: its last comma-separated part without digits, e.g. "NY" """
+    last = (address or '').rsplit(',', 1)[-1]
+    return ' '.join(_POSTCODE_RE.sub(' ', last).split()).upper()
+
+
+def quantile_table(groups, values, n_groups):
+    """
+    Quantiles at LEVELS of ``values`` per group code, for all groups at once.
+
+    Sorts by (group, value) and interpolates between order statistics the
+    way np.quantile does, without a Python loop over groups. Returns a
+    float32 table of shape (n_groups, len(LEVELS)) and the group sizes;
+    rows of empty groups are NaN.
+    """
+    counts = np.bincount(groups, minlength=n_groups)[:n_groups]
+    table = np.full((n_groups, len(LEVELS)), np.nan, dtype=np.float32)
+    if not len(values):
+        return table, counts
+    ordered = values[np.lexsort((values, groups))]
+    starts = np.cumsum(counts) - counts
+    positions = LEVELS[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(positions).astype(np.int64)
+    fraction = positions - lower
+    below = ordered[np.minimum(starts[:, None] + lower, len(ordered) - 1)]
+    above = ordered[np.minimum(starts[:, None] + np.ceil(positions).astype(np.int64), len(ordered) - 1)]
+    filled = counts > 0
+    table[filled] = (below + (above - below) * fraction)[filled]
+    return table, counts
+
+
+class EtaEngine:
+    """
+    Transit-time distributions per (origin region, destination region, tier) lane.
+
+    A sample is the time from a package's first tracking event to its first
+    'delivered' event, for deliveries in the last ETA_WINDOW_DAYS. Samples
+    are kept as flat NumPy arrays and reduced to a table of 21 quantiles
+    per lane and per tier, so a lookup is two dict gets and a fixed-size
+    interpolation. Lanes with fewer than ETA_MIN_SAMPLES deliveries fall
+    back to their tier, and tiers to DEFAULT_TRANSIT_DAYS.
+
+    The arrays are built on first use and topped up from deliveries above
+    the highest event primary key seen, at most once per ETA_SYNC_INTERVAL.
+    Every ETA_REBUILD_INTERVAL seconds one thread relearns them in the
+    background while lookups keep using the old tables.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tables = None
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.lanes = {}
+        self.lane_tiers = []
+        self.tiers = {}
+        self.high_water_pk = 0
+        self.sample_packages = np.empty(0, dtype=np.int64)
+        self.sample_lanes = np.empty(0, dtype=np.int32)
+        self.sample_days = np.empty(0, dtype=np.float32)
+        self.sample_delivered_at = np.empty(0, dtype=np.float64)
+
+    def _lane(self, sender_address, receiver_address, tier):
+        key = (address_region(sender_address), address_region(receiver_address), tier)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = len(self.lanes)
+            self.lane_tiers.append(self.tiers.setdefault(tier, len(self.tiers)))
+        return lane
+
+    def _fetch(self, since):
+        """Transit samples of packages first delivered after the high-water event, as arrays"""
+        delivered = TrackingEvent.objects.filter(
+            status='delivered', pk__gt=self.high_water_pk, timestamp__gte=since
+        ).order_by()
+        rows = list(delivered.values_list('pk', 'package_id', 'timestamp'))
+        if not rows:
+            return None
+        event_pks, package_ids, timestamps = zip(*rows)
+        self.high_water_pk = max(event_pks)
+
+        # First delivery of each package, skipping packages already sampled.
+        package_ids = np.array(package_ids, dtype=np.int64)
+        delivered_at = np.array([timestamp.timestamp() for timestamp in timestamps])
+        order = np.lexsort((delivered_at, package_ids))
+        package_ids, delivered_at = package_ids[order], delivered_at[order]
+        first = np.concatenate(([True], package_ids[1:] != package_ids[:-1]))
+        first &= ~np.isin(package_ids, self.sample_packages)
+        package_ids, delivered_at = package_ids[first], delivered_at[first]
+
+        # The clock starts at each package's earliest event.
+        history = list(
+            TrackingEvent.objects.filter(package_id__in=delivered.values('package_id'))
+            .order_by().values_list('package_id', 'timestamp')
+        )
+        history_ids = np.array([package_id for package_id, _ in history], dtype=np.int64)
+        history_at = np.array([timestamp.timestamp() for _, timestamp in history])
+        order = np.argsort(history_ids, kind='stable')
+        history_ids, history_at = history_ids[order], history_at[order]
+        boundaries = np.flatnonzero(np.concatenate(([True], history_ids[1:] != history_ids[:-1])))
+        started_ids = history_ids[boundaries]
+        started_at = np.minimum.reduceat(history_at, boundaries) if len(boundaries) else history_at
+        position = np.minimum(np.searchsorted(started_ids, package_ids), max(len(started_ids) - 1, 0))
+        known = started_ids[position] == package_ids if len(started_ids) else np.zeros(len(package_ids), bool)
+        package_ids, delivered_at = package_ids[known], delivered_at[known]
+        days = ((delivered_at - started_at[position[known]]) / DAY).astype(np.float32)
+
+        lanes_by_package = {
+            pk: self._lane(sender_address, receiver_address, tier)
+            for pk, sender_address, receiver_address, tier in
+            Package.objects.filter(pk__in=delivered.values('package_id'))
+            .order_by().values_list('pk', 'sender__address', 'receiver__address', 'service_tier')
+        }
+        lanes = np.array([lanes_by_package.get(pk, -1) for pk in package_ids.tolist()], dtype=np.int32)
+        found = lanes >= 0
+        return package_ids[found], lanes[found], days[found], delivered_at[found]
+
+    def _append(self, samples, since):
+        if samples is not None:
+            package_ids, lanes, days, delivered_at = samples
+            self.sample_packages = np.concatenate((self.sample_packages, package_ids))
+            self.sample_lanes = np.concatenate((self.sample_lanes, lanes))
+            self.sample_days = np.concatenate((self.sample_days, days))
+            self.sample_delivered_at = np.concatenate((self.sample_delivered_at, delivered_at))
+        recent = self.sample_delivered_at >= since.timestamp()
+        if not recent.all():
+            self.sample_packages = self.sample_packages[recent]
+            self.sample_lanes = self.sample_lanes[recent]
+            self.sample_days = self.sample_days[recent]
+            self.sample_delivered_at = self.sample_delivered_at[recent]
+
+        lane_quantiles, lane_counts = quantile_table(self.sample_lanes, self.sample_days, len(self.lanes))
+        lane_tiers = np.array(self.lane_tiers, dtype=np.int32)
+        tier_quantiles, tier_counts = quantile_table(
+            lane_tiers[self.sample_lanes], self.sample_days, len(self.tiers)
+        )
+        self.tables = Tables(
+            dict(self.lanes), lane_quantiles, lane_counts, dict(self.tiers), tier_quantiles, tier_counts
+        )
+
+    def _stale(self):
+        return self.tables is None or time.monotonic() - self.built_at >= settings.ETA_REBUILD_INTERVAL
+
+    def build(self, only_if_stale=False):
+        """Relearn every lane from the deliveries in the window"""
+        with self._lock:
+            if only_if_stale and not self._stale():
+                # Another thread rebuilt the tables while this one waited.
+                return
+            self._build()
+
+    def _build(self):
+        started = time.monotonic()
+        since = timezone.now() - timedelta(days=settings.ETA_WINDOW_DAYS)
+        # Learn into a fresh engine, so lookups keep the old tables until the
+        # new ones are complete and a failed rebuild leaves nothing half done.
+        fresh = EtaEngine()
+        fresh._append(fresh._fetch(since), since)
+        self.lanes, self.lane_tiers, self.tiers = fresh.lanes, fresh.lane_tiers, fresh.tiers
+        self.high_water_pk = fresh.high_water_pk
+        self.sample_packages, self.sample_lanes = fresh.sample_packages, fresh.sample_lanes
+        self.sample_days, self.sample_delivered_at = fresh.sample_days, fresh.sample_delivered_at
+        self.tables = fresh.tables
+        self.built_at = self.synced_at = time.monotonic()
+        logger.info("Built ETA tables in %.2fs: %s", time.monotonic() - started, self.stats())
+
+    def sync(self):
+        """Add deliveries recorded since the last build or sync, and drop ones that left the window"""
+        # One thread refreshes; the others keep answering from the current tables.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            since = timezone.now() - timedelta(days=settings.ETA_WINDOW_DAYS)
+            self._append(self._fetch(since), since)
+            self.synced_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _rebuild_in_background(self):
+        try:
+            self._build()
+        except Exception:
+            logger.exception("Failed to rebuild the ETA tables; the old ones stay in use")
+        finally:
+            self._lock.release()
+            connection.close()
+
+    def _ensure_fresh(self):
+        if self.tables is None:
+            # Nothing to estimate from yet, so the first lookups wait for it.
+            self.build(only_if_stale=True)
+        elif self._stale():
+            if self._lock.acquire(blocking=False):
+                threading.Thread(target=self._rebuild_in_background, name='eta-rebuild', daemon=True).start()
+        elif time.monotonic() - self.synced_at >= settings.ETA_SYNC_INTERVAL:
+            self.sync()
+
+    def quantiles(self, sender_address, receiver_address, service_tier):
+        """The quantile row to estimate from, with its basis and sample count"""
+        self._ensure_fresh()
+        tables = self.tables
+        lane = tables.lanes.get((address_region(sender_address), address_region(receiver_address), service_tier))
+        if lane is not None and tables.lane_counts[lane] >= settings.ETA_MIN_SAMPLES:
+            return tables.lane_quantiles[lane], 'lane', int(tables.lane_counts[lane])
+        tier = tables.tiers.get(service_tier)
+        if tier is not None and tables.tier_counts[tier] >= settings.ETA_MIN_SAMPLES:
+            return tables.tier_quantiles[tier], 'tier', int(tables.tier_counts[tier])
+        return DEFAULT_QUANTILES.get(service_tier, DEFAULT_QUANTILES['standard']), 'default', 0
+
+    def estimate(self, sender_address, receiver_address, service_tier, created_at=None, now=None):
+        """
+        Expected delivery date and 10th-90th percentile range for a package.
+
+        A package created at ``created_at`` and still moving at ``now`` is
+        estimated from the deliveries that took at least as long, so the
+        estimate moves forward with each scan instead of falling behind.
+        """
+        now = now or timezone.now()
+        started = created_at or now
+        quantiles, basis, samples = self.quantiles(sender_address, receiver_address, service_tier)
+        levels = RANGE_LEVELS
+        elapsed = (now - started).total_seconds() / DAY
+        if elapsed > 0:
+            reached = np.interp(elapsed, quantiles, LEVELS)
+            levels = reached + (1 - reached) * RANGE_LEVELS
+        zone = timezone.get_current_timezone()
+        today = now.astimezone(zone).date()
+        earliest, expected, latest = (
+            max((started + timedelta(days=days)).astimezone(zone).date(), today)
+            for days in np.interp(levels, LEVELS, quantiles).tolist()
+        )
+        return Estimate(expected, earliest, latest, basis, samples)
+
+    def estimate_package(self, package, now=None):
+        return self.estimate(
+            package.sender.address, package.receiver.address, package.service_tier, package.created_at, now
+        )
+
+    def stats(self):
+        tables = self.tables
+        arrays = (self.sample_packages, self.sample_lanes, self.sample_days, self.sample_delivered_at)
+        return {
+            'samples': len(self.sample_days),
+            'lanes': len(tables.lanes) if tables else 0,
+            'lanes_with_estimates': int((tables.lane_counts >= settings.ETA_MIN_SAMPLES).sum()) if tables else 0,
+            'tiers': len(tables.tiers) if tables else 0,
+            'sample_bytes': sum(array.nbytes for array in arrays),
+            'table_bytes': (tables.lane_quantiles.nbytes + tables.tier_quantiles.nbytes) if tables else 0,
+            'high_water_pk': self.high_water_pk,
+        }
+
+
+eta_engine = EtaEngine()
+
+
+def refresh_estimates(package_ids):
+    """Re-estimate the delivery date of undelivered packages after a scan, in one UPDATE per call"""
+    now = timezone.now()
+    packages = [
+        Package(pk=pk, estimated_delivery=eta_engine.estimate(
+            sender_address, receiver_address, tier, created_at, now
+        ).date)
+        for pk, sender_address, receiver_address, tier, created_at in
+        Package.objects.filter(pk__in=package_ids).exclude(status='delivered').order_by()
+        .values_list('pk', 'sender__address', 'receiver__address', 'service_tier', 'created_at')
+    ]
+    Package.objects.bulk_update(packages, ['estimated_delivery'])
@@ -0,0 +1,178 @@
+import csv
+import json
+import logging
+import time
+import zlib
+from django.db.models import Prefetch
+from .models import TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+# Serialized output is collected into buffers of roughly this size before
+# being yielded, so the response is not written one row at a time.
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+CUSTOMER_FIELDS = ['name', 'email', 'phone', 'address']
+PACKAGE_FIELDS = [
+    'tracking_number', 'status', 'service_tier', 'price', 'payment_status',
+    'weight', 'description', 'current_location', 'estimated_delivery',
+    'is_claimed', 'claimed_at', 'created_at', 'updated_at',
+]
+CSV_HEADER = [
+    *PACKAGE_FIELDS,
+    *[f'sender_{field}' for field in CUSTOMER_FIELDS],
+    *[f'receiver_{field}' for field in CUSTOMER_FIELDS],
+    'tracking_history',
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def export_queryset(queryset):
+    """Prepare a package queryset for chunked export with sender, receiver and history"""
+    events = TrackingEvent.objects.select_related('location').order_by('timestamp', 'pk')
+    return (
+        queryset
+        .select_related('sender', 'receiver', 'current_location')
+        .prefetch_related(Prefetch('tracking_events', queryset=events))
+        .order_by('pk')
+    )
+
+
+def iter_package_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one plain dict per package, reading the queryset in server-side chunks"""
+    for package in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield {
+            'tracking_number': package.tracking_number,
+            'status': package.status,
+            'service_tier': package.service_tier,
+            'price': str(package.price),
+            'payment_status': package.payment_status,
+            'weight': str(package.weight),
+            'description': package.description,
+            'current_location': package.current_location.name if package.current_location else '',
+            'estimated_delivery': _isoformat(package.estimated_delivery),
+            'is_claimed': package.is_claimed,
+            'claimed_at': _isoformat(package.claimed_at),
+            'created_at': _isoformat(package.created_at),
+            'updated_at': _isoformat(package.updated_at),
+            'sender': {field: getattr(package.sender, field) for field in CUSTOMER_FIELDS},
+            'receiver': {field: getattr(package.receiver, field) for field in CUSTOMER_FIELDS},
+            'tracking_history': [
+                {
+                    'status': event.status,
+                    'location': event.location.name,
+                    'notes': event.notes,
+                    'timestamp': _isoformat(event.timestamp),
+                }
+                for event in package.tracking_events.all()
+            ],
+        }
+
+
+class _LineBuffer:
+    """File-like object that hands back whatever csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(records):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(CSV_HEADER)
+    for record in records:
+        yield writer.writerow([
+            *(record[field] for field in PACKAGE_FIELDS),
+            *(record['sender'][field] for field in CUSTOMER_FIELDS),
+            *(record['receiver'][field] for field in CUSTOMER_FIELDS),
+            json.dumps(record['tracking_history'], separators=(',', ':')),
+        ])
+
+
+def _ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def _counted(records, stats):
+    for record in records:
+        stats.rows += 1
+        yield record
+
+
+def _buffered(lines):
+    parts = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _gzipped(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ExportStats:
+    """Running counters for an export, reported once the stream is exhausted"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.rows} rows, {self.bytes} bytes in {self.elapsed:.2f}s "
+            f"({self.rows_per_second:.0f} rows/s, {self.bytes / max(self.elapsed, 1e-9) / 1e6:.2f} MB/s)"
+        )
+
+
+def stream_packages(queryset, fmt='csv', compress=False, chunk_size=EXPORT_CHUNK_SIZE, stats=None, compresslevel=6):
+    """
+    Yield an export of the queryset as encoded byte chunks.
+
+    Rows are pulled from the database ``chunk_size`` at a time and written
+    straight through, optionally gzip-compressed, so memory use does not
+    depend on the number of packages exported.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    stats = stats if stats is not None else ExportStats()
+    records = _counted(iter_package_records(queryset, chunk_size=chunk_size), stats)
+    lines = _csv_lines(records) if fmt == 'csv' else _ndjson_lines(records)
+    chunks = _buffered(lines)
+    if compress:
+        chunks = _gzipped(chunks, compresslevel)
+    for chunk in chunks:
+        stats.bytes += len(chunk)
+        yield chunk
+    stats.finished = time.monotonic()
+    logger.info("Package export (%s%s) finished: %s", fmt, ', gzip' if compress else '', stats.summary())
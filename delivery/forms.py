@@ -1,5 +1,22 @@
+from datetime import date
+from decimal import Decimal
 from django import forms
-from .models import Customer, Package
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from .models import Customer, Package, PickupSlot
+from .pickups import booking_days, pickup_slot_label, pickup_slot_value
+from .pricing import MAX_WEIGHT
+
+
+def validate_package_image(image):
+    """Reject an uploaded image over PACKAGE_IMAGE_MAX_UPLOAD_BYTES or PACKAGE_IMAGE_MAX_PIXELS"""
+    if image.size > settings.PACKAGE_IMAGE_MAX_UPLOAD_BYTES:
+        raise forms.ValidationError(
+            f"Images must be smaller than {filesizeformat(settings.PACKAGE_IMAGE_MAX_UPLOAD_BYTES)}."
+        )
+    width, height = image.image.size
+    if width * height > settings.PACKAGE_IMAGE_MAX_PIXELS:
+        raise forms.ValidationError("Image dimensions are too large.")
 
 
 class TrackingSearchForm(forms.Form):
@@ -56,11 +73,34 @@ class PickupRequestForm(forms.Form):
         decimal_places=2,
         widget=forms.NumberInput(attrs={'placeholder': 'Weight in kg', 'step': '0.01', 'class': 'form-control'})
     )
-    preferred_pickup_date = forms.DateField(
-        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
-        required=False
+    pickup_slot = forms.ChoiceField(
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
     )
 
+    def __init__(self, *args, availability=None, **kwargs):
+        """``availability`` lists the slots of the sender's area with their remaining pickups, if known"""
+        super().__init__(*args, **kwargs)
+        self.offer_slots(availability)
+
+    def offer_slots(self, availability=None):
+        if availability is None:
+            options = [(day, window, None) for day in booking_days() for window, _ in PickupSlot.WINDOW_CHOICES]
+        else:
+            options = [option for option in availability if option.remaining > 0]
+        self.fields['pickup_slot'].choices = [('', 'First available slot')] + [
+            (pickup_slot_value(day, window), pickup_slot_label(day, window, remaining))
+            for day, window, remaining in options
+        ]
+
+    def clean_pickup_slot(self):
+        """The chosen (date, window), or None for the first available slot"""
+        value = self.cleaned_data['pickup_slot']
+        if not value:
+            return None
+        day, window = value.split('/')
+        return date.fromisoformat(day), window
+
 
 class ContactForm(forms.Form):
     """Form for contact inquiries"""
@@ -117,6 +157,40 @@ class CreatePackageForm(forms.Form):
         widget=forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'})
     )
 
+    def clean_package_image(self):
+        image = self.cleaned_data.get('package_image')
+        if image:
+            validate_package_image(image)
+        return image
+
+
+class PackageImportForm(CreatePackageForm):
+    """Validates one imported row with the same rules as CreatePackageForm"""
+    sender_name = forms.CharField(max_length=200)
+    sender_email = forms.EmailField()
+    sender_phone = forms.CharField(max_length=20)
+    sender_address = forms.CharField()
+    status = forms.ChoiceField(choices=Package.STATUS_CHOICES, required=False)
+    payment_status = forms.ChoiceField(choices=Package.PAYMENT_STATUS_CHOICES, required=False)
+    current_location = forms.CharField(max_length=200, required=False)
+    # Imported weights are priced in bulk, so they get the quote API's bounds.
+    weight = forms.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0.01'), max_value=MAX_WEIGHT)
+    package_image = None
+
+
+class PackageAdminForm(forms.ModelForm):
+    """The admin's package form, holding new images to the limits of CreatePackageForm"""
+
+    class Meta:
+        model = Package
+        fields = '__all__'
+
+    def clean_package_image(self):
+        image = self.cleaned_data.get('package_image')
+        if image and 'package_image' in self.changed_data:
+            validate_package_image(image)
+        return image
+
 
 class ClaimPackageForm(forms.Form):
     """Form for claiming a package"""
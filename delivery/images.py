@@ -0,0 +1,134 @@
+import hashlib
+import io
+import os
+import posixpath
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .models import Package
+
+# Uploads wait here, named by the SHA-256 of their bytes, until they are
+# re-encoded. The processed copies are named by the same digest, so
+# identical uploads share one set of files.
+INCOMING_DIR = 'packages/incoming'
+IMAGE_DIR = 'packages'
+THUMBNAIL_DIR = 'packages/thumbs'
+
+
+def processed_names(digest):
+    """Storage names of the re-encoded image and thumbnail for an upload digest"""
+    return f'{IMAGE_DIR}/{digest}.jpg', f'{THUMBNAIL_DIR}/{digest}.jpg'
+
+
+def stage_upload(upload):
+    """
+    Store an uploaded image for processing and return (image_name, thumbnail_name).
+
+    When identical bytes were uploaded before, the existing processed files
+    are returned and nothing is written. Otherwise the upload is stored under
+    INCOMING_DIR and thumbnail_name is None until process_package_image runs.
+    """
+    sha = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha.update(chunk)
+    digest = sha.hexdigest()
+
+    image_name, thumbnail_name = processed_names(digest)
+    if default_storage.exists(image_name) and default_storage.exists(thumbnail_name):
+        return image_name, thumbnail_name
+
+    extension = os.path.splitext(upload.name)[1].lower()[:8] or '.img'
+    staged_name = f'{INCOMING_DIR}/{digest}{extension}'
+    if not default_storage.exists(staged_name):
+        upload.seek(0)
+        staged_name = default_storage.save(staged_name, upload)
+    return staged_name, None
+
+
+def _flatten(image):
+    """Apply EXIF orientation and convert to RGB on a white background"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, max_dimension):
+    image = image.copy()
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(
+        buffer, 'JPEG',
+        quality=settings.PACKAGE_IMAGE_QUALITY, optimize=True, progressive=True
+    )
+    return buffer.getvalue()
+
+
+def render_images(source):
+    """Return JPEG bytes for the bounded image and its thumbnail from an open file"""
+    with Image.open(source) as image:
+        # Let the JPEG decoder skip detail we would throw away anyway.
+        size = settings.PACKAGE_IMAGE_MAX_DIMENSION
+        image.draft('RGB', (size, size))
+        flat = _flatten(image)
+    return (
+        _encode(flat, settings.PACKAGE_IMAGE_MAX_DIMENSION),
+        _encode(flat, settings.PACKAGE_THUMBNAIL_SIZE),
+    )
+
+
+def _save_once(name, data):
+    """Save content under an exact name unless another worker already did"""
+    if default_storage.exists(name):
+        return
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        default_storage.delete(saved)
+
+
+def _file_digest(name):
+    sha = hashlib.sha256()
+    with default_storage.open(name) as source:
+        for chunk in source.chunks():
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def process_package_image(package_id):
+    """
+    Re-encode a package's image and attach the bounded copy and thumbnail.
+
+    Handles staged uploads and images stored before this pipeline existed.
+    Staged uploads are deleted once no package refers to them; older
+    originals are left in place.
+    """
+    source_name, thumbnail = (
+        Package.objects.filter(pk=package_id)
+        .values_list('package_image', 'package_thumbnail').first()
+        or (None, None)
+    )
+    if not source_name or thumbnail:
+        return
+
+    staged = source_name.startswith(INCOMING_DIR + '/')
+    if staged:
+        digest = posixpath.splitext(posixpath.basename(source_name))[0]
+    else:
+        digest = _file_digest(source_name)
+    image_name, thumbnail_name = processed_names(digest)
+    if not (default_storage.exists(image_name) and default_storage.exists(thumbnail_name)):
+        with default_storage.open(source_name) as source:
+            image_data, thumbnail_data = render_images(source)
+        _save_once(image_name, image_data)
+        _save_once(thumbnail_name, thumbnail_data)
+
+    Package.objects.filter(pk=package_id, package_image=source_name).update(
+        package_image=image_name,
+        package_thumbnail=thumbnail_name
+    )
+    if staged and not Package.objects.filter(package_image=source_name).exists():
+        default_storage.delete(source_name)
@@ -0,0 +1,251 @@
+import csv
+import gzip
+import json
+import time
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .eta import eta_engine
+from .forms import PackageImportForm
+from .locations import resolve_locations
+from .models import Customer, ImportCheckpoint, Package, TrackingEvent
+from .pricing import tariff_engine
+from .revenue import record_revenue, revenue_row
+from .search import get_search_backend
+
+IMPORT_BATCH_SIZE = 1000
+PARTIES = ['sender', 'receiver']
+CUSTOMER_FIELDS = ['name', 'email', 'phone', 'address']
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _flatten(record):
+    """Accept nested NDJSON records (as written by the exporter) as flat form data"""
+    row = {key: value for key, value in record.items() if not isinstance(value, (dict, list))}
+    for party in PARTIES:
+        for field, value in (record.get(party) or {}).items():
+            row[f'{party}_{field}'] = value
+    return row
+
+
+def read_rows(path, fmt=None):
+    """Yield each row of a CSV or NDJSON file (optionally gzipped) as a flat dict"""
+    if fmt is None:
+        fmt = 'ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv'
+    with _open(path) as handle:
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield _flatten(json.loads(line))
+
+
+def clean_row(row):
+    """
+    Validate a row against the fields of PackageImportForm.
+
+    Instantiating a form deep-copies every field and widget, which costs more
+    than the database writes at import volumes, so the shared field instances
+    are used directly. The form has no clean_<field> or clean() hooks; if it
+    grows any, they must be applied here too.
+    """
+    cleaned = {}
+    errors = {}
+    for name, field in PackageImportForm.base_fields.items():
+        value = field.widget.value_from_datadict(row, {}, name)
+        try:
+            cleaned[name] = field.clean(value)
+        except ValidationError as error:
+            errors[name] = error.messages
+    return cleaned, errors
+
+
+class Checkpoint:
+    """
+    Index of the last committed row, kept in an ImportCheckpoint row.
+
+    save() must run in the transaction that writes the batch it records, so
+    a crash can never leave committed packages beyond the checkpoint (and
+    import them again on resume). A checkpoint without a name is not kept.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.last_row = -1
+        self.imported = 0
+        self.rejected = 0
+        # Rows handled by this process, as opposed to totals across resumes.
+        self.session_imported = 0
+        self.session_rejected = 0
+        state = ImportCheckpoint.objects.filter(name=name).first() if name else None
+        if state:
+            self.last_row = state.last_row
+            self.imported = state.imported
+            self.rejected = state.rejected
+
+    def save(self, last_row, imported, rejected):
+        if self.name:
+            ImportCheckpoint.objects.update_or_create(name=self.name, defaults={
+                'last_row': last_row, 'imported': self.imported + imported, 'rejected': self.rejected + rejected,
+            })
+        self.last_row = last_row
+        self.imported += imported
+        self.rejected += rejected
+        self.session_imported += imported
+        self.session_rejected += rejected
+
+
+def resolve_customers(rows):
+    """
+    Map every sender/receiver email in the rows to a Customer id.
+
+    Existing customers are looked up with one query per batch, the rest are
+    created with a single bulk_create. Like the API, an existing customer is
+    reused by email even if the other details differ.
+    """
+    wanted = {}
+    for row in rows:
+        for party in PARTIES:
+            email = row[f'{party}_email']
+            wanted.setdefault(email, {field: row[f'{party}_{field}'] for field in CUSTOMER_FIELDS})
+
+    ids = {}
+    for customer_id, email in Customer.objects.filter(email__in=wanted).order_by('pk').values_list('pk', 'email'):
+        ids.setdefault(email, customer_id)
+
+    missing = [Customer(**details) for email, details in wanted.items() if email not in ids]
+    if missing:
+        Customer.objects.bulk_create(missing)
+        if any(customer.pk is None for customer in missing):
+            # Backends that cannot return ids from a bulk insert.
+            emails = [customer.email for customer in missing]
+            for customer_id, email in Customer.objects.filter(email__in=emails).order_by('pk').values_list('pk', 'email'):
+                ids.setdefault(email, customer_id)
+        else:
+            for customer in missing:
+                ids[customer.email] = customer.pk
+    return ids
+
+
+def import_batch(rows):
+    """Write a batch of already validated rows in one transaction; return the packages created"""
+    tracking_numbers = Package.generate_tracking_numbers(len(rows))
+    with transaction.atomic():
+        customer_ids = resolve_customers(rows)
+        location_ids = resolve_locations([row['current_location'] or 'Processing Center' for row in rows])
+        packages = []
+        for row, tracking_number in zip(rows, tracking_numbers):
+            status = row['status'] or 'pending'
+            package = Package(
+                tracking_number=tracking_number,
+                verification_code=Package.generate_verification_code(),
+                sender_id=customer_ids[row['sender_email']],
+                receiver_id=customer_ids[row['receiver_email']],
+                description=row['description'],
+                weight=row['weight'],
+                service_tier=row['service_tier'],
+                status=status,
+                payment_status=row['payment_status'] or 'pending',
+                current_location_id=location_ids[row['current_location'] or 'Processing Center'],
+            )
+            if status != 'delivered':
+                package.estimated_delivery = eta_engine.estimate(
+                    row['sender_address'], row['receiver_address'], row['service_tier']
+                ).date
+            packages.append(package)
+        prices = tariff_engine.quote_many(
+            [package.weight for package in packages], [package.service_tier for package in packages]
+        )
+        for package, price in zip(packages, prices):
+            package.price = price
+        Package.objects.bulk_create(packages)
+        record_revenue(added=[revenue_row(package) for package in packages])
+
+        if any(package.pk is None for package in packages):
+            ids = dict(
+                Package.objects.filter(tracking_number__in=tracking_numbers)
+                .values_list('tracking_number', 'pk')
+            )
+            for package in packages:
+                package.pk = ids[package.tracking_number]
+        get_search_backend().update([package.pk for package in packages])
+
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(
+                package_id=package.pk,
+                status=package.status,
+                location_id=package.current_location_id,
+                notes='Package imported'
+            )
+            for package in packages
+        ])
+    return packages
+
+
+def run_import(path, fmt=None, batch_size=IMPORT_BATCH_SIZE, checkpoint=None,
+               shard=0, shards=1, on_progress=None, on_reject=None):
+    """
+    Import a file in batches, resuming after the row recorded in the named checkpoint.
+
+    With ``shards > 1`` only rows whose index modulo ``shards`` equals
+    ``shard`` are handled, so several processes can split one file.
+    ``on_progress(checkpoint)`` is called after each committed batch and
+    ``on_reject(row_index, errors)`` for every row that fails validation.
+    """
+    checkpoint = Checkpoint(checkpoint)
+    valid = []
+    rejected = 0
+    last_row = checkpoint.last_row
+
+    def flush():
+        nonlocal valid, rejected
+        with transaction.atomic():
+            if valid:
+                import_batch(valid)
+            checkpoint.save(last_row, len(valid), rejected)
+        valid, rejected = [], 0
+        if on_progress:
+            on_progress(checkpoint)
+
+    for index, row in enumerate(read_rows(path, fmt)):
+        if index <= checkpoint.last_row or index % shards != shard:
+            continue
+        last_row = index
+        cleaned, errors = clean_row(row)
+        if errors:
+            rejected += 1
+            if on_reject:
+                on_reject(index, errors)
+        else:
+            valid.append(cleaned)
+        if len(valid) + rejected >= batch_size:
+            flush()
+    if valid or rejected or last_row != checkpoint.last_row:
+        flush()
+    return checkpoint
+
+
+class ImportProgress:
+    """Throughput report across one or more import workers"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.imported = {}
+        self.rejected = {}
+
+    def update(self, shard, imported, rejected):
+        self.imported[shard] = imported
+        self.rejected[shard] = rejected
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        imported = sum(self.imported.values())
+        rejected = sum(self.rejected.values())
+        rate = imported / elapsed if elapsed else 0.0
+        return f"{imported} imported, {rejected} rejected in {elapsed:.1f}s ({rate:.0f} rows/s)"
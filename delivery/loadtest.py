@@ -0,0 +1,542 @@
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.urls import reverse
+from accounts.models import UserProfile
+from .locations import resolve_location
+from .models import ApiKey, Customer, Package, TrackingEvent
+from .pricing import tariff_engine
+
+SEED_BATCH_SIZE = 5000
+# Claimable packages, customers and sessions kept in the fixture; the rest are never requested.
+FIXTURE_SAMPLE = 1000
+
+STATUS_ORDER = [status for status, _ in Package.STATUS_CHOICES]
+REGIONS = ['NY', 'CA', 'TX', 'IL', 'FL', 'WA', 'GA', 'MA']
+
+
+def seed_load_test(packages, users, seed=0):
+    """
+    Add ``users`` logged-in site users and ``packages`` packages, with tracking histories, for load testing.
+
+    A third of the packages are sent by the users and a fifth addressed to
+    them, so dashboards have something to show. Returns the fixture the
+    load generator works from: every tracking number, a sample of
+    (tracking number, verification code) pairs that can be claimed, a
+    sample of customers, session ids of the users and a raw API key with
+    the create and track scopes and no practical rate limit.
+    """
+    rng = random.Random(seed)
+    run = secrets.token_hex(3)
+    hubs = [resolve_location(f'Load Test Hub {number}') for number in range(5)]
+
+    accounts = User.objects.bulk_create([
+        User(username=f'load-{run}-{number}', email=f'load-{run}-{number}@example.com', password=make_password(None))
+        for number in range(users)
+    ])
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, phone='555-0100', address=f'{number} Load St, Springfield, {rng.choice(REGIONS)} 10001')
+        for number, user in enumerate(accounts)
+    ])
+    customers = Customer.objects.bulk_create([
+        Customer(name=f'Load Customer {number}', email=f'load-{run}-customer{number}@example.com', phone='555-0101',
+                 address=f'{number} Load Ave, Springfield, {rng.choice(REGIONS)} {10000 + number % 90000}')
+        for number in range(max(users * 2, 100))
+    ])
+
+    tracking_numbers, claims = [], []
+    for start in range(0, packages, SEED_BATCH_SIZE):
+        batch = []
+        for tracking_number in Package.generate_tracking_numbers(min(SEED_BATCH_SIZE, packages - start)):
+            weight = round(rng.uniform(0.2, 20), 2)
+            tier = rng.choice(['standard', 'standard', 'express', 'same_day'])
+            batch.append(Package(
+                tracking_number=tracking_number, verification_code=f'{rng.randrange(10 ** 6):06d}',
+                sender=rng.choice(customers), receiver=rng.choice(customers),
+                sender_user=rng.choice(accounts) if rng.random() < 1 / 3 else None,
+                receiver_user=rng.choice(accounts) if rng.random() < 1 / 5 else None,
+                description='Load test parcel', weight=weight, service_tier=tier,
+                price=tariff_engine.quote(weight, tier), status=rng.choice(STATUS_ORDER),
+                current_location_id=rng.choice(hubs), payment_status='paid',
+            ))
+        batch = Package.objects.bulk_create(batch)
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(package=package, status=status, location_id=rng.choice(hubs))
+            for package in batch for status in STATUS_ORDER[:STATUS_ORDER.index(package.status) + 1]
+        ])
+        tracking_numbers += [package.tracking_number for package in batch]
+        claims += [[package.tracking_number, package.verification_code] for package in batch
+                   if package.status != 'delivered']
+
+    sessions = []
+    for user in accounts[:FIXTURE_SAMPLE]:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        sessions.append(session.session_key)
+
+    api_key = ApiKey(name=f'Load test {run}', scopes='create,track', rate_limit=10 ** 9, burst=10 ** 9)
+    raw_key = api_key.generate_key()
+    api_key.save()
+    return {
+        'tracking_numbers': tracking_numbers,
+        'claims': rng.sample(claims, min(len(claims), FIXTURE_SAMPLE)),
+        'customers': [
+            {'name': customer.name, 'email': customer.email, 'phone': customer.phone, 'address': customer.address}
+            for customer in rng.sample(customers, min(len(customers), FIXTURE_SAMPLE))
+        ],
+        'sessions': sessions,
+        'api_key': raw_key,
+    }
+
+
+class Scenarios:
+    """
+    The requests a benchmark mix is made of, drawn at random from a seeded fixture.
+
+    Each method returns (method, path, headers, body). Claims carry a CSRF
+    cookie and header of their own; Django accepts the unmasked secret.
+    """
+    names = ('track', 'api_track', 'dashboard', 'api_create', 'claim')
+
+    def __init__(self, fixture, rng):
+        self.fixture = fixture
+        self.rng = rng
+        self.csrf_token = secrets.token_hex(16)
+
+    def tracking_number(self):
+        return self.rng.choice(self.fixture['tracking_numbers'])
+
+    def track(self):
+        return 'GET', reverse('track_package_detail', args=[self.tracking_number()]), {}, b''
+
+    def api_track(self):
+        path = reverse('api_track_package', args=[self.tracking_number()])
+        return 'GET', path, {'API-KEY': self.fixture['api_key']}, b''
+
+    def dashboard(self):
+        return 'GET', reverse('dashboard'), {'Cookie': f"sessionid={self.rng.choice(self.fixture['sessions'])}"}, b''
+
+    def api_create(self):
+        sender, receiver = self.rng.sample(self.fixture['customers'], 2)
+        body = json.dumps({
+            'sender': sender, 'receiver': receiver, 'description': 'Load test parcel',
+            'weight': round(self.rng.uniform(0.2, 20), 2), 'service_tier': 'standard',
+        }).encode()
+        headers = {'API-KEY': self.fixture['api_key'], 'Content-Type': 'application/json'}
+        return 'POST', reverse('api_create_package'), headers, body
+
+    def claim(self):
+        tracking_number, code = self.rng.choice(self.fixture['claims'])
+        body = f'tracking_number={tracking_number}&verification_code={code}'.encode()
+        headers = {
+            'Cookie': f'csrftoken={self.csrf_token}', 'X-CSRFToken': self.csrf_token,
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+        return 'POST', reverse('claim_package'), headers, body
+
+
+class HttpConnection:
+    """
+    A keep-alive HTTP/1.1 connection to a local server, reopened whenever the server closes it.
+
+    Enough of HTTP for benchmarking the project: responses are read by
+    Content-Length, chunked encoding or to the end of the connection.
+    """
+
+    def __init__(self, host, port, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request and return (status, body)"""
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(self._exchange(method, path, headers or {}, body), self.timeout)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.close()
+            if not reused:
+                raise
+        # The server dropped an idle keep-alive connection; try once on a fresh one.
+        try:
+            return await asyncio.wait_for(self._exchange(method, path, headers or {}, body), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _exchange(self, method, path, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readuntil(b'\r\n')).split()[1])
+        response_headers = {}
+        while (line := await self.reader.readuntil(b'\r\n')) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunks()
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+    async def _read_chunks(self):
+        parts = []
+        while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        while await self.reader.readuntil(b'\r\n') != b'\r\n':
+            pass
+        return b''.join(parts)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class LatencyRecorder:
+    """Latencies and outcomes of requests, by endpoint; an outcome is a status code or an exception name"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, outcome):
+        self.latencies[endpoint].append(seconds)
+        self.outcomes[endpoint][outcome] += 1
+
+    @staticmethod
+    def is_error(outcome):
+        return not isinstance(outcome, int) or outcome >= 400
+
+    def _summary(self, latencies, outcomes, elapsed):
+        milliseconds = np.array(latencies) * 1000
+        p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99]) if len(milliseconds) else (0, 0, 0)
+        errors = sum(count for outcome, count in outcomes.items() if self.is_error(outcome))
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4) if latencies else 0,
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(milliseconds.max()), 2) if len(milliseconds) else 0,
+            'outcomes': {str(outcome): count for outcome, count in sorted(outcomes.items(), key=str)},
+        }
+
+    def summary(self, elapsed):
+        """Figures for all requests and per endpoint, over ``elapsed`` seconds"""
+        everything, outcomes = [], Counter()
+        for endpoint, latencies in self.latencies.items():
+            everything += latencies
+            outcomes.update(self.outcomes[endpoint])
+        return {
+            'total': self._summary(everything, outcomes, elapsed),
+            'endpoints': {
+                endpoint: self._summary(latencies, self.outcomes[endpoint], elapsed)
+                for endpoint, latencies in sorted(self.latencies.items())
+            },
+        }
+
+
+async def timed_request(connection, recorder, endpoint, method, path, headers=None, body=b''):
+    """Make a request, record its latency and return its outcome; failures are recorded, not raised"""
+    started = time.perf_counter()
+    try:
+        outcome, _ = await connection.request(method, path, headers, body)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+        outcome = type(exc).__name__
+    if recorder is not None:
+        recorder.record(endpoint, time.perf_counter() - started, outcome)
+    return outcome
+
+
+async def run_mix(host, port, scenarios, weights, concurrency, duration, warmup=0):
+    """
+    Drive ``concurrency`` clients, each with its own connection, through a weighted mix for ``duration`` seconds.
+
+    ``weights`` maps scenario names to relative weights. Requests started in
+    the first ``warmup`` seconds are not recorded. Returns the recorder.
+    """
+    recorder = LatencyRecorder()
+    names, cumulative = list(weights), np.cumsum(list(weights.values())).tolist()
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def client():
+        connection = HttpConnection(host, port)
+        try:
+            while (now := time.perf_counter()) < deadline:
+                name = scenarios.rng.choices(names, cum_weights=cumulative)[0]
+                await timed_request(
+                    connection, recorder if now >= measure_from else None, name, *getattr(scenarios, name)()
+                )
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return recorder
+
+
+def read_request_log(path, limit=None):
+    """
+    Entries of a log written by RequestLogMiddleware, in start order, and how many lines were unreadable.
+
+    With ``limit``, only the first ``limit`` requests are kept.
+    """
+    entries, unreadable = [], 0
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+                entry.update(
+                    ts=float(entry['ts']), ms=float(entry['ms']), status=int(entry['status']),
+                    method=str(entry['method']), path=str(entry['path']),
+                )
+            except (ValueError, KeyError, TypeError):
+                unreadable += 1
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries[:limit] if limit else entries, unreadable
+
+
+def remap_tracking_numbers(entries, tracking_numbers, rng):
+    """
+    Map the tracking numbers requested in ``entries`` onto seeded ``tracking_numbers``, one to one.
+
+    Each recorded number keeps its share of the requests, so the popularity
+    skew of the log survives. Numbers only ever requested with a 404 map to
+    numbers never issued, so misses stay misses. If the log asks for more
+    numbers than were seeded, the mapping wraps around.
+    """
+    found, missing = [], []
+    statuses = defaultdict(set)
+    for entry in entries:
+        if entry.get('tracking_number'):
+            statuses[entry['tracking_number']].add(entry['status'])
+    for tracking_number, seen in statuses.items():
+        (missing if seen == {404} else found).append(tracking_number)
+    seeded = rng.sample(tracking_numbers, min(len(found), len(tracking_numbers)))
+    mapping = {tracking_number: seeded[index % len(seeded)] for index, tracking_number in enumerate(found)}
+    mapping.update({tracking_number: f'NX{secrets.token_hex(5).upper()}' for tracking_number in missing})
+    return mapping
+
+
+class Replay:
+    """
+    Requests rebuilt from request log entries against a seeded fixture.
+
+    GETs are sent to the recorded path with the tracking number remapped,
+    with a seeded session standing in for each recorded client and the
+    fixture's API key where one was sent. Bodies are not logged, so API
+    creates and claims get fresh bodies from Scenarios; other POSTs, and
+    other methods, cannot be replayed.
+    """
+
+    def __init__(self, entries, fixture, rng):
+        self.fixture = fixture
+        self.scenarios = Scenarios(fixture, rng)
+        self.tracking_numbers = remap_tracking_numbers(entries, fixture['tracking_numbers'], rng)
+        self.sessions = {}
+
+    def session(self, client):
+        if client not in self.sessions:
+            self.sessions[client] = self.fixture['sessions'][len(self.sessions) % len(self.fixture['sessions'])]
+        return self.sessions[client]
+
+    def request(self, entry):
+        """(method, path, headers, body) for a log entry, or None if it cannot be replayed"""
+        view = entry.get('view')
+        if entry['method'] == 'POST':
+            if view == 'api_create_package':
+                return self.scenarios.api_create()
+            if view == 'claim_package':
+                return self.scenarios.claim()
+            return None
+        if entry['method'] != 'GET':
+            return None
+        path = entry['path']
+        if view and entry.get('tracking_number'):
+            path = reverse(view, kwargs={'tracking_number': self.tracking_numbers[entry['tracking_number']]})
+        if entry.get('query'):
+            path += '?' + entry['query']
+        headers = {}
+        if entry.get('client'):
+            headers['Cookie'] = f"sessionid={self.session(entry['client'])}"
+        if entry.get('api_key'):
+            headers['API-KEY'] = self.fixture['api_key']
+        return 'GET', path, headers, b''
+
+
+def peak_concurrency(intervals):
+    """Most (start, end) intervals open at once"""
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    peak = current = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+
+
+async def replay_schedule(host, port, schedule, speed=1.0):
+    """
+    Send each (offset, endpoint, recorded status, request) of ``schedule`` at ``offset / speed`` seconds from now.
+
+    A request goes out on an idle connection, or a new one when all are busy,
+    so as many are in flight as the timing calls for. Returns the recorder,
+    status changes from the recorded ones as {endpoint: Counter of
+    'recorded->replayed'}, the peak number of requests in flight, the most
+    a request went out late in seconds, and the seconds taken.
+    """
+    recorder = LatencyRecorder()
+    changes = defaultdict(Counter)
+    idle, intervals, pending = [], [], set()
+    lag = 0.0
+
+    async def send(endpoint, recorded, request):
+        connection = idle.pop() if idle else HttpConnection(host, port)
+        started = time.perf_counter()
+        try:
+            outcome = await timed_request(connection, recorder, endpoint, *request)
+        finally:
+            intervals.append((started, time.perf_counter()))
+            idle.append(connection)
+        if outcome != recorded:
+            changes[endpoint][f'{recorded}->{outcome}'] += 1
+
+    started = time.perf_counter()
+    for offset, endpoint, recorded, request in schedule:
+        delay = started + offset / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            lag = max(lag, -delay)
+        task = asyncio.create_task(send(endpoint, recorded, request))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    for connection in idle:
+        connection.close()
+    return recorder, changes, peak_concurrency(intervals), lag, elapsed
+
+
+def server_environment(workdir):
+    """Environment that points the project at the database and static files kept in ``workdir``"""
+    workdir = Path(workdir)
+    return {
+        **os.environ,
+        'DATABASE_PATH': str(workdir / 'db.sqlite3'),
+        'STATIC_ROOT': str(workdir / 'static'),
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': '127.0.0.1',
+        'REQUEST_LOG_PATH': '',
+    }
+
+
+def manage(env, *args):
+    """Run a management command in a separate process with ``env``"""
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def prepare_workdir(workdir, packages, users, seed=0):
+    """
+    Migrate, collect static files and seed a database in ``workdir``, unless it was prepared before.
+
+    Returns the fixture written by seed_load_test.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    fixture_path = workdir / 'fixture.json'
+    if not fixture_path.exists():
+        env = server_environment(workdir)
+        manage(env, 'migrate', '--noinput')
+        manage(env, 'collectstatic', '--noinput')
+        manage(env, 'seed_load_test', '--packages', str(packages), '--users', str(users),
+               '--seed', str(seed), '--output', str(fixture_path))
+    with open(fixture_path) as handle:
+        return json.load(handle)
+
+
+class LocalServer:
+    """
+    gunicorn serving the project on a free local port, as a context manager.
+
+    Waits until the services page answers before returning; ``port`` is set
+    while it runs. Its log goes to server.log in the working directory.
+    """
+
+    def __init__(self, workdir, workers=2, threads=4, env=None, startup_timeout=60):
+        self.workdir = Path(workdir)
+        self.workers = workers
+        self.threads = threads
+        self.env = env or server_environment(workdir)
+        self.startup_timeout = startup_timeout
+
+    def __enter__(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self.log = open(self.workdir / 'server.log', 'ab')
+        self.process = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', 'swifttrack.wsgi', '--bind', f'127.0.0.1:{self.port}',
+            '--workers', str(self.workers), '--threads', str(self.threads), '--log-level', 'warning',
+        ], cwd=settings.BASE_DIR, env=self.env, stdout=self.log, stderr=self.log)
+
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                self.log.close()
+                raise RuntimeError(f"gunicorn exited with {self.process.returncode}; see {self.workdir / 'server.log'}")
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{self.port}{reverse("services")}', timeout=5).close()
+                return self
+            except urllib.error.HTTPError:
+                # Up, if unwell; the benchmark will count the errors.
+                return self
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError(f"gunicorn did not answer within {self.startup_timeout}s")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
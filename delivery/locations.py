@@ -0,0 +1,70 @@
+import threading
+from django.db import transaction
+from .models import Location, location_key, normalize_location_name
+
+# Where tracking events without a location are recorded, as in the backfill.
+UNKNOWN_LOCATION = 'Unknown'
+
+
+class LocationRegistry:
+    """
+    In-process intern table from location names to Location ids.
+
+    Writers pass free text; every spelling that normalizes to the same key
+    maps to one row. Known keys are answered from memory, the rest with one
+    SELECT and, for names never seen before, one multi-row INSERT. Ids read
+    inside a transaction are only cached once it commits, so a rollback
+    cannot leave the cache pointing at a row that does not exist.
+    """
+    max_entries = 100000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def _remember(self, ids):
+        with self._lock:
+            if len(self._ids) + len(ids) > self.max_entries:
+                self._ids.clear()
+            self._ids.update(ids)
+
+    def resolve_many(self, names):
+        """Map each name to its Location id, creating missing locations; blank names map to None"""
+        display_names = {}
+        for name in names:
+            display = normalize_location_name(name)
+            if display:
+                display_names.setdefault(location_key(display), display)
+        ids = {key: self._ids[key] for key in display_names if key in self._ids}
+
+        missing = [key for key in display_names if key not in ids]
+        if missing:
+            found = dict(Location.objects.filter(key__in=missing).values_list('key', 'pk'))
+            new = [key for key in missing if key not in found]
+            if new:
+                Location.objects.bulk_create(
+                    [Location(name=display_names[key], key=key) for key in new],
+                    ignore_conflicts=True
+                )
+                found.update(Location.objects.filter(key__in=new).values_list('key', 'pk'))
+            ids.update(found)
+            transaction.on_commit(lambda: self._remember(found))
+
+        return {name: ids.get(location_key(name)) for name in names}
+
+    def resolve(self, name, blank=None):
+        """The Location id for one name; a blank name resolves to ``blank`` (a name) or None"""
+        if not normalize_location_name(name):
+            if blank is None:
+                return None
+            name = blank
+        return self.resolve_many([name])[name]
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+locations = LocationRegistry()
+resolve_location = locations.resolve
+resolve_locations = locations.resolve_many
@@ -0,0 +1,39 @@
+import signal
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from delivery.assignment import assign_couriers
+
+
+class Command(BaseCommand):
+    help = 'Assign couriers to pending pickups and out-for-delivery packages by zone, capacity and load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', help='Only consider packages new since the last run')
+        parser.add_argument('--follow', action='store_true', help='Keep assigning new arrivals until interrupted')
+        parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds between incremental runs')
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+
+        incremental = options['incremental']
+        while not stopping.is_set():
+            close_old_connections()
+            started = time.perf_counter()
+            result = assign_couriers(incremental=incremental)
+            if result is None:
+                self.stderr.write("Another run moved the cursor first; nothing written")
+            elif result['pickups'] or result['deliveries'] or result['unassigned'] or not options['follow']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Assigned {result['pickups']} pickups and {result['deliveries']} deliveries "
+                    f"across {result['couriers']} couriers in {time.perf_counter() - started:.1f}s; "
+                    f"{result['unassigned']} left without a courier"
+                ))
+            if not options['follow']:
+                break
+            # Later runs only need the packages that arrived in between.
+            incremental = True
+            stopping.wait(options['poll_interval'])
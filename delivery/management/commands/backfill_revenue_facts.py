@@ -0,0 +1,39 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+from delivery.models import Package
+from delivery.revenue import rebuild_revenue_facts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily revenue facts from packages, a bounded range of days per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD); defaults to the first package')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days recomputed per transaction')
+
+    def handle(self, *args, **options):
+        start = options['start']
+        if start is None:
+            first = Package.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write("No packages; nothing to backfill")
+                return
+            start = timezone.localdate(first)
+        end = options['end'] or timezone.localdate()
+
+        started = time.perf_counter()
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), end)
+            rebuild_revenue_facts(chunk_start, chunk_end)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Rebuilt {chunk_start} to {chunk_end}")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt revenue facts for {start} to {end} in {time.perf_counter() - started:.1f}s"
+        ))
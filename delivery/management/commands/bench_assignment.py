@@ -0,0 +1,78 @@
+import json
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from delivery.assignment import DELIVERY_CURSOR, PICKUP_CURSOR, assign_couriers, courier_loads
+from delivery.models import Courier, Customer, Package, RollupCursor
+
+
+class Command(BaseCommand):
+    help = 'Time courier assignment over a generated day of packages, rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=300000)
+        parser.add_argument('--couriers', type=int, default=3000)
+        parser.add_argument('--zones', type=int, default=50)
+        parser.add_argument('--arrivals', type=int, default=2000, help='New packages for the incremental run')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Two-letter regions like US states; address_region() ignores digits.
+        zones = [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase][:options['zones']]
+        results = {'packages': options['packages'], 'couriers': options['couriers'], 'zones': len(zones)}
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            RollupCursor.objects.filter(name__in=[PICKUP_CURSOR, DELIVERY_CURSOR]).delete()
+            customers = Customer.objects.bulk_create([
+                Customer(name=f'Bench {number}', email=f'bench{number}@example.com', phone='555',
+                         address=f'{number} Bench Rd, Benchton, {zone} {10000 + number}')
+                for zone in zones for number in range(20)
+            ])
+            # A few couriers work without a zone, to help out where zones run short.
+            Courier.objects.bulk_create([
+                Courier(name=f'Bench courier {number}', zone='' if number % 20 == 0 else rng.choice(zones),
+                        capacity=rng.randint(60, 140))
+                for number in range(options['couriers'])
+            ])
+
+            def generate(count):
+                for start in range(0, count, 5000):
+                    generate_batch(min(5000, count - start))
+
+            def generate_batch(count):
+                numbers = Package.generate_tracking_numbers(count)
+                Package.objects.bulk_create([
+                    Package(
+                        tracking_number=tracking_number, verification_code='000000',
+                        sender=rng.choice(customers), receiver=rng.choice(customers),
+                        description='Bench parcel', weight=1, price=10,
+                        service_tier=rng.choice(['standard', 'standard', 'express', 'same_day']),
+                        status=rng.choice(['pending', 'out_for_delivery', 'in_transit']),
+                    )
+                    for tracking_number in numbers
+                ])
+
+            generate(options['packages'])
+            results['generate_seconds'] = round(time.perf_counter() - started, 1)
+
+            started = time.perf_counter()
+            results['full'] = assign_couriers()
+            results['full']['seconds'] = round(time.perf_counter() - started, 2)
+
+            generate(options['arrivals'])
+            started = time.perf_counter()
+            results['incremental'] = assign_couriers(incremental=True)
+            results['incremental']['seconds'] = round(time.perf_counter() - started, 2)
+
+            capacities = dict(Courier.objects.values_list('pk', 'capacity'))
+            ratios = [load / capacities[courier_id] for courier_id, load in courier_loads().items()]
+            results['load_of_capacity'] = {
+                'min': round(min(ratios), 3), 'max': round(max(ratios), 3), 'mean': round(sum(ratios) / len(ratios), 3),
+            }
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,120 @@
+import gzip
+import json
+import time
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from delivery.api_auth import key_cache
+from delivery.benchmarks import bench_client
+from delivery.compression import brotli, compress_body
+from delivery.locations import resolve_location, resolve_locations
+from delivery.models import ApiKey, Customer, Package, TrackingEvent
+from delivery.storage import minify_css, minify_js
+
+ENCODINGS = [('identity', ''), ('gzip', 'gzip'), ('br', 'br, gzip')]
+
+
+def _body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = 'Measure bytes on the wire and server CPU per response for each content coding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=120, help='Packages on the dashboard')
+        parser.add_argument('--events', type=int, default=200, help='Events on the tracked package')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        encodings = [item for item in ENCODINGS if item[0] != 'br' or brotli is not None]
+        results = {'dynamic': {}, 'static': self._static_sizes()}
+        with transaction.atomic():
+            user, raw_key, urls = self._seed(options['packages'], options['events'])
+            with bench_client() as client, override_settings(PAGE_CACHE_TIMEOUTS={}):
+                client.force_login(user)
+                for label, url in urls.items():
+                    results['dynamic'][label] = {
+                        name: self._measure(client, url, accept, raw_key, options['iterations'])
+                        for name, accept in encodings
+                    }
+                    body = _body(client.get(url, HTTP_API_KEY=raw_key))
+                    for name, stats in results['dynamic'][label].items():
+                        if name != 'identity':
+                            stats['compress_cpu_ms'] = self._compress_cost(body, name, options['iterations'])
+            transaction.set_rollback(True)
+        key_cache.clear()
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _measure(self, client, url, accept, raw_key, iterations):
+        headers = {'HTTP_ACCEPT_ENCODING': accept, 'HTTP_API_KEY': raw_key}
+        _body(client.get(url, **headers))
+        cpu_started = time.process_time()
+        for _ in range(iterations):
+            response = client.get(url, **headers)
+            size = len(_body(response))
+        cpu = time.process_time() - cpu_started
+        return {
+            'content_encoding': response.get('Content-Encoding', 'identity'),
+            'bytes': size,
+            'cpu_ms_per_response': round(cpu / iterations * 1000, 3),
+        }
+
+    @staticmethod
+    def _compress_cost(body, encoding, iterations):
+        """CPU spent on compression alone, separated from rendering noise"""
+        cpu_started = time.process_time()
+        for _ in range(iterations):
+            compress_body(body, encoding)
+        return round((time.process_time() - cpu_started) / iterations * 1000, 3)
+
+    def _static_sizes(self):
+        sizes = {}
+        for name, minifier in (('css/style.css', minify_css), ('js/main.js', minify_js)):
+            with open(finders.find(name), encoding='utf-8') as source:
+                original = source.read()
+            minified = minifier(original).encode()
+            sizes[name] = {
+                'original': len(original.encode()),
+                'minified': len(minified),
+                'minified_gzip': len(gzip.compress(minified, 9)),
+            }
+            if brotli is not None:
+                sizes[name]['minified_br'] = len(brotli.compress(minified, quality=11))
+        return sizes
+
+    def _seed(self, package_count, event_count):
+        """Create throwaway data; the caller rolls it back"""
+        user = User.objects.create_user('bench-compression', 'bench@example.com', 'unused-password')
+        sender = Customer.objects.create(name='Bench Sender', email='s@example.com', phone='1', address='1 Main St')
+        receiver = Customer.objects.create(name='Bench Receiver', email='r@example.com', phone='2', address='2 Oak Ave')
+        hub_id = resolve_location('Bench Hub')
+        scan_ids = resolve_locations([f'Hub {i}' for i in range(event_count)])
+        packages = [
+            Package.objects.create(
+                sender=sender, receiver=receiver, sender_user=user,
+                description=f'Bench package {i}', weight=1 + i % 7,
+                status=Package.STATUS_CHOICES[i % len(Package.STATUS_CHOICES)][0],
+                current_location_id=hub_id
+            )
+            for i in range(package_count)
+        ]
+        tracked = packages[0]
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(package=tracked, status='in_transit', location_id=scan_ids[f'Hub {i}'], notes=f'Scan {i}')
+            for i in range(event_count)
+        ])
+        api_key = ApiKey(name='bench-compression', scopes='track', rate_limit=10 ** 6, burst=10 ** 6)
+        raw_key = api_key.generate_key()
+        api_key.save()
+        return user, raw_key, {
+            'dashboard_html': reverse('dashboard'),
+            'tracking_html': reverse('track_package_detail', kwargs={'tracking_number': tracked.tracking_number}),
+            'tracking_json': reverse('api_track_package', kwargs={'tracking_number': tracked.tracking_number}),
+        }
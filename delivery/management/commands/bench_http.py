@@ -0,0 +1,80 @@
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from delivery.loadtest import LocalServer, Scenarios, prepare_workdir, run_mix
+
+DEFAULT_MIX = 'track=60,api_track=15,dashboard=15,api_create=5,claim=5'
+
+
+def parse_mix(value):
+    """'track=60,claim=5' as {'track': 60.0, 'claim': 5.0}"""
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in Scenarios.names:
+            raise CommandError(f"Unknown request kind {name!r}; choose from {', '.join(Scenarios.names)}")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Weight of {name!r} must be a number")
+    if not any(weight > 0 for weight in weights.values()):
+        raise CommandError("The mix needs at least one positive weight")
+    return weights
+
+
+class Command(BaseCommand):
+    help = 'Seed a scratch database, serve it with gunicorn and report latency percentiles under a request mix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=10000, help='Packages to seed')
+        parser.add_argument('--users', type=int, default=200, help='Logged-in users to seed')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Relative weights of {", ".join(Scenarios.names)} (default {DEFAULT_MIX})')
+        parser.add_argument('--concurrency', type=int, default=32, help='Clients with a request in flight')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds measured')
+        parser.add_argument('--warmup', type=float, default=5, help='Seconds of load before measuring')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+        parser.add_argument('--workdir',
+                            help='Keep the seeded database here and reuse it on later runs (default: a temporary one)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the report to this file')
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='swifttrack-bench-')
+        try:
+            try:
+                fixture = prepare_workdir(workdir, options['packages'], options['users'], options['seed'])
+            except subprocess.CalledProcessError as exc:
+                raise CommandError(f"Preparing {workdir} failed: {exc}")
+            scenarios = Scenarios(fixture, random.Random(options['seed']))
+            try:
+                with LocalServer(workdir, options['workers'], options['threads']) as server:
+                    recorder = asyncio.run(run_mix(
+                        '127.0.0.1', server.port, scenarios, weights,
+                        options['concurrency'], options['duration'], options['warmup']
+                    ))
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        finally:
+            if not options['workdir']:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            'config': {
+                'packages': len(fixture['tracking_numbers']), 'users': len(fixture['sessions']), 'mix': weights,
+                **{name: options[name] for name in ('concurrency', 'duration', 'warmup', 'workers', 'threads', 'seed')},
+            },
+            **recorder.summary(options['duration']),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        self.stdout.write(output)
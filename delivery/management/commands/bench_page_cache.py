@@ -0,0 +1,49 @@
+import json
+import tempfile
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from delivery.benchmarks import bench_client, measure
+from delivery.checks import cache_is_shared
+from delivery.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Compare rendered and cached responses per second for anonymous pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        paths = [reverse('home'), reverse('services'), reverse('track_package')]
+        package = Package.objects.order_by('-pk').first()
+        if package:
+            paths.append(reverse('track_package_detail', kwargs={'tracking_number': package.tracking_number}))
+
+        results = {}
+        with ExitStack() as stack:
+            if not cache_is_shared(settings.PAGE_CACHE_ALIAS):
+                # The page cache is off with a process-local cache; measure
+                # it against files in a scratch directory instead.
+                self.stderr.write(f"{settings.PAGE_CACHE_ALIAS!r} cache is process-local; using a file cache")
+                stack.enter_context(override_settings(CACHES={**settings.CACHES, settings.PAGE_CACHE_ALIAS: {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': stack.enter_context(tempfile.TemporaryDirectory()),
+                }}))
+            client = stack.enter_context(bench_client())
+            for path in paths:
+                with override_settings(PAGE_CACHE_TIMEOUTS={}):
+                    rendered = measure(lambda: client.get(path), options['iterations'])
+                caches[settings.PAGE_CACHE_ALIAS].clear()
+                client.get(path)
+                cached = measure(lambda: client.get(path), options['iterations'])
+                results[path] = {
+                    'rendered': rendered,
+                    'cached': cached,
+                    'speedup': round(cached['per_second'] / rendered['per_second'], 1),
+                }
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,56 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from delivery.models import PickupSlot
+from delivery.pickups import allocate, booking_days, forget
+
+BENCH_AREA = 'BENCH'
+
+
+class Command(BaseCommand):
+    help = 'Book one pickup slot from many threads at once and check it is never overbooked'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Booking attempts in all')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--capacity', type=int, default=500)
+
+    def handle(self, *args, **options):
+        day, window = booking_days()[-1], PickupSlot.WINDOW_CHOICES[0][0]
+        PickupSlot.objects.filter(area=BENCH_AREA).delete()
+        slot = PickupSlot.objects.create(area=BENCH_AREA, date=day, window=window, capacity=options['capacity'])
+        forget(slot)
+
+        def book(_):
+            started = time.perf_counter()
+            try:
+                return allocate(BENCH_AREA, day, window) is not None, time.perf_counter() - started
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(options['threads']) as pool:
+                outcomes = list(pool.map(book, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+            booked = PickupSlot.objects.get(area=BENCH_AREA).booked
+        finally:
+            PickupSlot.objects.filter(area=BENCH_AREA).delete()
+            forget(slot)
+
+        accepted = sum(1 for ok, _ in outcomes if ok)
+        latencies = sorted(latency for _, latency in outcomes)
+        self.stdout.write(json.dumps({
+            'requests': options['requests'],
+            'threads': options['threads'],
+            'capacity': options['capacity'],
+            'accepted': accepted,
+            'booked': booked,
+            'seconds': round(elapsed, 3),
+            'per_second': round(options['requests'] / elapsed, 1),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        }, indent=2))
+        if accepted != booked or booked > options['capacity']:
+            raise CommandError(f"Slot overbooked or miscounted: {accepted} accepted, {booked} booked")
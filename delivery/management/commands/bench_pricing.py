@@ -0,0 +1,60 @@
+import json
+import random
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from delivery.benchmarks import measure
+from delivery.pricing import tariff_engine
+
+
+def decimal_price(weight, tier):
+    """The price worked out per call with Decimal arithmetic, as Package.calculate_price used to"""
+    base_prices = {tier: Decimal(base) for tier, (base, _) in settings.PRICING_TARIFFS.items()}
+    per_kg_rates = {tier: Decimal(rate) for tier, (_, rate) in settings.PRICING_TARIFFS.items()}
+    default = settings.PRICING_DEFAULT_TIER
+    base = base_prices.get(tier, base_prices[default])
+    rate = per_kg_rates.get(tier, per_kg_rates[default])
+    return round(base + Decimal(str(weight)) * rate, 2)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-package Decimal pricing with batch quotes from the tariff engine, and check they agree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quotes', type=int, default=10000, help='(weight, tier) pairs per batch')
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        tiers = [rng.choice(list(settings.PRICING_TARIFFS)) for _ in range(options['quotes'])]
+        # Mostly two-place weights like the form accepts, plus API-style
+        # floats with three places that round on a half cent.
+        weights = [
+            Decimal(rng.randint(1, 99999)).scaleb(-2) if rng.random() < 0.9 else rng.randint(1, 99999) / 1000
+            for _ in range(options['quotes'])
+        ]
+
+        expected = [decimal_price(weight, tier) for weight, tier in zip(weights, tiers)]
+        quoted = tariff_engine.quote_many(weights, tiers)
+        mismatches = sum(1 for a, b in zip(expected, quoted) if a != b)
+        if mismatches:
+            raise CommandError(f"{mismatches} quotes differ from Decimal pricing")
+
+        pairs = list(zip(weights, tiers))
+        results = {
+            'quotes': options['quotes'],
+            'decimal_per_package': measure(
+                lambda: [decimal_price(weight, tier) for weight, tier in pairs], options['iterations']
+            ),
+            'engine_per_package': measure(
+                lambda: [tariff_engine.quote(weight, tier) for weight, tier in pairs], options['iterations']
+            ),
+            'engine_batch': measure(lambda: tariff_engine.quote_many(weights, tiers), options['iterations']),
+            'engine_batch_cents': measure(lambda: tariff_engine.quote_cents(weights, tiers), options['iterations']),
+        }
+        for label in ('decimal_per_package', 'engine_per_package', 'engine_batch', 'engine_batch_cents'):
+            results[label]['quotes_per_second'] = round(
+                options['quotes'] * options['iterations'] / results[label]['seconds']
+            )
+        self.stdout.write(json.dumps(results, indent=2))
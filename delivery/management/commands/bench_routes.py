@@ -0,0 +1,63 @@
+import json
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from delivery.routing import Stop, distance_matrix, nearest_neighbour_tour, plan_routes, project, tour_length
+
+# Memphis Distribution Hub, as in create_sample_data.
+HUB = (35.1495, -90.049)
+
+
+def random_stops(count, seed):
+    """Stops scattered around a few dozen neighbourhoods within ~25 km of the hub"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.12, size=(40, 2))
+    picks = rng.integers(len(centers), size=count)
+    coordinates = centers[picks] + rng.normal(0, 0.015, size=(count, 2)) + HUB
+    return [
+        Stop(index, f'BENCH{index:07d}', f'{index} Bench St', float(latitude), float(longitude))
+        for index, (latitude, longitude) in enumerate(coordinates)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Time route planning for generated out-for-delivery stops and compare route lengths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', type=int, default=5000)
+        parser.add_argument('--couriers', type=int, help='Defaults to one per ROUTE_MAX_STOPS stops')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        stops = random_stops(options['stops'], options['seed'])
+
+        started = time.perf_counter()
+        routes = plan_routes(HUB, stops, options['couriers'])
+        planned = time.perf_counter() - started
+
+        # The same routes sequenced without 2-opt, and in the order the packages came.
+        nearest = unordered = 0.0
+        started = time.perf_counter()
+        for route in routes:
+            ordered = sorted(route.stops)
+            points = project([stop.latitude for stop in ordered], [stop.longitude for stop in ordered], HUB)
+            dist = distance_matrix(np.vstack([[0.0, 0.0], points]))
+            nearest += tour_length(dist, nearest_neighbour_tour(dist))
+            unordered += tour_length(dist, np.arange(len(dist)))
+        nearest_seconds = time.perf_counter() - started
+
+        sizes = [len(route.stops) for route in routes]
+        self.stdout.write(json.dumps({
+            'stops': len(stops),
+            'couriers': len(routes),
+            'stops_per_courier': {'min': min(sizes), 'max': max(sizes)},
+            'two_opt_passes': settings.ROUTE_TWO_OPT_PASSES,
+            'plan_seconds': round(planned, 3),
+            'nearest_neighbour_only_seconds': round(nearest_seconds, 3),
+            'total_km': {
+                'unordered': round(unordered, 1),
+                'nearest_neighbour': round(nearest, 1),
+                'nearest_neighbour_and_two_opt': round(sum(route.distance_km for route in routes), 1),
+            },
+        }, indent=2))
@@ -0,0 +1,84 @@
+import json
+import random
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from delivery.benchmarks import measure
+from delivery.models import Customer, Package
+from delivery.search import DatabaseSearchBackend, SQLiteFTSBackend
+
+FIRST_NAMES = ['James', 'Maria', 'Wei', 'Fatima', 'Olga', 'Carlos', 'Aisha', 'Kenji', 'Priya', 'Liam', 'Zoë', 'Tomás']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Ivanova', 'Müller', 'Nakamura', 'Patel', 'Kowalski', 'Haddad']
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Harbor Blvd', 'Maple Dr', 'Sunset Way', 'Lakeview Ct', 'Mill Lane']
+CITIES = ['Springfield', 'Riverside', 'Fairview', 'Madison', 'Georgetown', 'Ashland', 'Clinton', 'Salem']
+ITEMS = ['laptop', 'books', 'ceramic vase', 'running shoes', 'documents', 'guitar strings', 'coffee beans', 'toys']
+
+
+def _customer(rng, number):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return Customer(
+        name=f'{first} {last}',
+        email=f'{first.lower()}.{last.lower()}{number}@example.com',
+        phone=f'+1 ({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}',
+        address=f'{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)} {rng.randint(10000, 99999)}',
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains search over joined tables with the SQLite FTS5 index, on generated packages that are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=50000, help='Packages generated for the run')
+        parser.add_argument('--iterations', type=int, default=20, help='Searches timed per query and backend')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backends = {'icontains': DatabaseSearchBackend(), 'fts5': SQLiteFTSBackend()}
+        results = {}
+        with transaction.atomic():
+            customers = Customer.objects.bulk_create(
+                [_customer(rng, number) for number in range(max(options['packages'] // 2, 2))]
+            )
+            tracking_numbers = Package.generate_tracking_numbers(options['packages'])
+            Package.objects.bulk_create([
+                Package(
+                    tracking_number=tracking_number,
+                    verification_code=Package.generate_verification_code(),
+                    sender=rng.choice(customers),
+                    receiver=rng.choice(customers),
+                    description=f'{rng.choice(ITEMS)} and {rng.choice(ITEMS)}',
+                    weight=rng.randint(1, 40),
+                    price=10,
+                )
+                for tracking_number in tracking_numbers
+            ], batch_size=2000)
+            indexed = measure(lambda: backends['fts5'].rebuild(), 1)
+
+            sample = customers[len(customers) // 2]
+            queries = {
+                'receiver surname': 'Nakamura',
+                'full name': sample.name,
+                'partial street': 'Harb',
+                'street and city': 'lakeview salem',
+                'description': 'guitar',
+                'email': sample.email,
+                'phone digits': ''.join(char for char in sample.phone if char.isdigit()),
+                'tracking number': tracking_numbers[-1],
+                'no match': 'zzyzx',
+            }
+            for label, query in queries.items():
+                results[label] = {'query': query}
+                for name, backend in backends.items():
+                    timing = measure(lambda: backend.search(query), options['iterations'])
+                    results[label][name] = {'mean_ms': timing['mean_ms'], 'p95_ms': timing['p95_ms']}
+                    results[label][f'{name}_matches'] = backend.search(query).total
+                results[label]['speedup'] = round(
+                    results[label]['icontains']['mean_ms'] / max(results[label]['fts5']['mean_ms'], 0.001), 1
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({
+            'packages': options['packages'],
+            'index_build_seconds': indexed['seconds'],
+            'queries': results,
+        }, indent=2, ensure_ascii=False))
@@ -0,0 +1,72 @@
+import io
+import json
+import tempfile
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from delivery.benchmarks import bench_client, measure
+from delivery.models import Customer, Package
+from taskqueue.models import Task
+from taskqueue.queue import Worker
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (30, 90, 160)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare request latency with side effects run inline versus deferred to the task queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--image-size', type=int, default=3000, help='Width of the uploaded test image')
+
+    def handle(self, *args, **options):
+        image = _png(options['image_size'], options['image_size'] * 3 // 4)
+        user = User.objects.create_user('bench-tasks', 'bench@example.com', 'unused-password')
+        receivers_before = set(Customer.objects.values_list('pk', flat=True))
+        tasks_before = set(Task.objects.values_list('pk', flat=True))
+        counter = iter(range(10 ** 9))
+
+        def create_package():
+            # Vary the bytes so content-hash dedup does not skip the work.
+            payload = image + next(counter).to_bytes(4, 'big')
+            client.post(reverse('create_package'), {
+                'receiver_name': 'Bench Receiver', 'receiver_email': 'r@example.com',
+                'receiver_phone': '555', 'receiver_address': '1 Bench Road',
+                'description': 'Bench parcel', 'weight': '2', 'service_tier': 'standard',
+                'package_image': SimpleUploadedFile('photo.png', payload, 'image/png'),
+            })
+
+        def contact():
+            client.post(reverse('contact'), {
+                'name': 'Bench', 'email': 'bench@example.com', 'subject': 'Hi', 'message': 'Benchmark message',
+            })
+
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as media_root, bench_client() as client, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+                client.force_login(user)
+                for label, eager in (('inline', True), ('queued', False)):
+                    with override_settings(TASKS_ALWAYS_EAGER=eager):
+                        results[label] = {
+                            'create_package_with_image': measure(create_package, options['iterations']),
+                            'contact': measure(contact, options['iterations']),
+                        }
+                worker = Worker(threads=4, poll_interval=0)
+                results['queued']['worker_drain'] = measure(lambda: worker.run(drain=True), 1)
+                results['queued']['worker_drain']['tasks'] = worker.succeeded + worker.failed
+        finally:
+            Package.objects.filter(sender_user=user).delete()
+            Customer.objects.exclude(pk__in=receivers_before).delete()
+            Task.objects.exclude(pk__in=tasks_before).delete()
+            user.delete()
+
+        self.stdout.write(json.dumps(results, indent=2))
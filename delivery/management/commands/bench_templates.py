@@ -0,0 +1,80 @@
+import copy
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from delivery.benchmarks import bench_client, measure
+from delivery.locations import resolve_location, resolve_locations
+from delivery.models import Customer, Package, TrackingEvent
+
+
+def _templates_setting(cached):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)] if cached else loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = 'Measure dashboard and tracking page render times with and without the cached template loader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=120, help='Packages on the dashboard')
+        parser.add_argument('--events', type=int, default=120, help='Events on the tracked package')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        results = {}
+        with transaction.atomic():
+            user, dashboard_url, track_url = self._seed(options['packages'], options['events'])
+            with bench_client() as client, override_settings(PAGE_CACHE_TIMEOUTS={}):
+                client.force_login(user)
+                for label, cached in (('uncached_loader', False), ('cached_loader', True)):
+                    with override_settings(TEMPLATES=_templates_setting(cached)):
+                        client.get(dashboard_url)
+                        client.get(track_url)
+                        results[label] = {
+                            'dashboard': measure(lambda: client.get(dashboard_url), options['iterations']),
+                            'track': measure(lambda: client.get(track_url), options['iterations']),
+                        }
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _seed(self, package_count, event_count):
+        """Create throwaway data; the caller rolls it back"""
+        user = User.objects.create_user('bench-templates', 'bench@example.com', 'unused-password')
+        sender = Customer.objects.create(name='Bench Sender', email='s@example.com', phone='1', address='1 Main St')
+        receiver = Customer.objects.create(name='Bench Receiver', email='r@example.com', phone='2', address='2 Oak Ave')
+        hub_id = resolve_location('Bench Hub')
+        scan_ids = resolve_locations([f'Hub {i}' for i in range(event_count)])
+        packages = [
+            Package.objects.create(
+                sender=sender, receiver=receiver, sender_user=user,
+                description=f'Bench package {i}', weight=1 + i % 7,
+                status=Package.STATUS_CHOICES[i % len(Package.STATUS_CHOICES)][0],
+                current_location_id=hub_id
+            )
+            for i in range(package_count)
+        ]
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(package=package, status='pending', location_id=hub_id, notes='Created')
+            for package in packages
+        ])
+        tracked = packages[0]
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(package=tracked, status='in_transit', location_id=scan_ids[f'Hub {i}'], notes=f'Scan {i}')
+            for i in range(event_count)
+        ])
+        return (
+            user,
+            reverse('dashboard'),
+            reverse('track_package_detail', kwargs={'tracking_number': tracked.tracking_number}),
+        )
@@ -0,0 +1,53 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from delivery.benchmarks import StubWebhookServer
+from delivery.models import ApiKey, WebhookEvent, WebhookSubscription
+from delivery.webhooks import WebhookDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Measure webhook deliveries per second against a local stub endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--subscriptions', type=int, default=16, help='Partners the events are spread over')
+        parser.add_argument('--latency', type=float, default=0.02, help='Seconds the stub takes to answer')
+        parser.add_argument('--concurrency', default='1,4,16')
+        parser.add_argument('--batch-size', default='1,10,100')
+
+    def handle(self, *args, **options):
+        api_key = ApiKey(name='bench-webhooks', scopes='track')
+        api_key.generate_key()
+        api_key.save()
+        results = []
+        try:
+            with StubWebhookServer(delay=options['latency']) as stub:
+                subscriptions = WebhookSubscription.objects.bulk_create([
+                    WebhookSubscription(api_key=api_key, url=stub.url, secret='bench')
+                    for _ in range(options['subscriptions'])
+                ])
+                payload = {'type': 'package.status_changed', 'tracking_number': 'BENCH0000000', 'status': 'in_transit'}
+                for concurrency in map(int, options['concurrency'].split(',')):
+                    for batch_size in map(int, options['batch_size'].split(',')):
+                        WebhookEvent.objects.bulk_create([
+                            WebhookEvent(subscription=subscriptions[i % len(subscriptions)], payload=payload)
+                            for i in range(options['events'])
+                        ], batch_size=1000)
+                        dispatcher = WebhookDispatcher(concurrency=concurrency, batch_size=batch_size, poll_interval=0)
+                        started = time.perf_counter()
+                        dispatcher.run(drain=True)
+                        elapsed = time.perf_counter() - started
+                        results.append({
+                            'concurrency': concurrency,
+                            'batch_size': batch_size,
+                            'delivered': dispatcher.delivered,
+                            'requests': dispatcher.requests,
+                            'seconds': round(elapsed, 3),
+                            'events_per_second': round(dispatcher.delivered / elapsed, 1),
+                        })
+        finally:
+            # Cascades to the subscriptions and any undelivered events.
+            api_key.delete()
+
+        self.stdout.write(json.dumps(results, indent=2))
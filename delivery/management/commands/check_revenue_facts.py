@@ -0,0 +1,53 @@
+import random
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from delivery.models import Package
+from delivery.revenue import cents_to_amount, raw_revenue, rebuild_revenue_facts, stored_revenue
+
+
+class Command(BaseCommand):
+    help = 'Compare the daily revenue facts with the packages of a random sample of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Days sampled')
+        parser.add_argument('--day', type=date.fromisoformat, action='append', help='Check this day (repeatable)')
+        parser.add_argument('--seed', type=int, help='Seed for a reproducible sample')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the facts of days that differ')
+
+    def handle(self, *args, **options):
+        days = options['day']
+        if not days:
+            first = Package.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write("No packages; nothing to check")
+                return
+            first_day, today = timezone.localdate(first), timezone.localdate()
+            span = (today - first_day).days + 1
+            offsets = random.Random(options['seed']).sample(range(span), min(options['days'], span))
+            days = sorted(first_day + timedelta(days=offset) for offset in offsets)
+
+        mismatched = []
+        for day in days:
+            raw, stored = raw_revenue(day, day), stored_revenue(day, day)
+            if raw == stored:
+                continue
+            mismatched.append(day)
+            for key in sorted(set(raw) | set(stored)):
+                if raw.get(key) != stored.get(key):
+                    raw_count, raw_cents = raw.get(key, (0, 0))
+                    fact_count, fact_cents = stored.get(key, (0, 0))
+                    self.stdout.write(
+                        f"{key[0]} {key[1]}/{key[2]}: packages {raw_count}, facts {fact_count}; "
+                        f"revenue {cents_to_amount(raw_cents)}, facts {cents_to_amount(fact_cents)}"
+                    )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(f"Facts match packages on all {len(days)} sampled days"))
+            return
+        if not options['fix']:
+            raise CommandError(f"Facts differ from packages on {len(mismatched)} of {len(days)} sampled days")
+        for day in mismatched:
+            rebuild_revenue_facts(day, day)
+        self.stdout.write(self.style.WARNING(f"Rebuilt the facts of {len(mismatched)} day(s)"))
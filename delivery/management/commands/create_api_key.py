@@ -0,0 +1,32 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from delivery.models import ApiKey, validate_scopes
+
+
+class Command(BaseCommand):
+    help = 'Create a partner API key and print it once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Partner name')
+        parser.add_argument('--scopes', default='track', help='Comma-separated scopes: create, track, bulk')
+        parser.add_argument('--rate-limit', type=int, default=60, help='Sustained requests per minute')
+        parser.add_argument('--burst', type=int, default=20)
+
+    def handle(self, *args, **options):
+        scopes = [scope.strip() for scope in options['scopes'].split(',') if scope.strip()]
+        try:
+            validate_scopes(options['scopes'])
+        except ValidationError as error:
+            raise CommandError(error.messages[0])
+
+        api_key = ApiKey(
+            name=options['name'],
+            scopes=','.join(scopes),
+            rate_limit=options['rate_limit'],
+            burst=options['burst']
+        )
+        raw_key = api_key.generate_key()
+        api_key.save()
+
+        self.stdout.write(self.style.SUCCESS(f'Created API key for {api_key.name} with scopes {api_key.scopes}'))
+        self.stdout.write(raw_key)
@@ -1,10 +1,18 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from delivery.models import Customer, Package, TrackingEvent
+from delivery.locations import resolve_location
+from delivery.models import Customer, Location, Package, TrackingEvent, location_key
 from datetime import datetime, timedelta
 
 User = get_user_model()
 
+# Hubs with coordinates; other scan locations are created as they are used.
+SAMPLE_HUBS = [
+    ('Memphis Distribution Hub', '35.149500', '-90.049000'),
+    ('Dallas Distribution Hub', '32.776700', '-96.797000'),
+    ('Los Angeles Distribution Center', '34.052200', '-118.243700'),
+]
+
 class Command(BaseCommand):
     help = 'Create sample data for testing'
 
@@ -18,6 +26,12 @@ class Command(BaseCommand):
         except User.DoesNotExist:
             pass
 
+        for name, latitude, longitude in SAMPLE_HUBS:
+            Location.objects.update_or_create(
+                key=location_key(name),
+                defaults={'name': name, 'is_hub': True, 'latitude': latitude, 'longitude': longitude}
+            )
+
         # Create sample customers
         sender1 = Customer.objects.create(
             name="John Doe",
@@ -54,7 +68,7 @@ class Command(BaseCommand):
             description="Electronics - Laptop",
             weight=2.5,
             status='delivered',
-            current_location='Los Angeles Distribution Center',
+            current_location_id=resolve_location('Los Angeles Distribution Center'),
             estimated_delivery=datetime.now().date() - timedelta(days=1)
         )
         
@@ -62,42 +76,42 @@ class Command(BaseCommand):
         TrackingEvent.objects.create(
             package=package1,
             status='pending',
-            location='New York Pickup Center',
+            location_id=resolve_location('New York Pickup Center'),
             notes='Package received and processed',
             timestamp=datetime.now() - timedelta(days=4, hours=10)
         )
         TrackingEvent.objects.create(
             package=package1,
             status='picked_up',
-            location='New York Pickup Center',
+            location_id=resolve_location('New York Pickup Center'),
             notes='Package picked up by courier',
             timestamp=datetime.now() - timedelta(days=4, hours=8)
         )
         TrackingEvent.objects.create(
             package=package1,
             status='in_transit',
-            location='Memphis Distribution Hub',
+            location_id=resolve_location('Memphis Distribution Hub'),
             notes='In transit to destination',
             timestamp=datetime.now() - timedelta(days=3, hours=14)
         )
         TrackingEvent.objects.create(
             package=package1,
             status='in_transit',
-            location='Los Angeles Distribution Center',
+            location_id=resolve_location('Los Angeles Distribution Center'),
             notes='Arrived at destination facility',
             timestamp=datetime.now() - timedelta(days=1, hours=6)
         )
         TrackingEvent.objects.create(
             package=package1,
             status='out_for_delivery',
-            location='Los Angeles Local Depot',
+            location_id=resolve_location('Los Angeles Local Depot'),
             notes='Out for delivery',
             timestamp=datetime.now() - timedelta(hours=8)
         )
         TrackingEvent.objects.create(
             package=package1,
             status='delivered',
-            location='456 Oak Ave, Los Angeles, CA 90001',
+            location_id=resolve_location('456 Oak Ave, Los Angeles, CA 90001'),
             notes='Delivered successfully - Signed by recipient',
             timestamp=datetime.now() - timedelta(hours=2)
         )
@@ -108,28 +122,28 @@ class Command(BaseCommand):
             description="Books and Documents",
             weight=1.2,
             status='in_transit',
-            current_location='Dallas Distribution Hub',
+            current_location_id=resolve_location('Dallas Distribution Hub'),
             estimated_delivery=datetime.now().date() + timedelta(days=2)
         )
         
         TrackingEvent.objects.create(
             package=package2,
             status='pending',
-            location='Chicago Pickup Center',
+            location_id=resolve_location('Chicago Pickup Center'),
             notes='Package received',
             timestamp=datetime.now() - timedelta(days=2, hours=5)
         )
         TrackingEvent.objects.create(
             package=package2,
             status='picked_up',
-            location='Chicago Pickup Center',
+            location_id=resolve_location('Chicago Pickup Center'),
             notes='Picked up and in transit',
             timestamp=datetime.now() - timedelta(days=2, hours=3)
         )
         TrackingEvent.objects.create(
             package=package2,
             status='in_transit',
-            location='Dallas Distribution Hub',
+            location_id=resolve_location('Dallas Distribution Hub'),
             notes='Package in transit',
             timestamp=datetime.now() - timedelta(days=1, hours=10)
         )
@@ -140,14 +154,14 @@ class Command(BaseCommand):
             description="Clothing and Accessories",
             weight=0.8,
             status='pending',
-            current_location='Awaiting Pickup',
+            current_location_id=resolve_location('Awaiting Pickup'),
             estimated_delivery=datetime.now().date() + timedelta(days=5)
         )
         
         TrackingEvent.objects.create(
             package=package3,
             status='pending',
-            location='Pickup Requested',
+            location_id=resolve_location('Pickup Requested'),
             notes='Pickup scheduled for tomorrow',
             timestamp=datetime.now() - timedelta(hours=3)
         )
@@ -0,0 +1,26 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from delivery.models import ApiKey, WebhookSubscription
+
+
+class Command(BaseCommand):
+    help = 'Subscribe a partner endpoint to status changes and print its signing secret once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefix', help='Prefix of the partner API key')
+        parser.add_argument('url', help='Endpoint that receives the signed POSTs')
+
+    def handle(self, *args, **options):
+        api_key = ApiKey.objects.filter(prefix=options['prefix']).first()
+        if api_key is None:
+            raise CommandError(f"No API key with prefix {options['prefix']!r}")
+
+        subscription = WebhookSubscription(api_key=api_key, url=options['url'])
+        try:
+            subscription.full_clean(exclude=['secret'])
+        except ValidationError as error:
+            raise CommandError('; '.join(error.messages))
+        subscription.save()
+
+        self.stdout.write(self.style.SUCCESS(f'Subscribed {subscription.url} for {api_key.name}'))
+        self.stdout.write(subscription.secret)
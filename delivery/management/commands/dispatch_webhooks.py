@@ -0,0 +1,30 @@
+import signal
+from django.core.management.base import BaseCommand
+from delivery.webhooks import WebhookDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued partner webhook events until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help='Requests in flight')
+        parser.add_argument('--batch-size', type=int, help='Events per request')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls while idle')
+        parser.add_argument('--drain', action='store_true', help='Exit once no event is due')
+
+    def handle(self, *args, **options):
+        dispatcher = WebhookDispatcher(
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval']
+        )
+        # Settle the requests in flight, then exit, on Ctrl-C or a container stop.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: dispatcher.stop())
+
+        self.stdout.write(f"Dispatcher {dispatcher.dispatcher_id} running {dispatcher.concurrency} connections")
+        dispatcher.run(drain=options['drain'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Dispatcher stopped: {dispatcher.delivered} delivered, {dispatcher.failed} failed, "
+            f"{dispatcher.dead} dead-lettered in {dispatcher.requests} requests"
+        ))
@@ -0,0 +1,34 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from delivery.eta import eta_engine
+from delivery.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Build the delivery estimate tables and report their size and lookup cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=10000, help='Estimates timed over recent packages')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        eta_engine.build()
+        stats = eta_engine.stats()
+        stats['build_seconds'] = round(time.perf_counter() - started, 3)
+
+        lanes = list(
+            Package.objects.order_by('-pk')
+            .values_list('sender__address', 'receiver__address', 'service_tier', 'created_at')[:1000]
+        )
+        if lanes:
+            bases = {}
+            started = time.perf_counter()
+            for i in range(options['lookups']):
+                basis = eta_engine.estimate(*lanes[i % len(lanes)]).basis
+                bases[basis] = bases.get(basis, 0) + 1
+            elapsed = time.perf_counter() - started
+            stats['lookup_us'] = round(elapsed / options['lookups'] * 1e6, 2)
+            stats['lookup_basis'] = bases
+
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,47 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from delivery.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, ExportStats, stream_packages
+from delivery.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Stream packages with sender, receiver and tracking history to CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help='Output file path, or - for stdout')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument('--status', choices=[choice for choice, _ in Package.STATUS_CHOICES])
+        parser.add_argument('--payment-status', choices=[choice for choice, _ in Package.PAYMENT_STATUS_CHOICES])
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        queryset = Package.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['payment_status']:
+            queryset = queryset.filter(payment_status=options['payment_status'])
+
+        stats = ExportStats()
+        chunks = stream_packages(
+            queryset,
+            fmt=options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+            stats=stats
+        )
+
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+        else:
+            with open(options['output'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {stats.summary()}'))
@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import queue
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+PROGRESS_INTERVAL = 5.0
+
+
+def _import_shard(options, shard, shards, progress_queue):
+    """Entry point of a worker process importing one shard of the file"""
+    # Workers are spawned, so apps must be loaded before any model import.
+    import django
+    django.setup()
+    from delivery.imports import run_import
+
+    checkpoint = f"{options['checkpoint']}.{shard}" if options['checkpoint'] else None
+    run_import(
+        options['path'],
+        fmt=options['format'],
+        batch_size=options['batch_size'],
+        checkpoint=checkpoint,
+        shard=shard,
+        shards=shards,
+        on_progress=lambda checkpoint: progress_queue.put(
+            (shard, checkpoint.session_imported, checkpoint.session_rejected)
+        ),
+    )
+    progress_queue.put((shard, None, None))
+
+
+class Command(BaseCommand):
+    help = 'Stream packages from a CSV or NDJSON file into the database in batches'
+
+    def add_arguments(self, parser):
+        from delivery.imports import IMPORT_BATCH_SIZE
+        parser.add_argument('path', help='CSV or NDJSON file, optionally gzipped')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint name, kept in the database; an interrupted import resumes from it when run again'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Split the file across this many processes (use with a database that allows concurrent writers)'
+        )
+        parser.add_argument('--rejects', help='Write rejected rows and their errors to this NDJSON file')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive')
+
+        from delivery.imports import ImportProgress
+        progress = ImportProgress()
+        if options['workers'] == 1:
+            self._import_inline(options, progress)
+        else:
+            if options['rejects']:
+                raise CommandError('--rejects is only supported with a single worker')
+            self._import_parallel(options, progress)
+        self.stdout.write(self.style.SUCCESS(f'Import finished: {progress.summary()}'))
+
+    def _import_inline(self, options, progress):
+        from delivery.imports import run_import
+        last_report = time.monotonic()
+        rejects = open(options['rejects'], 'a') if options['rejects'] else None
+
+        def on_progress(checkpoint):
+            nonlocal last_report
+            progress.update(0, checkpoint.session_imported, checkpoint.session_rejected)
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                self.stdout.write(f'  row {checkpoint.last_row + 1}: {progress.summary()}')
+
+        def on_reject(index, errors):
+            if rejects:
+                rejects.write(json.dumps({'row': index, 'errors': errors}) + '\n')
+
+        try:
+            run_import(
+                options['path'],
+                fmt=options['format'],
+                batch_size=options['batch_size'],
+                checkpoint=options['checkpoint'],
+                on_progress=on_progress,
+                on_reject=on_reject,
+            )
+        finally:
+            if rejects:
+                rejects.close()
+
+    def _import_parallel(self, options, progress):
+        shards = options['workers']
+        context = multiprocessing.get_context('spawn')
+        progress_queue = context.Queue()
+        # Child processes must open their own database connections.
+        connections.close_all()
+        processes = [
+            context.Process(target=_import_shard, args=(options_for_child(options), shard, shards, progress_queue))
+            for shard in range(shards)
+        ]
+        for process in processes:
+            process.start()
+
+        running = set(range(shards))
+        last_report = time.monotonic()
+        while running:
+            try:
+                shard, imported, rejected = progress_queue.get(timeout=1.0)
+            except queue.Empty:
+                crashed = [shard for shard in running if not processes[shard].is_alive()]
+                if crashed:
+                    for process in processes:
+                        process.terminate()
+                    raise CommandError(
+                        f'Import worker(s) {crashed} exited unexpectedly; rerun with the same --checkpoint to resume'
+                    )
+                continue
+            if imported is None:
+                running.discard(shard)
+            else:
+                progress.update(shard, imported, rejected)
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                self.stdout.write(f'  {len(running)} worker(s) running: {progress.summary()}')
+
+        for process in processes:
+            process.join()
+
+
+def options_for_child(options):
+    """Keep only the picklable options a worker needs"""
+    return {key: options[key] for key in ('path', 'format', 'batch_size', 'checkpoint')}
@@ -0,0 +1,54 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from delivery.models import GeocodedAddress, address_key
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Load address coordinates for route planning from a CSV with address, latitude and longitude columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        loaded = skipped = 0
+        batch = {}
+
+        def flush():
+            GeocodedAddress.objects.bulk_create(
+                batch.values(), update_conflicts=True, unique_fields=['key'],
+                update_fields=['address', 'latitude', 'longitude']
+            )
+            batch.clear()
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as handle:
+                reader = csv.DictReader(handle)
+                missing = {'address', 'latitude', 'longitude'} - set(reader.fieldnames or ())
+                if missing:
+                    raise CommandError(f"Missing column(s): {', '.join(sorted(missing))}")
+                for row in reader:
+                    try:
+                        latitude, longitude = Decimal(row['latitude'] or ''), Decimal(row['longitude'] or '')
+                        valid = -90 <= latitude <= 90 and -180 <= longitude <= 180
+                    except InvalidOperation:
+                        valid = False
+                    if not valid or not (row['address'] or '').strip():
+                        skipped += 1
+                        continue
+                    # bulk_create skips save(), so the key is set here; a later row for the same address wins.
+                    key = address_key(row['address'])
+                    batch[key] = GeocodedAddress(
+                        key=key, address=row['address'].strip(),
+                        latitude=round(latitude, 6), longitude=round(longitude, 6)
+                    )
+                    loaded += 1
+                    if len(batch) >= BATCH_SIZE:
+                        flush()
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+        if batch:
+            flush()
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} addresses, skipped {skipped} invalid rows"))
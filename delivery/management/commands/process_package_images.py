@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from delivery.images import process_package_image
+from delivery.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Re-encode package images that have no thumbnail yet (staged uploads and older originals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Process at most this many packages')
+
+    def handle(self, *args, **options):
+        pending = (
+            Package.objects.exclude(package_image='').exclude(package_image__isnull=True)
+            .filter(Q(package_thumbnail='') | Q(package_thumbnail__isnull=True))
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if options['limit']:
+            pending = pending[:options['limit']]
+
+        processed = failed = 0
+        for package_id in pending.iterator():
+            try:
+                process_package_image(package_id)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Package {package_id}: {exc}")
+            else:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} images, {failed} failed"))
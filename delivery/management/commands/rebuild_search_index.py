@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from delivery.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Re-index every package for search, e.g. after restoring a database or changing the indexed columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Packages indexed per statement')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        get_search_backend().rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from delivery.loadtest import (
+    LatencyRecorder, LocalServer, Replay, peak_concurrency, prepare_workdir, read_request_log, replay_schedule,
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay a recorded request log against a seeded gunicorn server, with the recorded timing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='A log written by RequestLogMiddleware (REQUEST_LOG_PATH)')
+        parser.add_argument('--speed', type=float, default=1.0, help='Multiple of the recorded rate, e.g. 2 for twice as fast')
+        parser.add_argument('--limit', type=int, help='Replay only the first N requests')
+        parser.add_argument('--packages', type=int, default=10000, help='Packages to seed')
+        parser.add_argument('--users', type=int, default=200, help='Logged-in users to seed')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+        parser.add_argument('--workdir',
+                            help='Keep the seeded database here and reuse it on later runs (default: a temporary one)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the report to this file')
+
+    def handle(self, *args, **options):
+        if options['speed'] <= 0:
+            raise CommandError("--speed must be positive")
+        try:
+            entries, unreadable = read_request_log(options['log'], options['limit'])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['log']}: {exc}")
+        if not entries:
+            raise CommandError(f"No requests in {options['log']}")
+
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='swifttrack-replay-')
+        try:
+            try:
+                fixture = prepare_workdir(workdir, options['packages'], options['users'], options['seed'])
+            except subprocess.CalledProcessError as exc:
+                raise CommandError(f"Preparing {workdir} failed: {exc}")
+            replay = Replay(entries, fixture, random.Random(options['seed']))
+            schedule, skipped, recorded = [], Counter(), LatencyRecorder()
+            for entry in entries:
+                endpoint = entry.get('view') or 'other'
+                request = replay.request(entry)
+                if request is None:
+                    skipped[f"{entry['method']} {endpoint}"] += 1
+                    continue
+                schedule.append((entry['ts'] - entries[0]['ts'], endpoint, entry['status'], request))
+                recorded.record(endpoint, entry['ms'] / 1000, entry['status'])
+            if not schedule:
+                raise CommandError("None of the logged requests can be replayed")
+            try:
+                with LocalServer(workdir, options['workers'], options['threads']) as server:
+                    replayed, changes, peak, lag, elapsed = asyncio.run(
+                        replay_schedule('127.0.0.1', server.port, schedule, options['speed'])
+                    )
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        finally:
+            if not options['workdir']:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        recorded_span = max(entry['ts'] + entry['ms'] / 1000 for entry in entries) - entries[0]['ts']
+        found = [number for number, mapped in replay.tracking_numbers.items() if not mapped.startswith('NX')]
+        report = {
+            'config': {
+                'log': options['log'], 'entries': len(entries), 'replayed': len(schedule),
+                'skipped': dict(skipped), 'unreadable_lines': unreadable, 'speed': options['speed'],
+                'tracking_numbers': len(replay.tracking_numbers),
+                'tracking_numbers_reused': max(len(found) - len(fixture['tracking_numbers']), 0),
+                'clients': len(replay.sessions),
+                **{name: options[name] for name in ('packages', 'users', 'workers', 'threads', 'seed')},
+            },
+            'recorded': {
+                'seconds': round(recorded_span, 3),
+                'peak_concurrency': peak_concurrency([
+                    (entry['ts'], entry['ts'] + entry['ms'] / 1000) for entry in entries
+                ]),
+                **recorded.summary(recorded_span),
+            },
+            'replay': {
+                'seconds': round(elapsed, 3),
+                'peak_concurrency': peak,
+                'max_lag_ms': round(lag * 1000, 2),
+                **replayed.summary(elapsed),
+            },
+            'divergence': {
+                'requests': sum(sum(counter.values()) for counter in changes.values()),
+                'endpoints': {
+                    endpoint: {
+                        'requests': len(replayed.latencies[endpoint]),
+                        'diverged': sum(counter.values()),
+                        'changes': dict(counter.most_common()),
+                    }
+                    for endpoint, counter in sorted(changes.items())
+                },
+            },
+        }
+        report['divergence']['rate'] = round(report['divergence']['requests'] / len(schedule), 4)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,22 @@
+import json
+from django.core.management.base import BaseCommand
+from delivery.loadtest import seed_load_test
+
+
+class Command(BaseCommand):
+    help = 'Add users and packages for load testing, and write the fixture the load generator works from'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', required=True, help='Path of the JSON fixture')
+
+    def handle(self, *args, **options):
+        fixture = seed_load_test(options['packages'], options['users'], options['seed'])
+        with open(options['output'], 'w') as handle:
+            json.dump(fixture, handle)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(fixture['tracking_numbers'])} packages and {options['users']} users; "
+            f"fixture written to {options['output']}"
+        ))
@@ -0,0 +1,28 @@
+import json
+import random
+import string
+from django.core.management.base import BaseCommand
+from delivery.models import Package
+from delivery.tracking_filter import tracking_filter
+
+
+class Command(BaseCommand):
+    help = 'Build the tracking number filter and report its size and false-positive rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--probes', type=int, default=100000,
+            help='Random unissued tracking numbers used to measure the false-positive rate'
+        )
+
+    def handle(self, *args, **options):
+        tracking_filter.build()
+        stats = tracking_filter.stats()
+
+        alphabet = string.ascii_uppercase + string.digits
+        probes = {''.join(random.choices(alphabet, k=12)) for _ in range(options['probes'])}
+        probes -= set(Package.objects.filter(tracking_number__in=probes).values_list('tracking_number', flat=True))
+        positives = sum(1 for probe in probes if probe in tracking_filter.bloom)
+        stats['measured_fp_rate'] = round(positives / len(probes), 6) if probes else None
+
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,46 @@
+import signal
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from delivery.analytics import reset_rollups, rollup_status, update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold tracking events into the hub analytics rollups, one bounded chunk per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Events per transaction')
+        parser.add_argument('--rebuild', action='store_true', help='Discard the rollups and backfill from the first event')
+        parser.add_argument('--follow', action='store_true', help='Keep folding in new events until interrupted')
+        parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds between polls while caught up')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks, to yield to writers')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_rollups()
+            self.stdout.write("Discarded existing rollups")
+
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+
+        folded = 0
+        started = time.perf_counter()
+        while not stopping.is_set():
+            close_old_connections()
+            count = update_rollups(options['chunk_size'])
+            folded += count
+            if count:
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Folded {folded} events, up to #{rollup_status()['high_water_id']}")
+                stopping.wait(options['pause'])
+            elif options['follow']:
+                stopping.wait(options['poll_interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {folded} events in {time.perf_counter() - started:.1f}s; "
+            f"rollups cover events up to #{rollup_status()['high_water_id']}"
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:16
+
+import delivery.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0004_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('prefix', models.CharField(editable=False, max_length=8, unique=True)),
+                ('key_hash', models.CharField(editable=False, max_length=64)),
+                ('scopes', models.CharField(default='track', help_text='Comma-separated scopes: create, track, bulk', max_length=100, validators=[delivery.models.validate_scopes])),
+                ('rate_limit', models.PositiveIntegerField(default=60, help_text='Sustained requests per minute')),
+                ('burst', models.PositiveIntegerField(default=20, help_text='Requests allowed in a burst')),
+                ('is_active', models.BooleanField(default=True)),
+                ('request_count', models.PositiveBigIntegerField(default=0, editable=False)),
+                ('last_used_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'API key',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0005_apikey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='package_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='packages/thumbs/'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+# Rows per transaction. The migration is not atomic, so a large table is
+# converted in short transactions and an interrupted run can be resumed.
+CHUNK_SIZE = 10000
+
+
+def normalize(name):
+    # delivery.models.normalize_location_name as of this migration.
+    return ' '.join(str(name or '').split())
+
+
+def intern(Location, names, ids):
+    """Add the ids of ``names`` to ``ids`` (keyed by lookup key), creating missing locations"""
+    wanted = {}
+    for name in names:
+        display = normalize(name)
+        wanted.setdefault(display.casefold(), display)
+    missing = [key for key in wanted if key not in ids]
+    if not missing:
+        return
+    ids.update(Location.objects.filter(key__in=missing).values_list('key', 'pk'))
+    Location.objects.bulk_create(
+        [Location(name=wanted[key], key=key) for key in missing if key not in ids],
+        ignore_conflicts=True
+    )
+    ids.update(Location.objects.filter(key__in=missing).values_list('key', 'pk'))
+
+
+def backfill(model, text_field, ref_field, Location, ids, blank_name=None):
+    """Point ``ref_field`` at the interned location of ``text_field``, one primary key range at a time"""
+    last_pk = 0
+    while True:
+        batch = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', text_field)[:CHUNK_SIZE]
+        )
+        if not batch:
+            return
+        first_pk, last_pk = batch[0][0], batch[-1][0]
+        displays = {name: normalize(name) or blank_name for _, name in batch}
+        with transaction.atomic():
+            intern(Location, [display for display in displays.values() if display], ids)
+            # One UPDATE per distinct spelling in the range.
+            for name, display in displays.items():
+                if display:
+                    model.objects.filter(pk__range=(first_pk, last_pk), **{text_field: name}).update(
+                        **{ref_field: ids[display.casefold()]}
+                    )
+
+
+def forwards(apps, schema_editor):
+    Location = apps.get_model('delivery', 'Location')
+    ids = {}
+    backfill(apps.get_model('delivery', 'Package'), 'current_location', 'current_location_ref', Location, ids)
+    backfill(apps.get_model('delivery', 'TrackingEvent'), 'location', 'location_ref', Location, ids, 'Unknown')
+
+
+def backwards(apps, schema_editor):
+    Location = apps.get_model('delivery', 'Location')
+    for model_name, text_field, ref_field in [
+        ('Package', 'current_location', 'current_location_ref'),
+        ('TrackingEvent', 'location', 'location_ref'),
+    ]:
+        apps.get_model('delivery', model_name).objects.filter(**{f'{ref_field}__isnull': False}).update(
+            **{text_field: Subquery(Location.objects.filter(pk=OuterRef(ref_field)).values('name')[:1])}
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('delivery', '0009_locations'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_backfill_locations'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='package',
+            name='current_location',
+        ),
+        migrations.RenameField(
+            model_name='package',
+            old_name='current_location_ref',
+            new_name='current_location',
+        ),
+        migrations.AlterField(
+            model_name='package',
+            name='current_location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='current_packages', to='delivery.location'),
+        ),
+        # Lets the text column be re-added to existing rows when unapplying.
+        migrations.AlterField(
+            model_name='trackingevent',
+            name='location',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RemoveField(
+            model_name='trackingevent',
+            name='location',
+        ),
+        migrations.RenameField(
+            model_name='trackingevent',
+            old_name='location_ref',
+            new_name='location',
+        ),
+        migrations.AlterField(
+            model_name='trackingevent',
+            name='location',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='events', to='delivery.location'),
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['location', '-timestamp'], name='event_location_timestamp_idx'),
+        ),
+    ]
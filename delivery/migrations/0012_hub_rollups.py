@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0011_location_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('high_water_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HubDwellTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Hour of the next scan')),
+                ('bucket', models.PositiveSmallIntegerField(help_text='Index into delivery.analytics.DWELL_BUCKETS')),
+                ('departures', models.PositiveIntegerField(default=0)),
+                ('dwell_seconds', models.PositiveBigIntegerField(default=0)),
+                ('location', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='delivery.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'location', 'bucket'), name='hub_dwell_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HubHourlyVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered')], max_length=20)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('location', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='delivery.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'location', 'status'), name='hub_volume_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0012_hub_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenueFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('service_tier', models.CharField(choices=[('standard', 'Standard (3-5 days)'), ('express', 'Express (1-2 days)'), ('same_day', 'Same-Day')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('refunded', 'Refunded')], max_length=20)),
+                ('packages', models.BigIntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'service_tier', 'payment_status'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'service_tier', 'payment_status'), name='revenue_fact_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# The index and its document columns as of this migration. PARTY and POPULATE
+# are frozen copies of SQLiteFTSBackend.party_sql and _document_select() in
+# delivery/search.py, which keep the rows current afterwards; when those
+# change, this migration stays as it is.
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE delivery_package_search USING fts5(
+    tracking_number, description, receiver, sender,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+PARTY = (
+    "{c}.name || ' ' || {c}.email || ' ' || {c}.phone || ' ' || {c}.address || ' ' || "
+    "replace(replace(replace(replace(replace(replace({c}.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+)
+
+POPULATE = f"""
+INSERT INTO delivery_package_search (rowid, tracking_number, description, receiver, sender)
+SELECT p.id, p.tracking_number, p.description, {PARTY.format(c='r')}, {PARTY.format(c='s')}
+FROM delivery_package p
+JOIN delivery_customer r ON r.id = p.receiver_id
+JOIN delivery_customer s ON s.id = p.sender_id
+"""
+
+
+def create_index(apps, schema_editor):
+    # Other databases search with delivery.search.DatabaseSearchBackend.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(POPULATE)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS delivery_package_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0013_daily_revenue_facts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
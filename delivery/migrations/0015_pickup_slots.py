@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0014_package_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickupSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.CharField(help_text='Region of the pickup address, e.g. NY', max_length=100)),
+                ('date', models.DateField()),
+                ('window', models.CharField(choices=[('morning', 'Morning (8am - 12pm)'), ('afternoon', 'Afternoon (12pm - 5pm)')], max_length=20)),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+            options={
+                'ordering': ['date', 'window', 'area'],
+                'constraints': [models.UniqueConstraint(fields=('area', 'date', 'window'), name='pickup_slot_key')],
+            },
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='pickup_slot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='packages', to='delivery.pickupslot'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0016_geocoded_addresses'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Courier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('zone', models.CharField(blank=True, help_text='Region of the addresses served, e.g. NY; blank to help out in zones that are full', max_length=100)),
+                ('capacity', models.PositiveIntegerField(default=60, help_text='Pickups and deliveries assigned at once')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='courier', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['zone', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='delivery_courier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='delivery.courier'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='pickup_courier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pickups', to='delivery.courier'),
+        ),
+    ]
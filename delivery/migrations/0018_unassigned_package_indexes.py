@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0017_couriers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('pickup_courier__isnull', True), ('status', 'pending')), fields=['id'], name='package_no_pickup_courier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('delivery_courier__isnull', True), ('status', 'out_for_delivery')), fields=['id'], name='package_no_deliv_courier_idx'),
+        ),
+    ]
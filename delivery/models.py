@@ -1,8 +1,13 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .pricing import tariff_engine
 from decimal import Decimal
+import hashlib
 import random
+import secrets
 import string
 
 
@@ -19,6 +24,117 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(Upper('name'), name='customer_name_upper_idx'),
+        ]
+
+
+def normalize_location_name(name):
+    """Display form of a location name: trimmed, with inner whitespace collapsed"""
+    return ' '.join(str(name or '').split())
+
+
+def location_key(name):
+    """Lookup key under which spellings of one location are interned"""
+    return normalize_location_name(name).casefold()
+
+
+class Location(models.Model):
+    """A hub, depot or other place packages are scanned at, stored once and referenced by id"""
+    name = models.CharField(max_length=200)
+    key = models.CharField(max_length=200, unique=True, editable=False)
+    is_hub = models.BooleanField(default=False, help_text="A sorting or distribution hub")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if Location.objects.exclude(pk=self.pk).filter(key=location_key(self.name)).exists():
+            raise ValidationError({'name': "A location with this name already exists."})
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_location_name(self.name)
+        self.key = location_key(self.name)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['name']
+
+
+def address_key(address):
+    """Lookup key of a free-text address: a hash of its casefolded words, as addresses can be long"""
+    return hashlib.sha256(normalize_location_name(address).casefold().encode()).hexdigest()
+
+
+class GeocodedAddress(models.Model):
+    """Coordinates of a delivery address, from the local geocoding table (see load_geocodes)"""
+    key = models.CharField(max_length=64, unique=True, editable=False)
+    address = models.TextField()
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+
+    def __str__(self):
+        return self.address
+
+    def save(self, *args, **kwargs):
+        self.key = address_key(self.address)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name_plural = 'geocoded addresses'
+
+
+class Courier(models.Model):
+    """A courier who collects and delivers packages in one zone"""
+    name = models.CharField(max_length=200)
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='courier')
+    zone = models.CharField(
+        max_length=100, blank=True,
+        help_text="Region of the addresses served, e.g. NY; blank to help out in zones that are full"
+    )
+    capacity = models.PositiveIntegerField(default=60, help_text="Pickups and deliveries assigned at once")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.zone or 'any zone'})"
+
+    class Meta:
+        ordering = ['zone', 'name']
+
+
+class PickupSlot(models.Model):
+    """Courier capacity for pickups in one area during one window of one day"""
+    WINDOW_CHOICES = [
+        ('morning', 'Morning (8am - 12pm)'),
+        ('afternoon', 'Afternoon (12pm - 5pm)'),
+    ]
+    WINDOW_LABELS = dict(WINDOW_CHOICES)
+
+    area = models.CharField(max_length=100, help_text="Region of the pickup address, e.g. NY")
+    date = models.DateField()
+    window = models.CharField(max_length=20, choices=WINDOW_CHOICES)
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return f"{self.area or 'Unknown area'} {self.date} {self.get_window_display()}"
+
+    def get_window_display(self):
+        return self.WINDOW_LABELS.get(self.window, self.window)
+
+    @property
+    def remaining(self):
+        return max(self.capacity - self.booked, 0)
+
+    class Meta:
+        ordering = ['date', 'window', 'area']
+        constraints = [
+            models.UniqueConstraint(fields=['area', 'date', 'window'], name='pickup_slot_key'),
+        ]
 
 
 class Package(models.Model):
@@ -43,6 +159,19 @@ class Package(models.Model):
         ('refunded', 'Refunded'),
     ]
 
+    # Lookup tables built once. Django's generated get_FOO_display() rebuilds
+    # a dict of the choices on every call, which adds up in long listings.
+    STATUS_LABELS = dict(STATUS_CHOICES)
+    SERVICE_TIER_LABELS = dict(SERVICE_TIER_CHOICES)
+    PAYMENT_STATUS_LABELS = dict(PAYMENT_STATUS_CHOICES)
+    STATUS_COLORS = {
+        'pending': '#6B7280',
+        'picked_up': '#3B82F6',
+        'in_transit': '#8B5CF6',
+        'out_for_delivery': '#F59E0B',
+        'delivered': '#10B981',
+    }
+
     tracking_number = models.CharField(max_length=12, unique=True, editable=False)
     
     # User relationships (nullable for backward compatibility)
@@ -72,6 +201,15 @@ class Package(models.Model):
         on_delete=models.CASCADE, 
         related_name='received_packages'
     )
+    # Partner that created the package through the API, for webhooks
+    api_key = models.ForeignKey(
+        'ApiKey',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='packages'
+    )
     
     # Package details
     description = models.TextField()
@@ -97,11 +235,24 @@ class Package(models.Model):
     
     # Status and tracking
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    current_location = models.CharField(max_length=200, blank=True)
+    current_location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, null=True, blank=True, related_name='current_packages'
+    )
     estimated_delivery = models.DateField(null=True, blank=True)
+    pickup_slot = models.ForeignKey(
+        PickupSlot, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='packages'
+    )
+    # Set by the assign_couriers command while the package is pending or out for delivery.
+    pickup_courier = models.ForeignKey(
+        Courier, on_delete=models.SET_NULL, null=True, blank=True, related_name='pickups'
+    )
+    delivery_courier = models.ForeignKey(
+        Courier, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries'
+    )
     
     # Verification and Claiming
     package_image = models.ImageField(upload_to='packages/', null=True, blank=True)
+    package_thumbnail = models.ImageField(upload_to='packages/thumbs/', null=True, blank=True, editable=False)
     verification_code = models.CharField(max_length=6, editable=False)
     is_claimed = models.BooleanField(default=False)
     claimed_at = models.DateTimeField(null=True, blank=True)
@@ -130,6 +281,23 @@ class Package(models.Model):
             if not Package.objects.filter(tracking_number=tracking_number).exists():
                 return tracking_number
     
+    @staticmethod
+    def generate_tracking_numbers(count):
+        """Generate ``count`` unique tracking numbers, checking collisions in one query per round"""
+        alphabet = string.ascii_uppercase + string.digits
+        allocated = set()
+        while len(allocated) < count:
+            candidates = {
+                ''.join(random.choices(alphabet, k=12))
+                for _ in range(count - len(allocated))
+            } - allocated
+            taken = set(
+                Package.objects.filter(tracking_number__in=candidates)
+                .values_list('tracking_number', flat=True)
+            )
+            allocated |= candidates - taken
+        return list(allocated)
+
     @staticmethod
     def generate_verification_code():
         """Generate a random 6-digit verification code"""
@@ -137,51 +305,263 @@ class Package(models.Model):
     
     def calculate_price(self):
         """Calculate price based on service tier and weight"""
-        # Base prices
-        base_prices = {
-            'standard': Decimal('9.99'),
-            'express': Decimal('19.99'),
-            'same_day': Decimal('39.99'),
-        }
-        
-        # Per kg rates
-        per_kg_rates = {
-            'standard': Decimal('2.00'),
-            'express': Decimal('3.00'),
-            'same_day': Decimal('4.00'),
-        }
-        
-        base = base_prices.get(self.service_tier, Decimal('9.99'))
-        rate = per_kg_rates.get(self.service_tier, Decimal('2.00'))
-        
-        total = base + (Decimal(str(self.weight)) * rate)
-        return round(total, 2)
+        return tariff_engine.quote(self.weight, self.service_tier)
 
     def get_status_color(self):
         """Return color code for status badge"""
-        colors = {
-            'pending': '#6B7280',
-            'picked_up': '#3B82F6',
-            'in_transit': '#8B5CF6',
-            'out_for_delivery': '#F59E0B',
-            'delivered': '#10B981',
-        }
-        return colors.get(self.status, '#6B7280')
+        return self.STATUS_COLORS.get(self.status, '#6B7280')
+
+    def get_status_display(self):
+        return self.STATUS_LABELS.get(self.status, self.status)
+
+    def get_service_tier_display(self):
+        return self.SERVICE_TIER_LABELS.get(self.service_tier, self.service_tier)
+
+    def get_payment_status_display(self):
+        return self.PAYMENT_STATUS_LABELS.get(self.payment_status, self.payment_status)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='package_created_idx'),
+            models.Index(fields=['status'], name='package_status_idx'),
+            # Packages waiting for a courier, which every assign_couriers run rereads.
+            models.Index(
+                fields=['id'], condition=models.Q(status='pending', pickup_courier__isnull=True),
+                name='package_no_pickup_courier_idx'
+            ),
+            models.Index(
+                fields=['id'], condition=models.Q(status='out_for_delivery', delivery_courier__isnull=True),
+                name='package_no_deliv_courier_idx'
+            ),
+        ]
 
 
 class TrackingEvent(models.Model):
     """Model for tracking package history"""
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='tracking_events')
     status = models.CharField(max_length=20, choices=Package.STATUS_CHOICES)
-    location = models.CharField(max_length=200)
+    # Indexed together with the timestamp below, for per-location history.
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='events', db_index=False)
     notes = models.TextField(blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.package.tracking_number} - {self.get_status_display()} at {self.location}"
 
+    def get_status_display(self):
+        return Package.STATUS_LABELS.get(self.status, self.status)
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='event_timestamp_idx'),
+            models.Index(fields=['package', '-timestamp'], name='event_package_timestamp_idx'),
+            models.Index(fields=['location', '-timestamp'], name='event_location_timestamp_idx'),
+        ]
+
+
+class StatusNotification(models.Model):
+    """A package status change for its receiver, pending until sent in a batch"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.EmailField()
+    status = models.CharField(max_length=20, choices=Package.STATUS_CHOICES)
+    location = models.CharField(max_length=200)
+    notes = models.TextField(blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.package_id} -> {self.recipient}: {self.status}"
+
+    def get_status_display(self):
+        return Package.STATUS_LABELS.get(self.status, self.status)
+
+    class Meta:
+        ordering = ['changed_at']
+        indexes = [
+            models.Index(fields=['recipient', 'sent_at'], name='notification_recipient_idx'),
+        ]
+
+
+class HubHourlyVolume(models.Model):
+    """Tracking events per hour, location and status; maintained by delivery.analytics"""
+    hour = models.DateTimeField()
+    # Queries always select a range of hours, which the unique index leads with.
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+', db_index=False)
+    status = models.CharField(max_length=20, choices=Package.STATUS_CHOICES)
+    events = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'location', 'status'], name='hub_volume_key'),
+        ]
+
+
+class HubDwellTime(models.Model):
+    """Scans at a location followed by a next scan in a given hour, per dwell-time bucket"""
+    hour = models.DateTimeField(help_text="Hour of the next scan")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+', db_index=False)
+    bucket = models.PositiveSmallIntegerField(help_text="Index into delivery.analytics.DWELL_BUCKETS")
+    departures = models.PositiveIntegerField(default=0)
+    dwell_seconds = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'location', 'bucket'], name='hub_dwell_key'),
+        ]
+
+
+class DailyRevenueFact(models.Model):
+    """Packages and revenue per creation day, service tier and payment status; maintained by delivery.revenue"""
+    day = models.DateField()
+    service_tier = models.CharField(max_length=20, choices=Package.SERVICE_TIER_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Package.PAYMENT_STATUS_CHOICES)
+    packages = models.BigIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.service_tier}/{self.payment_status}"
+
+    @property
+    def revenue(self):
+        return Decimal(self.revenue_cents).scaleb(-2)
+
+    class Meta:
+        ordering = ['-day', 'service_tier', 'payment_status']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'service_tier', 'payment_status'], name='revenue_fact_key'),
+        ]
+
+
+class RollupCursor(models.Model):
+    """How far a rollup has read its source table, by primary key"""
+    name = models.CharField(max_length=50, unique=True)
+    high_water_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """The last row of a file an import has committed, saved in the same transaction as its batch"""
+    name = models.CharField(max_length=255, unique=True)
+    last_row = models.BigIntegerField(default=-1)
+    imported = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ row {self.last_row}"
+
+
+def validate_scopes(value):
+    """Reject scope lists that mention unknown scopes"""
+    known = {scope for scope, _ in ApiKey.SCOPE_CHOICES}
+    unknown = {scope.strip() for scope in value.split(',') if scope.strip()} - known
+    if unknown:
+        raise ValidationError(f"Unknown scope(s): {', '.join(sorted(unknown))}")
+
+
+class ApiKey(models.Model):
+    """Partner API credentials; only a SHA-256 hash of the secret is stored"""
+    SCOPE_CHOICES = [
+        ('create', 'Create packages'),
+        ('track', 'Track packages'),
+        ('bulk', 'Bulk operations'),
+    ]
+
+    name = models.CharField(max_length=200)
+    prefix = models.CharField(max_length=8, unique=True, editable=False)
+    key_hash = models.CharField(max_length=64, editable=False)
+    scopes = models.CharField(
+        max_length=100,
+        default='track',
+        validators=[validate_scopes],
+        help_text="Comma-separated scopes: create, track, bulk"
+    )
+    rate_limit = models.PositiveIntegerField(default=60, help_text="Sustained requests per minute")
+    burst = models.PositiveIntegerField(default=20, help_text="Requests allowed in a burst")
+    is_active = models.BooleanField(default=True)
+    request_count = models.PositiveBigIntegerField(default=0, editable=False)
+    last_used_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix})"
+
+    @staticmethod
+    def hash_key(raw_key):
+        """Hash a full API key; keys carry 256 bits of randomness so a fast hash suffices"""
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    @staticmethod
+    def parse_prefix(raw_key):
+        """Return the lookup prefix of a key formatted as st_<prefix>.<secret>, or None"""
+        if not raw_key.startswith('st_') or '.' not in raw_key:
+            return None
+        return raw_key[3:].split('.', 1)[0]
+
+    def generate_key(self):
+        """Assign a new prefix and secret and return the raw key, which is never stored"""
+        self.prefix = secrets.token_hex(4)
+        raw_key = f"st_{self.prefix}.{secrets.token_urlsafe(32)}"
+        self.key_hash = self.hash_key(raw_key)
+        return raw_key
+
+    def get_scopes(self):
+        return frozenset(scope.strip() for scope in self.scopes.split(',') if scope.strip())
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'API key'
+
+
+class WebhookSubscription(models.Model):
+    """A partner endpoint that receives status changes of packages created with its API key"""
+    api_key = models.ForeignKey(ApiKey, on_delete=models.CASCADE, related_name='webhooks')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, editable=False, help_text="HMAC-SHA256 signing secret")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.api_key.name}: {self.url}"
+
+    def save(self, *args, **kwargs):
+        if not self.secret:
+            self.secret = secrets.token_hex(32)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class WebhookEvent(models.Model):
+    """Outbox row for one event to one subscription, written with the change it describes"""
+    STATUS_PENDING = 'pending'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DEAD, 'Dead-lettered'),
+    ]
+
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='events')
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Webhook event #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_event_due_idx'),
+        ]
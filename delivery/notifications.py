@@ -0,0 +1,154 @@
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from taskqueue.queue import task
+from .eta import refresh_estimates
+from .locations import UNKNOWN_LOCATION, resolve_location
+from .models import StatusNotification, TrackingEvent
+from .webhooks import queue_webhook_events
+
+# The latest state of one package in a batch, and how many changes it folds in.
+PackageUpdate = namedtuple('PackageUpdate', [
+    'package', 'status', 'status_display', 'location', 'notes', 'changed_at', 'changes', 'url',
+])
+
+
+class EmailNotificationBackend:
+    """Sends each batch as one plain-text email through Django's EMAIL_BACKEND"""
+
+    def send_batch(self, recipient, updates):
+        context = {'updates': updates, 'site_url': settings.SITE_URL}
+        if len(updates) == 1:
+            update = updates[0]
+            subject = f"Package {update.package.tracking_number}: {update.status_display}"
+        else:
+            subject = f"Updates on {len(updates)} of your packages"
+        EmailMessage(
+            subject=subject,
+            body=render_to_string('delivery/emails/status_update.txt', context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient],
+        ).send()
+
+
+def get_backend():
+    return import_string(settings.NOTIFICATION_BACKEND)()
+
+
+def queue_status_notifications(changes):
+    """
+    Record status changes for their receivers and schedule batched delivery.
+
+    ``changes`` yields (package_id, recipient, status, location, notes,
+    changed_at) tuples. A change for a recipient without a queued or running
+    send schedules one NOTIFICATION_COALESCE_WINDOW seconds later; changes
+    arriving before it runs join that batch instead of scheduling their own.
+    Unsent changes whose send task failed for good go out with the next
+    change's batch.
+    """
+    notifications = [
+        StatusNotification(
+            package_id=package_id, recipient=recipient, status=status,
+            location=location, notes=notes, changed_at=changed_at
+        )
+        for package_id, recipient, status, location, notes, changed_at in changes
+        if recipient
+    ]
+    if not notifications:
+        return
+    recipients = {notification.recipient for notification in notifications}
+    already_scheduled = send_status_notifications.pending_first_args(recipients)
+    StatusNotification.objects.bulk_create(notifications)
+    send_status_notifications.enqueue_many(
+        [[recipient] for recipient in sorted(recipients - already_scheduled)],
+        delay=settings.NOTIFICATION_COALESCE_WINDOW
+    )
+
+
+def record_status_change(package, status, location, notes=''):
+    """Add a tracking event for a package's new status, re-estimate it, and notify its receiver and partner"""
+    with transaction.atomic():
+        event = TrackingEvent.objects.create(
+            package=package, status=status, location_id=resolve_location(location, blank=UNKNOWN_LOCATION), notes=notes
+        )
+        refresh_estimates([package.pk])
+        queue_status_notifications([
+            (package.pk, package.receiver.email, status, location, notes, event.timestamp)
+        ])
+        queue_webhook_events([(package.pk, status, location, notes, event.timestamp)])
+    return event
+
+
+def _rate_limited_until(recipient, now):
+    """When the recipient may get another batch, or None if they may now"""
+    window_start = now - timedelta(hours=1)
+    recent_batches = sorted(set(
+        StatusNotification.objects.filter(recipient=recipient, sent_at__gte=window_start)
+        .values_list('sent_at', flat=True)
+    ))
+    if len(recent_batches) < settings.NOTIFICATION_MAX_PER_HOUR:
+        return None
+    return recent_batches[-settings.NOTIFICATION_MAX_PER_HOUR] + timedelta(hours=1)
+
+
+def coalesce(notifications):
+    """Fold a recipient's pending changes into one PackageUpdate per package, newest first"""
+    latest = {}
+    counts = {}
+    for notification in notifications:
+        counts[notification.package_id] = counts.get(notification.package_id, 0) + 1
+        current = latest.get(notification.package_id)
+        if current is None or (notification.changed_at, notification.pk) > (current.changed_at, current.pk):
+            latest[notification.package_id] = notification
+    updates = [
+        PackageUpdate(
+            package=notification.package,
+            status=notification.status,
+            status_display=notification.get_status_display(),
+            location=notification.location,
+            notes=notification.notes,
+            changed_at=notification.changed_at,
+            changes=counts[package_id],
+            url=settings.SITE_URL + reverse(
+                'track_package_detail', kwargs={'tracking_number': notification.package.tracking_number}
+            ),
+        )
+        for package_id, notification in latest.items()
+    ]
+    updates.sort(key=lambda update: update.changed_at, reverse=True)
+    return updates
+
+
+@task(max_attempts=5)
+def send_status_notifications(recipient):
+    """Send a recipient's pending status changes as one batch, within their hourly limit"""
+    pending = StatusNotification.objects.filter(recipient=recipient, sent_at__isnull=True)
+    pks = list(pending.values_list('pk', flat=True))
+    if not pks:
+        return
+    now = timezone.now()
+    retry_at = _rate_limited_until(recipient, now)
+    if retry_at is not None:
+        send_status_notifications.enqueue_with([recipient], delay=(retry_at - now).total_seconds())
+        return
+
+    # Claim the rows first so a concurrent run for the same recipient cannot
+    # send them too; release them again if sending fails.
+    if not pending.filter(pk__in=pks).update(sent_at=now):
+        return
+    batch = StatusNotification.objects.filter(pk__in=pks, sent_at=now)
+    try:
+        get_backend().send_batch(recipient, coalesce(batch.select_related('package')))
+    except Exception:
+        batch.update(sent_at=None)
+        raise
+
+    # Changes recorded while this batch was being sent start the next one.
+    if StatusNotification.objects.filter(recipient=recipient, sent_at__isnull=True).exists():
+        send_status_notifications.enqueue_with([recipient], delay=settings.NOTIFICATION_COALESCE_WINDOW)
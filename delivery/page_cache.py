@@ -0,0 +1,118 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve, reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from .checks import cache_is_shared
+from .compression import compress_response, negotiate_encoding
+
+
+def page_cache_key(path, variant=''):
+    return 'page-cache:' + hashlib.md5(f'{variant}|{path}'.encode()).hexdigest()
+
+
+def request_variant(request):
+    """Part of the cache key for request headers the response depends on"""
+    return negotiate_encoding(request)
+
+
+def invalidate_tracking_pages(tracking_numbers):
+    """Drop cached tracking pages after their packages changed"""
+    keys = []
+    for tracking_number in tracking_numbers:
+        path = reverse('track_package_detail', kwargs={'tracking_number': tracking_number})
+        keys.extend(page_cache_key(path, variant) for variant in settings.PAGE_CACHE_VARIANTS)
+    if keys:
+        caches[settings.PAGE_CACHE_ALIAS].delete_many(keys)
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Serve anonymous GET requests for selected pages from the cache.
+
+    Only pages named in PAGE_CACHE_TIMEOUTS are cached, and only for requests
+    without a session or messages cookie and without a query string. A
+    rendered response is stored only if it is a 200 that set no cookies,
+    displayed no messages and did not issue a CSRF token. Cacheable responses
+    get public Cache-Control/Vary headers so an upstream proxy can share
+    them; the same pages rendered for a session are marked private.
+    Tracking pages are invalidated when their package or its events change,
+    in whichever process makes the change. Pages live in PAGE_CACHE_ALIAS,
+    and the middleware is not used unless that cache is shared by all
+    processes, as an invalidation could otherwise miss the other workers.
+    Pages are stored already compressed, once per negotiated encoding, so a
+    hit costs no compression CPU. All response headers are stored with the
+    page, so a hit carries the same security headers as the miss.
+
+    Place it after WhiteNoise and before the session middleware, so hits
+    skip sessions, authentication and the view entirely.
+    """
+
+    def __init__(self, get_response):
+        if not cache_is_shared(settings.PAGE_CACHE_ALIAS):
+            raise MiddlewareNotUsed(f"the {settings.PAGE_CACHE_ALIAS!r} cache is local to each process")
+        self.get_response = get_response
+
+    def _timeout(self, request):
+        if request.method != 'GET':
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return settings.PAGE_CACHE_TIMEOUTS.get(match.url_name)
+
+    @staticmethod
+    def _is_anonymous(request):
+        return (
+            settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and 'messages' not in request.COOKIES
+            and not request.META.get('QUERY_STRING')
+        )
+
+    def __call__(self, request):
+        timeout = self._timeout(request)
+        if timeout is None:
+            return self.get_response(request)
+
+        if not self._is_anonymous(request):
+            response = self.get_response(request)
+            patch_cache_control(response, private=True)
+            return response
+
+        cache = caches[settings.PAGE_CACHE_ALIAS]
+        key = page_cache_key(request.path, request_variant(request))
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers:
+                response[header] = value
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        response = self.get_response(request)
+        if self._is_cacheable(request, response):
+            patch_cache_control(response, public=True, max_age=0, s_maxage=timeout)
+            patch_vary_headers(response, ['Cookie'])
+            compress_response(request, response)
+            # Every header, so hits keep those added by middleware below
+            # this one (X-Frame-Options and the like). Cookies are never
+            # stored; a response that set any is not cached.
+            headers = list(response.items())
+            cache.set(key, (response.content, headers), timeout)
+            response['X-Page-Cache'] = 'MISS'
+        return response
+
+    @staticmethod
+    def _is_cacheable(request, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or request.META.get('CSRF_COOKIE_USED'):
+            return False
+        storage = getattr(request, '_messages', None)
+        if storage is not None and storage.added_new:
+            return False
+        return not getattr(request, 'session', None) or not request.session.modified
@@ -0,0 +1,78 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+def estimate_table_rows(model, using='default'):
+    """Return a cheap row estimate for a model's table, or None if unavailable"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return int(row[0])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table]
+            )
+            row = cursor.fetchone()
+            if row and row[0] is not None:
+                return int(row[0])
+    # Auto-increment keys only grow, so the highest key bounds the row count
+    # and is answered from the primary key index.
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return model._default_manager.using(using).aggregate(top=Max('pk'))['top'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables.
+
+    Unfiltered querysets over more than ``estimate_above`` rows are counted
+    from table statistics instead of a full COUNT(*). Other querysets are
+    counted only up to ``estimate_above`` rows; past that ``count_is_bounded``
+    is set, and opening the last counted page counts another
+    ``estimate_above`` rows beyond it, so every row stays reachable without
+    a COUNT(*) over the whole match. Pages are fetched as a narrow primary
+    key slice first, so deep pages only walk the index before the full rows
+    are loaded by key.
+    """
+    estimate_above = 10000
+    count_is_bounded = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, using=queryset.db)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return self._bounded_count(self.estimate_above)
+
+    def _bounded_count(self, limit):
+        """Count the rows up to ``limit``, noting whether there are more"""
+        count = self.object_list.order_by()[:limit + 1].count()
+        self.count_is_bounded = count > limit
+        return min(count, limit)
+
+    def page(self, number):
+        try:
+            reach = int(number) * self.per_page
+        except (TypeError, ValueError):
+            reach = 0
+        if reach >= self.count and self.count_is_bounded:
+            self.__dict__['count'] = self._bounded_count(reach + self.estimate_above)
+            self.__dict__.pop('num_pages', None)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        queryset = self.object_list
+        pks = list(queryset.values_list('pk', flat=True)[bottom:top])
+        rows = {obj.pk: obj for obj in queryset.filter(pk__in=pks)}
+        return self._get_page([rows[pk] for pk in pks if pk in rows], number, self)
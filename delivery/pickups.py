@@ -0,0 +1,126 @@
+import hashlib
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .eta import address_region
+from .models import PickupSlot
+
+# A bookable window and how many pickups it still takes.
+Availability = namedtuple('Availability', ['date', 'window', 'remaining'])
+
+
+def pickup_area(address):
+    """The area whose couriers collect from an address: the address's region, e.g. "NY" """
+    return address_region(address)[:100]
+
+
+def booking_days(today=None):
+    """The days pickups can be booked for, tomorrow first"""
+    today = today or timezone.localdate()
+    return [today + timedelta(days=offset) for offset in range(1, settings.PICKUP_BOOKING_DAYS + 1)]
+
+
+def availability_cache():
+    """The cache of remaining counts, which every worker must share to show the same counts"""
+    return caches[settings.PICKUP_AVAILABILITY_CACHE]
+
+
+def slot_cache_key(area, day, window):
+    # Areas are free text; hash them so the key suits any cache backend.
+    return f'pickup-slot:{hashlib.md5(area.encode()).hexdigest()}:{day.isoformat()}:{window}'
+
+
+def pickup_slot_value(day, window):
+    """How a slot is named in forms and the availability endpoint"""
+    return f'{day.isoformat()}/{window}'
+
+
+def pickup_slot_label(day, window, remaining=None):
+    label = f"{day:%a %d %b}, {PickupSlot.WINDOW_LABELS[window]}"
+    return label if remaining is None else f"{label}: {remaining} left"
+
+
+def availability(area, days=None):
+    """
+    Remaining pickups per (day, window) of an area, in booking order.
+
+    Counts come from PICKUP_AVAILABILITY_CACHE, one key per slot; slots
+    missing from it are read in one query and cached for
+    PICKUP_AVAILABILITY_TIMEOUT. Slots that do not exist yet have the default
+    capacity. Allocation keeps the cached counts current, so the cache only
+    needs the database after it expires.
+    """
+    days = days or booking_days()
+    windows = [window for window, _ in PickupSlot.WINDOW_CHOICES]
+    keys = {(day, window): slot_cache_key(area, day, window) for day in days for window in windows}
+    cached = availability_cache().get_many(keys.values())
+    missing = {slot: key for slot, key in keys.items() if key not in cached}
+    if missing:
+        stored = {
+            (day, window): max(capacity - booked, 0)
+            for day, window, capacity, booked in PickupSlot.objects.filter(
+                area=area, date__in={day for day, _ in missing}
+            ).values_list('date', 'window', 'capacity', 'booked')
+        }
+        loaded = {key: stored.get(slot, settings.PICKUP_DEFAULT_CAPACITY) for slot, key in missing.items()}
+        availability_cache().set_many(loaded, settings.PICKUP_AVAILABILITY_TIMEOUT)
+        cached.update(loaded)
+    return [Availability(day, window, max(cached[keys[(day, window)]], 0)) for day, window in keys]
+
+
+def _adjust_cached(area, day, window, delta):
+    """Apply a booking or release to the cached count once it is committed; a missing count reloads later"""
+    def adjust():
+        try:
+            availability_cache().incr(slot_cache_key(area, day, window), delta)
+        except ValueError:
+            pass
+    transaction.on_commit(adjust)
+
+
+def allocate(area, day, window):
+    """
+    Book one pickup in a slot and return the slot, or None if it is full.
+
+    The booking is a single conditional UPDATE that only succeeds while
+    ``booked < capacity``, so concurrent requests cannot overbook a slot
+    however many race for its last place.
+    """
+    slot_id = PickupSlot.objects.filter(area=area, date=day, window=window).values_list('pk', flat=True).first()
+    if slot_id is None:
+        PickupSlot.objects.bulk_create(
+            [PickupSlot(area=area, date=day, window=window, capacity=settings.PICKUP_DEFAULT_CAPACITY)],
+            ignore_conflicts=True
+        )
+        slot_id = PickupSlot.objects.filter(area=area, date=day, window=window).values_list('pk', flat=True).get()
+    booked = PickupSlot.objects.filter(pk=slot_id, booked__lt=F('capacity')).update(booked=F('booked') + 1)
+    if not booked:
+        availability_cache().set(slot_cache_key(area, day, window), 0, settings.PICKUP_AVAILABILITY_TIMEOUT)
+        return None
+    _adjust_cached(area, day, window, -1)
+    return PickupSlot(pk=slot_id, area=area, date=day, window=window)
+
+
+def allocate_first(area, days=None):
+    """Book the earliest slot of an area with room, or return None if all are full"""
+    for option in availability(area, days):
+        if option.remaining > 0:
+            slot = allocate(area, option.date, option.window)
+            if slot is not None:
+                return slot
+    return None
+
+
+def release(slot):
+    """Give back a pickup booked in ``slot``, e.g. when its package is deleted"""
+    if PickupSlot.objects.filter(pk=slot.pk, booked__gt=0).update(booked=F('booked') - 1):
+        _adjust_cached(slot.area, slot.date, slot.window, 1)
+
+
+def forget(slot):
+    """Drop the cached count of a slot whose capacity was changed by hand"""
+    availability_cache().delete(slot_cache_key(slot.area, slot.date, slot.window))
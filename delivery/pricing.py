@@ -0,0 +1,131 @@
+import threading
+from collections import namedtuple
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Weights are priced as integer millionths of a kilogram; a weight with more
+# decimal places than this is priced one at a time with Decimal arithmetic.
+WEIGHT_PLACES = 6
+WEIGHT_SCALE = 10 ** WEIGHT_PLACES
+# Largest weight a package may have, in kg (Package.weight holds 6 digits, 2
+# after the point). Callers validate against it; int64 prices would overflow
+# from around 1e15 kg.
+MAX_WEIGHT = Decimal('9999.99')
+MAX_WEIGHT_UNITS = int(MAX_WEIGHT.scaleb(WEIGHT_PLACES))
+
+# Base price and price per kg of every tier, in cents, in the order of ``tiers``.
+Tables = namedtuple('Tables', ['tiers', 'codes', 'base_cents', 'per_kg_cents', 'default_code'])
+
+
+def to_weight_units(weight):
+    """A weight as integer millionths of a kilogram, or None if that would not be exact"""
+    if isinstance(weight, int):
+        return weight * WEIGHT_SCALE
+    if not isinstance(weight, Decimal):
+        weight = Decimal(str(weight))
+    units = weight.scaleb(WEIGHT_PLACES)
+    if units != units.to_integral_value():
+        return None
+    return int(units)
+
+
+def round_half_even(numerator, denominator):
+    """``numerator / denominator`` rounded half to even, element-wise on int64 arrays"""
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice = remainder * 2
+    return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+
+
+def decimal_cents(weight, base_cents, per_kg_cents):
+    """The price in cents of a weight too precise for WEIGHT_PLACES, with Decimal arithmetic"""
+    total = Decimal(base_cents) + Decimal(str(weight)) * per_kg_cents
+    return int(total.quantize(Decimal(1)))  # ROUND_HALF_EVEN, the context default
+
+
+class TariffEngine:
+    """
+    Prices (weight, service tier) pairs from the PRICING_TARIFFS table.
+
+    A price is the tier's base price plus weight times its per-kg rate,
+    rounded half to even to the cent, which is exactly what Decimal
+    arithmetic with ``round(total, 2)`` gives. The table is converted to
+    integer cents once; batches are then priced with int64 array arithmetic.
+    Unknown tiers are charged at PRICING_DEFAULT_TIER.
+    """
+
+    def __init__(self):
+        self.tables = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        tiers = list(settings.PRICING_TARIFFS)
+        cents = [[Decimal(amount) * 100 for amount in tariff] for tariff in settings.PRICING_TARIFFS.values()]
+        if any(amount != amount.to_integral_value() for tariff in cents for amount in tariff):
+            raise ImproperlyConfigured("PRICING_TARIFFS prices must be whole cents")
+        if settings.PRICING_DEFAULT_TIER not in tiers:
+            raise ImproperlyConfigured("PRICING_DEFAULT_TIER must be one of the PRICING_TARIFFS tiers")
+        tables = Tables(
+            tiers=tiers,
+            codes={tier: code for code, tier in enumerate(tiers)},
+            base_cents=np.array([int(base) for base, _ in cents], dtype=np.int64),
+            per_kg_cents=np.array([int(rate) for _, rate in cents], dtype=np.int64),
+            default_code=tiers.index(settings.PRICING_DEFAULT_TIER),
+        )
+        with self._lock:
+            self.tables = tables
+        return tables
+
+    def reset(self):
+        """Forget the loaded table, e.g. after PRICING_TARIFFS changed"""
+        with self._lock:
+            self.tables = None
+
+    def get_tables(self):
+        return self.tables or self.load()
+
+    def is_known_tier(self, tier):
+        return tier in self.get_tables().codes
+
+    def quote_cents(self, weights, tiers):
+        """Prices in cents of ``weights`` (kg, as Decimal, str, int or float) in ``tiers``, as an int64 array"""
+        tables = self.get_tables()
+        codes = np.fromiter(
+            (tables.codes.get(tier, tables.default_code) for tier in tiers), dtype=np.int64, count=len(tiers)
+        )
+        units = [to_weight_units(weight) for weight in weights]
+        inexact = [index for index, value in enumerate(units) if value is None]
+        for index in inexact:
+            units[index] = 0
+        if any(abs(value) > MAX_WEIGHT_UNITS for value in units):
+            raise ValueError(f"Weights above {MAX_WEIGHT} kg cannot be priced")
+        units = np.array(units, dtype=np.int64)
+
+        # Price in units of a cent / WEIGHT_SCALE, then rounded to cents.
+        exact = tables.base_cents[codes] * WEIGHT_SCALE + units * tables.per_kg_cents[codes]
+        cents = round_half_even(exact, WEIGHT_SCALE)
+        for index in inexact:
+            code = codes[index]
+            cents[index] = decimal_cents(weights[index], int(tables.base_cents[code]), int(tables.per_kg_cents[code]))
+        return cents
+
+    def quote_many(self, weights, tiers):
+        """Prices of ``weights`` in ``tiers`` as Decimals with two places"""
+        return [Decimal(int(cents)).scaleb(-2) for cents in self.quote_cents(weights, tiers)]
+
+    def quote(self, weight, tier):
+        """The price of one package, with plain integer arithmetic rather than arrays"""
+        tables = self.get_tables()
+        code = tables.codes.get(tier, tables.default_code)
+        base, rate = int(tables.base_cents[code]), int(tables.per_kg_cents[code])
+        units = to_weight_units(weight)
+        if units is None:
+            return Decimal(decimal_cents(weight, base, rate)).scaleb(-2)
+        quotient, remainder = divmod(base * WEIGHT_SCALE + units * rate, WEIGHT_SCALE)
+        if remainder * 2 > WEIGHT_SCALE or (remainder * 2 == WEIGHT_SCALE and quotient % 2):
+            quotient += 1
+        return Decimal(quotient).scaleb(-2)
+
+
+tariff_engine = TariffEngine()
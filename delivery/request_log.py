@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+
+# Query parameters logged with their values; the rest (search terms,
+# addresses, dates, redirect targets) are logged by name only.
+LOGGED_QUERY_VALUES = frozenset({'page', 'hours', 'period', 'by', 'service_tier', 'payment_status', 'status'})
+
+
+def redact_query(query):
+    """A QueryDict as a query string with the values outside LOGGED_QUERY_VALUES emptied"""
+    return urlencode([
+        (name, value if name in LOGGED_QUERY_VALUES else '')
+        for name, values in query.lists() for value in values
+    ])
+
+
+def client_id(session_key):
+    """A stable stand-in for a session cookie, so the log holds no usable session ids"""
+    return hashlib.sha256(session_key.encode()).hexdigest()[:16]
+
+
+class RequestLogMiddleware:
+    """
+    Append one JSON line per request to REQUEST_LOG_PATH, for replay_requests.
+
+    Not used unless REQUEST_LOG_PATH is set. A line has the start time (Unix
+    seconds), method, path and query string, the URL name and tracking
+    number when the path has one, the response status and the time taken in
+    ms, a hashed client id for requests with a session and whether an API
+    key was sent. Bodies, cookies, key values and query values outside
+    LOGGED_QUERY_VALUES are never written.
+
+    Place it after WhiteNoise, so static files are left out, and before the
+    page cache, so cache hits are timed too. Every worker appends to the same
+    file; each line is written with a single call.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_LOG_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log = open(settings.REQUEST_LOG_PATH, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        started_at = time.time()
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        if match is None:
+            # Page cache hits and unknown paths never reach URL resolution.
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                pass
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        entry = {
+            'ts': round(started_at, 6),
+            'method': request.method,
+            'path': request.path,
+            'query': redact_query(request.GET),
+            'view': match.url_name if match else None,
+            'tracking_number': match.kwargs.get('tracking_number') if match else None,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 3),
+            'client': client_id(session_key) if session_key else None,
+            'api_key': 'API-KEY' in request.headers,
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self.log.write(line)
+            self.log.flush()
+        return response
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from .counters import increment
+from .models import DailyRevenueFact, Package
+
+# The package fields a fact row depends on, in the order of a revenue row.
+REVENUE_FIELDS = ('created_at', 'service_tier', 'payment_status', 'price')
+
+REPORT_PERIODS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+REPORT_DIMENSIONS = ['service_tier', 'payment_status']
+
+
+def to_cents(amount):
+    return int((Decimal(amount or 0) * 100).to_integral_value())
+
+
+def cents_to_amount(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def revenue_row(package):
+    """The (created_at, service_tier, payment_status, price) a package contributes to the facts"""
+    return tuple(getattr(package, field) for field in REVENUE_FIELDS)
+
+
+def stored_revenue_row(package_pk):
+    """The revenue row of a package as currently saved, or None"""
+    return Package.objects.filter(pk=package_pk).values_list(*REVENUE_FIELDS).first()
+
+
+def record_revenue(added=(), removed=()):
+    """
+    Add packages to, or take them out of, the daily facts.
+
+    ``added`` and ``removed`` yield revenue rows. A change of payment status
+    or price is the old row removed and the new one added. Facts are keyed by
+    the day the package was created in the current time zone.
+    """
+    tz = timezone.get_current_timezone()
+    deltas = defaultdict(lambda: {'packages': 0, 'revenue_cents': 0})
+    for sign, rows in ((1, added), (-1, removed)):
+        for created_at, service_tier, payment_status, price in rows:
+            delta = deltas[(created_at.astimezone(tz).date(), service_tier, payment_status)]
+            delta['packages'] += sign
+            delta['revenue_cents'] += sign * to_cents(price)
+    increment(DailyRevenueFact, ['day', 'service_tier', 'payment_status'], {
+        key: delta for key, delta in deltas.items() if delta['packages'] or delta['revenue_cents']
+    })
+
+
+def day_bounds(start, end):
+    """Aware datetimes from the start of day ``start`` to the start of the day after ``end``"""
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def raw_revenue(start, end):
+    """The facts of days ``start``..``end`` computed from packages, as {(day, tier, status): (packages, cents)}"""
+    since, until = day_bounds(start, end)
+    rows = (
+        Package.objects.filter(created_at__gte=since, created_at__lt=until).order_by()
+        .annotate(day=TruncDate('created_at')).values('day', 'service_tier', 'payment_status')
+        .annotate(count=Count('pk'), revenue=Sum('price'))
+        .values_list('day', 'service_tier', 'payment_status', 'count', 'revenue')
+    )
+    return {(day, tier, status): (count, to_cents(revenue)) for day, tier, status, count, revenue in rows}
+
+
+def stored_revenue(start, end):
+    """The facts recorded for days ``start``..``end``, shaped like raw_revenue()"""
+    return {
+        (day, tier, status): (packages, cents)
+        for day, tier, status, packages, cents in DailyRevenueFact.objects.filter(day__range=(start, end))
+        .values_list('day', 'service_tier', 'payment_status', 'packages', 'revenue_cents')
+        if packages or cents
+    }
+
+
+def rebuild_revenue_facts(start, end):
+    """
+    Recompute the facts of days ``start``..``end`` from their packages, in one transaction.
+
+    The result is exact when no package created on those days changes while
+    it runs, which check_revenue_facts can confirm afterwards.
+    """
+    with transaction.atomic():
+        DailyRevenueFact.objects.filter(day__range=(start, end)).delete()
+        increment(DailyRevenueFact, ['day', 'service_tier', 'payment_status'], {
+            key: {'packages': count, 'revenue_cents': cents}
+            for key, (count, cents) in raw_revenue(start, end).items()
+        })
+
+
+def revenue_report(period='day', start=None, end=None, by=REPORT_DIMENSIONS, service_tier=None, payment_status=None):
+    """
+    Packages and revenue per ``period`` (day, week or month), broken down by the ``by`` dimensions.
+
+    Answers from the daily facts only. Weeks start on Monday and are labelled
+    by that day, months by their first day.
+    """
+    facts = DailyRevenueFact.objects.all()
+    if start:
+        facts = facts.filter(day__gte=start)
+    if end:
+        facts = facts.filter(day__lte=end)
+    if service_tier:
+        facts = facts.filter(service_tier=service_tier)
+    if payment_status:
+        facts = facts.filter(payment_status=payment_status)
+
+    trunc = REPORT_PERIODS[period]
+    facts = facts.annotate(period=trunc('day') if trunc else F('day'))
+    rows = (
+        facts.order_by().values('period', *by)
+        .annotate(package_count=Sum('packages'), cents=Sum('revenue_cents'))
+        .order_by('period', *by)
+    )
+    return [
+        {
+            'period': row['period'].isoformat(),
+            **{dimension: row[dimension] for dimension in by},
+            'packages': row['package_count'],
+            'revenue': str(cents_to_amount(row['cents'])),
+        }
+        for row in rows
+        if row['package_count'] or row['cents']
+    ]
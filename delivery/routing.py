@@ -0,0 +1,195 @@
+import math
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import GeocodedAddress, Package, TrackingEvent, address_key
+
+EARTH_RADIUS_KM = 6371.0
+
+# A delivery address on a route; latitude and longitude are floats.
+Stop = namedtuple('Stop', ['package_id', 'tracking_number', 'address', 'latitude', 'longitude'])
+# One courier's stops in delivery order, and the length of the round trip from the hub in km.
+Route = namedtuple('Route', ['courier', 'stops', 'distance_km'])
+
+
+def geocode(addresses):
+    """Coordinates of the addresses found in the geocoding table, as {address: (latitude, longitude)}"""
+    keys = {address_key(address): address for address in addresses}
+    wanted = list(keys)
+    found = {}
+    for start in range(0, len(wanted), 500):
+        chunk = wanted[start:start + 500]
+        for key, latitude, longitude in GeocodedAddress.objects.filter(key__in=chunk).values_list(
+                'key', 'latitude', 'longitude'):
+            found[keys[key]] = (float(latitude), float(longitude))
+    return found
+
+
+def delivery_stops(hub, day):
+    """
+    The stops of packages that went out for delivery from ``hub`` on ``day`` and are still out.
+
+    Returns the stops and the packages whose receiver address is missing from
+    the geocoding table, as (package id, tracking number, address) tuples.
+    """
+    since = timezone.make_aware(datetime.combine(day, time.min))
+    until = since + timedelta(days=1)
+    package_ids = TrackingEvent.objects.filter(
+        location=hub, status='out_for_delivery', timestamp__gte=since, timestamp__lt=until
+    ).values('package_id')
+    packages = list(
+        Package.objects.filter(pk__in=package_ids, status='out_for_delivery').order_by('pk')
+        .values_list('pk', 'tracking_number', 'receiver__address')
+    )
+    coordinates = geocode({address for _, _, address in packages})
+    stops, unlocated = [], []
+    for package_id, tracking_number, address in packages:
+        if address in coordinates:
+            stops.append(Stop(package_id, tracking_number, address, *coordinates[address]))
+        else:
+            unlocated.append((package_id, tracking_number, address))
+    return stops, unlocated
+
+
+def project(latitudes, longitudes, origin):
+    """Points as (x, y) km from ``origin`` (latitude, longitude); accurate enough across a city or region"""
+    lat0, lon0 = origin
+    x = np.radians(np.asarray(longitudes, dtype=np.float64) - lon0) * math.cos(math.radians(lat0)) * EARTH_RADIUS_KM
+    y = np.radians(np.asarray(latitudes, dtype=np.float64) - lat0) * EARTH_RADIUS_KM
+    return np.column_stack([x, y])
+
+
+def distance_matrix(points):
+    """Straight-line distances between all pairs of (x, y) points, as float32"""
+    points = points.astype(np.float32)
+    return np.hypot(points[:, None, 0] - points[None, :, 0], points[:, None, 1] - points[None, :, 1])
+
+
+def kmeans(points, k, iterations=50, seed=0):
+    """
+    Cluster labels of ``points`` into ``k`` groups by Lloyd's algorithm with k-means++ seeding.
+
+    Stops early once no point changes cluster. Clusters left without points
+    are moved to the points farthest from their centers.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    k = min(k, n)
+    centers = [points[rng.integers(n)]]
+    closest = np.sum((points - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        index = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centers.append(points[index])
+        closest = np.minimum(closest, np.sum((points - points[index]) ** 2, axis=1))
+    centers = np.array(centers)
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        empty = counts == 0
+        centers = np.where(empty[:, None], centers, sums / np.maximum(counts, 1)[:, None])
+        if empty.any():
+            farthest = distances[np.arange(n), labels].argsort()[::-1][:empty.sum()]
+            centers[empty] = points[farthest]
+    return labels
+
+
+def nearest_neighbour_tour(dist):
+    """A tour from point 0 that always visits the closest unvisited point next"""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    for _ in range(n - 1):
+        current = np.where(visited, np.inf, dist[tour[-1]]).argmin()
+        visited[current] = True
+        tour.append(int(current))
+    return np.array(tour)
+
+
+def two_opt(dist, tour, max_passes):
+    """
+    Shorten a closed tour by reversing segments while that removes a crossing.
+
+    For each edge, the best exchange with every later edge is found with one
+    vectorized expression; point 0 (the hub) stays first. Stops after a pass
+    with no improvement or after ``max_passes``.
+    """
+    tour = tour.copy()
+    n = len(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            c = tour[i + 2:]
+            d = np.append(tour[i + 3:], tour[0])
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+            best = delta.argmin()
+            if delta[best] < -1e-6:
+                j = i + 2 + best
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return tour
+
+
+def tour_length(dist, tour):
+    return float(dist[tour, np.roll(tour, -1)].sum())
+
+
+def plan_routes(hub, stops, couriers=None):
+    """
+    Split ``stops`` among couriers and order each courier's round trip from ``hub``.
+
+    ``hub`` is a (latitude, longitude) pair. Stops are clustered by k-means
+    so each courier covers one neighbourhood, then each cluster is sequenced
+    by nearest neighbour and improved with 2-opt. Without a courier count,
+    clusters start at one per ROUTE_MAX_STOPS stops and any that ends up
+    larger is split again, so no courier gets more. Routes are numbered
+    clockwise from north around the hub.
+    """
+    if not stops:
+        return []
+    points = project([stop.latitude for stop in stops], [stop.longitude for stop in stops], hub)
+    limit = settings.ROUTE_MAX_STOPS
+    labels = kmeans(points, couriers or math.ceil(len(stops) / limit))
+    clusters = [np.flatnonzero(labels == cluster) for cluster in np.unique(labels)]
+    if not couriers:
+        pending, clusters = clusters, []
+        while pending:
+            members = pending.pop()
+            if len(members) <= limit:
+                clusters.append(members)
+                continue
+            parts = math.ceil(len(members) / limit)
+            labels = kmeans(points[members], parts)
+            if len(np.unique(labels)) == 1:
+                # Stops at one spot, e.g. a tower block, cannot be told apart by place.
+                clusters.extend(np.array_split(members, parts))
+            else:
+                pending.extend(members[labels == cluster] for cluster in np.unique(labels))
+
+    routes = []
+    for members in clusters:
+        # The hub is point 0 of every tour.
+        dist = distance_matrix(np.vstack([[0.0, 0.0], points[members]]))
+        tour = two_opt(dist, nearest_neighbour_tour(dist), settings.ROUTE_TWO_OPT_PASSES)
+        center = points[members].mean(axis=0)
+        routes.append((
+            math.atan2(center[0], center[1]) % (2 * math.pi),
+            [stops[members[index - 1]] for index in tour[1:]],
+            round(tour_length(dist, tour), 2),
+        ))
+    routes.sort(key=lambda route: route[0])
+    return [Route(number, route_stops, distance) for number, (_, route_stops, distance) in enumerate(routes, 1)]
@@ -0,0 +1,161 @@
+import re
+from collections import namedtuple
+from functools import reduce
+from operator import and_, or_
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Package
+
+# One page of results: ranked package ids and the number of matches in all.
+SearchPage = namedtuple('SearchPage', ['ids', 'total'])
+
+TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """The words of a query, lowercased; punctuation only separates them"""
+    return TERM_RE.findall(query.lower())
+
+
+class DatabaseSearchBackend:
+    """
+    Case-insensitive substring match over the searched columns with plain ORM lookups.
+
+    Needs no index and works on any database, but every search scans the
+    packages joined to their customers. Every word must match some column;
+    results are newest first.
+    """
+    fields = [
+        'tracking_number', 'description',
+        'receiver__name', 'receiver__email', 'receiver__phone', 'receiver__address',
+        'sender__name', 'sender__email', 'sender__phone', 'sender__address',
+    ]
+
+    def update(self, package_ids):
+        pass
+
+    def remove(self, package_ids):
+        pass
+
+    def rebuild(self, chunk_size=None):
+        pass
+
+    def search(self, query, limit=20, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return SearchPage([], 0)
+        matches = Package.objects.filter(reduce(and_, [
+            reduce(or_, [Q(**{f'{field}__icontains': term}) for field in self.fields])
+            for term in terms
+        ]))
+        ids = list(matches.order_by('-created_at', '-pk').values_list('pk', flat=True)[offset:offset + limit])
+        return SearchPage(ids, matches.count())
+
+
+class SQLiteFTSBackend:
+    """
+    Ranked search over an SQLite FTS5 table with one row per package, keyed by package id.
+
+    Each word of a query matches as a word prefix in any column, so partial
+    names, street names and tracking numbers all work; results are ordered by
+    BM25 with tracking numbers and receivers weighted above senders and
+    descriptions. Rows are rewritten from the packages and customers tables
+    whenever the searched fields change (see delivery.signals).
+    """
+    table = 'delivery_package_search'
+    # bm25() weights of the columns, in table order.
+    weights = {'tracking_number': 10.0, 'description': 1.0, 'receiver': 4.0, 'sender': 2.0}
+    chunk_size = 500
+    # The table is created by migration 0014_package_search:
+    # fts5(tracking_number, description, receiver, sender,
+    #      tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+
+    # Customer columns indexed per party, plus the phone number's digits so
+    # "(555) 010-2030" is found as 5550102030. Migration 0014_package_search
+    # populates the index with a frozen copy of this SQL and of
+    # _document_select(); documents changed here are only rewritten as rows
+    # are updated, so also run rebuild_search_index after deploying.
+    party_sql = (
+        "{c}.name || ' ' || {c}.email || ' ' || {c}.phone || ' ' || {c}.address || ' ' || "
+        "replace(replace(replace(replace(replace(replace({c}.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+    )
+
+    def _document_select(self, where):
+        return (
+            f"SELECT p.id, p.tracking_number, p.description, "
+            f"{self.party_sql.format(c='r')}, {self.party_sql.format(c='s')} "
+            f"FROM delivery_package p "
+            f"JOIN delivery_customer r ON r.id = p.receiver_id "
+            f"JOIN delivery_customer s ON s.id = p.sender_id "
+            f"WHERE {where}"
+        )
+
+    def update(self, package_ids):
+        """Rewrite the index rows of these packages from the database"""
+        package_ids = list(package_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(package_ids), self.chunk_size):
+                chunk = package_ids[start:start + self.chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(
+                    f"INSERT INTO {self.table} (rowid, tracking_number, description, receiver, sender) "
+                    + self._document_select(f"p.id IN ({placeholders})"),
+                    chunk
+                )
+
+    def remove(self, package_ids):
+        package_ids = list(package_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(package_ids), self.chunk_size):
+                chunk = package_ids[start:start + self.chunk_size]
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+
+    def rebuild(self, chunk_size=10000):
+        """Re-index every package, a primary key range per statement, then merge the index segments"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            last_pk = 0
+            while True:
+                cursor.execute(
+                    "SELECT max(id) FROM (SELECT id FROM delivery_package WHERE id > %s ORDER BY id LIMIT %s)",
+                    [last_pk, chunk_size]
+                )
+                top = cursor.fetchone()[0]
+                if top is None:
+                    break
+                cursor.execute(
+                    f"INSERT INTO {self.table} (rowid, tracking_number, description, receiver, sender) "
+                    + self._document_select("p.id > %s AND p.id <= %s"),
+                    [last_pk, top]
+                )
+                last_pk = top
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def search(self, query, limit=20, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return SearchPage([], 0)
+        # Quoted terms cannot be read as FTS5 operators or column filters.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = f"bm25({self.table}, {', '.join(str(weight) for weight in self.weights.values())})"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s ORDER BY {rank} LIMIT %s OFFSET %s",
+                [match, limit, offset]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if offset == 0 and len(ids) < limit:
+                total = len(ids)
+            else:
+                cursor.execute(f"SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s", [match])
+                total = cursor.fetchone()[0]
+        return SearchPage(ids, total)
+
+
+def get_search_backend():
+    return import_string(settings.SEARCH_BACKEND)()
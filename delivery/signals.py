@@ -0,0 +1,118 @@
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.db.models import Q
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .locations import locations
+from .models import Customer, Location, Package, PickupSlot, TrackingEvent
+from .page_cache import invalidate_tracking_pages
+from .pickups import release
+from .pricing import tariff_engine
+from .revenue import REVENUE_FIELDS, record_revenue, revenue_row, stored_revenue_row
+from .search import get_search_backend
+from .tracking_filter import tracking_filter
+
+
+@receiver(post_save, sender=Package)
+def register_tracking_number(sender, instance, created, **kwargs):
+    """Make new tracking numbers visible to the tracking number filter"""
+    if created:
+        tracking_filter.add(instance.tracking_number)
+
+
+@receiver(post_save, sender=Package)
+def invalidate_package_page(sender, instance, created, **kwargs):
+    """Drop the cached tracking page of a changed package"""
+    if not created:
+        invalidate_tracking_pages([instance.tracking_number])
+
+
+@receiver(pre_save, sender=Package)
+def remember_revenue_row(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Note what a changed package contributed to the revenue facts before this save"""
+    instance._revenue_before = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(REVENUE_FIELDS):
+        return
+    instance._revenue_before = stored_revenue_row(instance.pk)
+
+
+@receiver(post_save, sender=Package)
+def update_revenue_facts(sender, instance, created, raw=False, **kwargs):
+    """Move a new or repriced package, or one whose payment status changed, into its daily fact"""
+    if raw:
+        return
+    before = getattr(instance, '_revenue_before', None)
+    after = revenue_row(instance)
+    if created:
+        record_revenue(added=[after])
+    elif before is not None and before != after:
+        record_revenue(added=[after], removed=[before])
+
+
+@receiver(pre_delete, sender=Package)
+def remove_revenue(sender, instance, **kwargs):
+    """Take a package being deleted out of the revenue facts, as saved rather than as in memory"""
+    before = stored_revenue_row(instance.pk)
+    if before is not None:
+        record_revenue(removed=[before])
+
+
+# Package fields whose change rewrites the package's search index row.
+SEARCH_FIELDS = {'tracking_number', 'description', 'sender', 'sender_id', 'receiver', 'receiver_id'}
+
+
+@receiver(post_save, sender=Package)
+def index_package(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Keep a new or edited package findable by search"""
+    if raw or (update_fields is not None and not set(update_fields) & SEARCH_FIELDS):
+        return
+    get_search_backend().update([instance.pk])
+
+
+@receiver(post_save, sender=Customer)
+def index_customer_packages(sender, instance, created, raw=False, **kwargs):
+    """A customer's name, email, phone and address are searched on each of their packages"""
+    if raw or created:
+        return
+    get_search_backend().update(
+        Package.objects.filter(Q(sender_id=instance.pk) | Q(receiver_id=instance.pk)).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Package)
+def unindex_package(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_delete, sender=Package)
+def release_pickup_slot(sender, instance, **kwargs):
+    """A deleted package no longer needs its pickup"""
+    if instance.pickup_slot_id:
+        slot = PickupSlot.objects.filter(pk=instance.pickup_slot_id).first()
+        if slot is not None:
+            release(slot)
+
+
+@receiver(post_save, sender=TrackingEvent)
+def invalidate_event_page(sender, instance, **kwargs):
+    """Drop the cached tracking page when a package gets a new event"""
+    invalidate_tracking_pages([instance.package.tracking_number])
+
+
+@receiver(post_delete, sender=Location)
+def forget_location(sender, instance, **kwargs):
+    """Stop resolving names to a deleted location's id"""
+    locations.clear()
+
+
+@receiver(post_migrate)
+def forget_locations(sender, **kwargs):
+    """Migrations and flushes may remove locations wholesale"""
+    locations.clear()
+
+
+@receiver(setting_changed)
+def reload_tariffs(sender, setting, **kwargs):
+    if setting in ('PRICING_TARIFFS', 'PRICING_DEFAULT_TIER'):
+        tariff_engine.reset()
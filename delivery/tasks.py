@@ -0,0 +1,43 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from taskqueue.models import Task
+from taskqueue.queue import task
+from . import images
+from .locations import UNKNOWN_LOCATION, resolve_location
+from .models import TrackingEvent
+from .notifications import send_status_notifications  # noqa: F401 (registers the task)
+from .webhooks import queue_webhook_events
+
+
+@task(priority=Task.PRIORITY_HIGH)
+def record_tracking_event(package_id, status, location, notes, timestamp):
+    """Insert a tracking event stamped with the time it happened, not the time the task ran"""
+    timestamp = datetime.fromisoformat(timestamp)
+    event = {
+        'package_id': package_id, 'status': status,
+        'location_id': resolve_location(location, blank=UNKNOWN_LOCATION), 'timestamp': timestamp,
+    }
+    with transaction.atomic():
+        if not TrackingEvent.objects.filter(**event).exists():
+            TrackingEvent.objects.create(notes=notes, **event)
+            queue_webhook_events([(package_id, status, location, notes, timestamp)])
+
+
+@task(priority=Task.PRIORITY_LOW, timeout=600)
+def process_image(package_id):
+    """Re-encode a package's uploaded image and create its thumbnail"""
+    images.process_package_image(package_id)
+
+
+@task(max_attempts=5)
+def send_contact_message(name, email, subject, message):
+    """Forward a contact form submission to the support inbox"""
+    EmailMessage(
+        subject=f"[SwiftTrack contact] {subject}",
+        body=f"From: {name} <{email}>\n\n{message}",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[settings.CONTACT_EMAIL],
+        reply_to=[email],
+    ).send()
@@ -1,3 +1,965 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock, skipUnless
+import numpy as np
+from PIL import Image
+from django.db import DatabaseError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from taskqueue.models import Task
+from .admin import CustomerAdmin
+from .api_auth import KeyCache, VerifiedKey, WindowRateLimiter, key_cache
+from .analytics import hub_summary, truncate_hour, update_rollups
+from .assignment import assign_couriers, write_assignments
+from .benchmarks import StubWebhookServer, ViewBudgetTestCase
+from .bulk import bulk_update_payment_status, bulk_update_status, iter_pk_batches
+from .checks import check_shared_caches
+from .eta import LEVELS, EtaEngine, quantile_table
+from .exports import ExportStats, stream_packages
+from .forms import PackageAdminForm
+from .imports import run_import
+from .locations import locations
+from .models import (
+    ApiKey, Courier, Customer, HubDwellTime, HubHourlyVolume, ImportCheckpoint, Location, Package, PickupSlot,
+    StatusNotification, TrackingEvent, WebhookEvent, WebhookSubscription,
+)
+from .notifications import queue_status_notifications, record_status_change
+from .pagination import EstimatedCountPaginator
+from .pickups import allocate, availability, booking_days, release
+from .pricing import MAX_WEIGHT, tariff_engine
+from .request_log import RequestLogMiddleware
+from .revenue import raw_revenue, stored_revenue
+from .search import SQLiteFTSBackend
+from .tracking_filter import BloomFilter, TrackingNumberFilter
+from .warmup import warm_tracking_filter
+from .webhooks import SIGNATURE_HEADER, WebhookDispatcher, verify_signature
 
-# Create your tests here.
+
+@override_settings(TASKS_ALWAYS_EAGER=False, WEBHOOK_RETRY_BASE=0, WEBHOOK_MAX_ATTEMPTS=3)
+class WebhookTests(TransactionTestCase):
+    """The dispatcher's pool threads talk to a local stub server, so these tests commit for real"""
+
+    def setUp(self):
+        self.api_key = ApiKey(name='Partner', scopes='create,track')
+        self.api_key.generate_key()
+        self.api_key.save()
+        sender = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        receiver = Customer.objects.create(name='Receiver', email='r@example.com', phone='2', address='2 Road')
+        self.packages = [
+            Package.objects.create(sender=sender, receiver=receiver, description='Books', weight=1, api_key=self.api_key)
+            for _ in range(3)
+        ]
+
+    def subscribe(self, url):
+        return WebhookSubscription.objects.create(api_key=self.api_key, url=url)
+
+    def dispatch(self, **options):
+        dispatcher = WebhookDispatcher(poll_interval=0, **options)
+        dispatcher.run(drain=True)
+        return dispatcher
+
+    def test_status_changes_are_delivered_signed_and_batched(self):
+        with StubWebhookServer() as stub:
+            subscription = self.subscribe(stub.url)
+            bulk_update_status(Package.objects.all(), 'in_transit', 'Hub A')
+            record_status_change(self.packages[0], 'out_for_delivery', 'Van 7')
+            dispatcher = self.dispatch(batch_size=3)
+
+        self.assertEqual(dispatcher.delivered, 4)
+        self.assertEqual(len(stub.requests), 2)
+        headers, body = stub.requests[0]
+        self.assertTrue(verify_signature(subscription.secret, headers[SIGNATURE_HEADER], body))
+        self.assertFalse(verify_signature('wrong', headers[SIGNATURE_HEADER], body))
+        events = json.loads(body)['events']
+        self.assertEqual(
+            {event['tracking_number'] for event in events},
+            {package.tracking_number for package in self.packages}
+        )
+        self.assertEqual(events[0]['status'], 'in_transit')
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_failed_deliveries_back_off_then_dead_letter(self):
+        with StubWebhookServer(status=500) as stub:
+            self.subscribe(stub.url)
+            record_status_change(self.packages[0], 'in_transit', 'Hub A')
+            with override_settings(WEBHOOK_RETRY_BASE=3600):
+                self.dispatch()
+            event = WebhookEvent.objects.get()
+            self.assertEqual(event.status, WebhookEvent.STATUS_PENDING)
+            self.assertEqual(event.attempts, 1)
+            self.assertIn('HTTP 500', event.last_error)
+            # Not due yet, so nothing is sent.
+            self.dispatch()
+            self.assertEqual(len(stub.requests), 1)
+
+            WebhookEvent.objects.update(next_attempt_at=event.created_at)
+            dispatcher = self.dispatch()
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(dispatcher.dead, 1)
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.STATUS_DEAD)
+        self.assertEqual(event.attempts, 3)
+
+    def test_unreachable_endpoint_is_retried_then_dead_lettered(self):
+        with StubWebhookServer() as stub:
+            url = stub.url
+        self.subscribe(url)
+        record_status_change(self.packages[0], 'in_transit', 'Hub A')
+        dispatcher = self.dispatch()
+        self.assertEqual(dispatcher.delivered, 0)
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.STATUS_DEAD)
+
+    def test_outbox_rolls_back_with_the_change(self):
+        self.subscribe('http://127.0.0.1:9/hooks')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record_status_change(self.packages[0], 'in_transit', 'Hub A')
+            raise RuntimeError
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertFalse(self.packages[0].tracking_events.exists())
+
+    def test_packages_without_subscription_queue_nothing(self):
+        self.subscribe('http://127.0.0.1:9/hooks').delete()
+        record_status_change(self.packages[0], 'in_transit', 'Hub A')
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_api_created_packages_belong_to_the_key(self):
+        api_key = ApiKey(name='Other', scopes='create')
+        raw_key = api_key.generate_key()
+        api_key.save()
+        response = self.client.post(reverse('api_create_package'), json.dumps({
+            'sender': {'name': 'A', 'email': 'a@example.com', 'phone': '1', 'address': 'x'},
+            'receiver': {'name': 'B', 'email': 'b@example.com', 'phone': '2', 'address': 'y'},
+            'description': 'Shoes', 'weight': 1,
+        }), content_type='application/json', HTTP_API_KEY=raw_key)
+        self.assertEqual(response.status_code, 201)
+        package = Package.objects.get(tracking_number=response.json()['data']['tracking_number'])
+        self.assertEqual(package.api_key, api_key)
+
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class NotificationSchedulingTests(TestCase):
+
+    def setUp(self):
+        sender = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        receiver = Customer.objects.create(name='Receiver', email='r@example.com', phone='2', address='2 Road')
+        self.package = Package.objects.create(sender=sender, receiver=receiver, description='Books', weight=1)
+
+    def change(self, status):
+        queue_status_notifications([(self.package.pk, 'r@example.com', status, 'Hub A', '', timezone.now())])
+
+    def test_changes_join_the_pending_send(self):
+        self.change('in_transit')
+        self.change('out_for_delivery')
+        task = Task.objects.get()
+        self.assertEqual(task.args, ['r@example.com'])
+        self.assertEqual(StatusNotification.objects.filter(sent_at__isnull=True).count(), 2)
+
+    def test_new_change_reschedules_after_send_task_failed(self):
+        self.change('in_transit')
+        Task.objects.update(status=Task.STATUS_FAILED)
+        self.change('out_for_delivery')
+        queued = Task.objects.filter(status=Task.STATUS_QUEUED)
+        self.assertEqual(list(queued.values_list('args', flat=True)), [['r@example.com']])
+
+
+
+class ApiAuthTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        key_cache.clear()
+
+    def issue(self, scopes, **limits):
+        api_key = ApiKey(name='Partner', scopes=scopes, **limits)
+        raw_key = api_key.generate_key()
+        api_key.save()
+        return raw_key
+
+    def quote(self, raw_key):
+        return self.client.post(reverse('api_quote'), json.dumps({'items': [{'weight': 1}]}),
+                                content_type='application/json', HTTP_API_KEY=raw_key)
+
+    def test_quotes_need_the_bulk_scope(self):
+        self.assertEqual(self.quote(self.issue('create,track')).status_code, 403)
+        self.assertEqual(self.quote(self.issue('bulk')).status_code, 200)
+
+    def test_requests_past_the_burst_are_limited(self):
+        raw_key = self.issue('bulk', rate_limit=1, burst=3)
+        statuses = [self.quote(raw_key).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_a_burst_across_a_window_boundary_is_limited(self):
+        # Three requests per 180s window.
+        key, limiter = VerifiedKey(1, 'Partner', {'bulk'}, 1, 3), WindowRateLimiter()
+        with mock.patch('delivery.api_auth.time.time', return_value=180 * 1000 - 1):
+            self.assertEqual([limiter.allow(key)[0] for _ in range(3)], [True, True, True])
+        with mock.patch('delivery.api_auth.time.time', return_value=180 * 1000 + 1):
+            allowed, retry_after = limiter.allow(key)
+        self.assertFalse(allowed)
+        # A third of the previous window has to slide out first.
+        self.assertAlmostEqual(retry_after, 59, places=3)
+        with mock.patch('delivery.api_auth.time.time', return_value=180 * 1000 + 60):
+            self.assertEqual([limiter.allow(key)[0] for _ in range(2)], [True, False])
+
+    def test_full_key_cache_keeps_recent_entries(self):
+        keys = KeyCache()
+        keys.max_entries = 10
+        for number in range(10):
+            keys.set(f'key-{number}', number, 60)
+        keys.set('key-new', 'new', 60)
+        self.assertEqual(keys.get('key-0'), (False, None))
+        self.assertEqual(keys.get('key-9'), (True, 9))
+        self.assertEqual(keys.get('key-new'), (True, 'new'))
+
+
+
+class ImportTests(TestCase):
+
+    def write_rows(self, count, weights=()):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False)
+        self.addCleanup(os.remove, handle.name)
+        self.addCleanup(handle.close)
+        writer = csv.writer(handle)
+        writer.writerow([
+            'sender_name', 'sender_email', 'sender_phone', 'sender_address', 'receiver_name', 'receiver_email',
+            'receiver_phone', 'receiver_address', 'description', 'weight', 'service_tier',
+        ])
+        for number in range(count):
+            writer.writerow([
+                'Sender', 'sender@example.com', '1', '1 Road, Austin, TX', 'Receiver', 'receiver@example.com',
+                '2', '2 Road, Dallas, TX', f'Parcel {number}', weights[number] if weights else '1', 'standard',
+            ])
+        handle.flush()
+        return handle.name
+
+    def test_rows_outside_the_priced_weights_are_rejected(self):
+        path = self.write_rows(3, weights=['1e15', '0', '1'])
+        rejected = []
+        run_import(path, on_reject=lambda index, errors: rejected.append((index, list(errors))))
+        self.assertEqual(rejected, [(0, ['weight']), (1, ['weight'])])
+        self.assertEqual(Package.objects.count(), 1)
+
+    def test_resume_after_a_failed_checkpoint_write_imports_each_row_once(self):
+        path = self.write_rows(5)
+        original = ImportCheckpoint.objects.update_or_create
+        calls = []
+
+        def fail_second_save(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise DatabaseError('disk I/O error')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(ImportCheckpoint.objects, 'update_or_create', side_effect=fail_second_save):
+            with self.assertRaises(DatabaseError):
+                run_import(path, batch_size=2, checkpoint='resume-test')
+        self.assertEqual(Package.objects.count(), 2)
+
+        checkpoint = run_import(path, batch_size=2, checkpoint='resume-test')
+        self.assertEqual(checkpoint.imported, 5)
+        self.assertEqual(
+            sorted(Package.objects.values_list('description', flat=True)), [f'Parcel {number}' for number in range(5)]
+        )
+        # The batch rolled back with the failed checkpoint took its revenue with it.
+        today = timezone.localdate()
+        self.assertEqual(stored_revenue(today, today), raw_revenue(today, today))
+
+
+
+class RequestLogTests(TestCase):
+
+    def test_free_text_query_values_are_not_logged(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(REQUEST_LOG_PATH=f'{directory}/requests.log'):
+            middleware = RequestLogMiddleware(lambda request: HttpResponse())
+            middleware(RequestFactory().get(reverse('staff_search'), {'q': 'Jane Doe, 1 Main St', 'page': '2'}))
+            middleware.log.close()
+            with open(settings.REQUEST_LOG_PATH) as log:
+                [entry] = [json.loads(line) for line in log]
+        self.assertEqual(entry['query'], 'q=&page=2')
+        self.assertEqual(entry['view'], 'staff_search')
+
+
+class TrackingFilterTests(TestCase):
+
+    def test_warm_up_builds_the_filter_once(self):
+        customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        package = Package.objects.create(sender=customer, receiver=customer, description='Books', weight=1)
+        tracking_filter = TrackingNumberFilter()
+        with mock.patch('delivery.tracking_filter.tracking_filter', tracking_filter):
+            warm_tracking_filter()
+        self.assertIn(package.tracking_number, tracking_filter.bloom)
+        with self.assertNumQueries(0):
+            # A thread that waited for the warm-up's build finds it fresh.
+            tracking_filter.build(only_if_stale=True)
+            self.assertTrue(tracking_filter.might_exist(package.tracking_number))
+
+    @override_settings(TRACKING_FILTER_REBUILD_INTERVAL=1)
+    def test_stale_filter_is_rebuilt_while_lookups_use_the_old_one(self):
+        tracking_filter = TrackingNumberFilter()
+        tracking_filter.bloom = BloomFilter(1024, 3)
+        tracking_filter.bloom.add('OLDNUMBER123')
+        tracking_filter.built_at = tracking_filter.synced_at = time.monotonic() - 2
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            finish.wait(5)
+
+        with mock.patch.object(tracking_filter, '_build', slow_build):
+            self.assertTrue(tracking_filter.might_exist('OLDNUMBER123'))
+            self.assertTrue(started.wait(5))
+            # The rebuild is still running; lookups neither wait nor start another.
+            with self.assertNumQueries(0):
+                self.assertTrue(tracking_filter.might_exist('OLDNUMBER123'))
+            finish.set()
+
+
+
+class PaginationTests(TestCase):
+
+    def test_filtered_rows_past_the_estimate_threshold_stay_reachable(self):
+        customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        Package.objects.bulk_create([
+            Package(tracking_number=f'PAGINATE{number:04d}', verification_code='000000', sender=customer,
+                    receiver=customer, description='Books', weight=1, price=10, status='in_transit')
+            for number in range(25)
+        ])
+        paginator = EstimatedCountPaginator(Package.objects.filter(status='in_transit').order_by('pk'), 5)
+        paginator.estimate_above = 10
+        self.assertEqual((paginator.count, paginator.count_is_bounded), (10, True))
+        self.assertEqual(len(paginator.page(2)), 5)
+        self.assertEqual((paginator.count, paginator.count_is_bounded), (20, True))
+        self.assertEqual([package.tracking_number for package in paginator.page(5)][-1], 'PAGINATE0024')
+        self.assertEqual((paginator.count, paginator.count_is_bounded), (25, False))
+
+    def test_customer_name_prefix_search_uses_the_upper_name_index(self):
+        for name in ['Ada Lovelace', 'adam smith', 'Grace Hopper']:
+            Customer.objects.create(name=name, email='c@example.com', phone='1', address='1 Road')
+        customer_admin = CustomerAdmin(Customer, site)
+        request = RequestFactory().get('/')
+        matches, _ = customer_admin.get_search_results(request, Customer.objects.all(), 'ada')
+        self.assertEqual(sorted(customer.name for customer in matches), ['Ada Lovelace', 'adam smith'])
+        self.assertIn('customer_name_upper_idx', matches.order_by().explain())
+        matches, _ = customer_admin.get_search_results(request, Customer.objects.all(), 'c@example.com')
+        self.assertEqual(matches.count(), 3)
+
+
+
+class PackageAdminFormTests(TestCase):
+
+    @override_settings(PACKAGE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_admin_uploads_get_the_site_limits(self):
+        customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        package = Package.objects.create(sender=customer, receiver=customer, description='Books', weight=1)
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 200)).save(buffer, 'PNG')
+        data = {
+            'description': 'Books', 'weight': '1', 'service_tier': 'standard', 'payment_status': 'pending',
+            'sender': customer.pk, 'receiver': customer.pk, 'status': 'pending',
+        }
+        form = PackageAdminForm(
+            data, {'package_image': SimpleUploadedFile('big.png', buffer.getvalue(), 'image/png')}, instance=package
+        )
+        self.assertEqual(form.errors['package_image'], ["Image dimensions are too large."])
+
+
+
+class EtaTests(TestCase):
+    NY = '1 Road, Albany, NY 12207'
+    CA = '2 Street, Los Angeles, CA 90001'
+    TX = '3 Avenue, Austin, TX 73301'
+
+    def deliver(self, receiver_address, tier, days):
+        sender = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address=self.NY)
+        receiver = Customer.objects.create(name='Receiver', email='r@example.com', phone='2', address=receiver_address)
+        package = Package.objects.create(
+            sender=sender, receiver=receiver, description='Books', weight=1, service_tier=tier, status='delivered'
+        )
+        location = locations.resolve('Albany')
+        started = timezone.now() - timedelta(days=10)
+        TrackingEvent.objects.create(package=package, status='pending', location_id=location, timestamp=started)
+        TrackingEvent.objects.create(
+            package=package, status='delivered', location_id=location, timestamp=started + timedelta(days=days)
+        )
+
+    def test_quantile_table_matches_numpy_per_group(self):
+        rng = np.random.default_rng(7)
+        groups = rng.choice([0, 1, 3], size=200).astype(np.int32)
+        values = rng.gamma(2, 2, size=200).astype(np.float32)
+        table, counts = quantile_table(groups, values, 4)
+        self.assertEqual(counts.tolist(), [np.sum(groups == group) for group in range(4)])
+        for group in (0, 1, 3):
+            np.testing.assert_allclose(table[group], np.quantile(values[groups == group], LEVELS), rtol=1e-5)
+        self.assertTrue(np.isnan(table[2]).all())
+
+    @override_settings(ETA_MIN_SAMPLES=3)
+    def test_lanes_fall_back_to_their_tier_and_then_the_defaults(self):
+        for days in (1, 2, 3):
+            self.deliver(self.CA, 'express', days)
+        self.deliver(self.TX, 'express', 4)
+        engine = EtaEngine()
+        engine.build()
+
+        quantiles, basis, samples = engine.quantiles(self.NY, self.CA, 'express')
+        self.assertEqual((basis, samples), ('lane', 3))
+        self.assertAlmostEqual(float(quantiles[10]), 2, places=3)
+        self.assertEqual(engine.quantiles(self.NY, self.TX, 'express')[1:], ('tier', 4))
+        self.assertEqual(engine.quantiles(self.NY, self.TX, 'standard')[1:], ('default', 0))
+
+    def test_estimate_moves_forward_with_elapsed_time(self):
+        engine = EtaEngine()
+        engine.build()
+        now = timezone.now()
+        today = timezone.localdate(now)
+        fresh = engine.estimate(self.NY, self.CA, 'standard', created_at=now, now=now)
+        self.assertEqual(
+            (fresh.earliest, fresh.date, fresh.latest, fresh.basis),
+            (today + timedelta(days=3), today + timedelta(days=4), today + timedelta(days=5), 'default')
+        )
+        # Still moving after the usual transit time: never estimated in the past.
+        late = engine.estimate(self.NY, self.CA, 'standard', created_at=now - timedelta(days=6), now=now)
+        self.assertGreaterEqual(late.earliest, today)
+        self.assertLessEqual(late.earliest, late.date)
+        self.assertLessEqual(late.date, late.latest)
+
+    def test_stale_tables_are_rebuilt_while_lookups_use_the_old_ones(self):
+        engine = EtaEngine()
+        engine.build()
+        old_tables = engine.tables
+        engine.built_at -= settings.ETA_REBUILD_INTERVAL
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            finish.wait(5)
+
+        with mock.patch.object(engine, '_build', slow_build):
+            engine.quantiles(self.NY, self.CA, 'standard')
+            self.assertTrue(started.wait(5))
+            # The rebuild is still running; lookups neither wait nor start another.
+            with self.assertNumQueries(0):
+                self.assertEqual(engine.quantiles(self.NY, self.CA, 'standard')[1], 'default')
+            self.assertIs(engine.tables, old_tables)
+            finish.set()
+
+
+
+class BulkUpdateTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        self.packages = [
+            Package.objects.create(sender=self.customer, receiver=self.customer, description='Books', weight=1)
+            for _ in range(5)
+        ]
+
+    def test_status_is_moved_in_batches_past_delivered_packages(self):
+        Package.objects.filter(pk=self.packages[2].pk).update(status='delivered')
+        self.assertEqual(
+            [len(batch) for batch in iter_pk_batches(Package.objects.all(), batch_size=2)], [2, 2, 1]
+        )
+        self.assertEqual(bulk_update_status(Package.objects.all(), 'in_transit', 'Hub A', batch_size=2), 4)
+        self.assertEqual(
+            list(Package.objects.order_by('pk').values_list('status', flat=True)),
+            ['in_transit', 'in_transit', 'delivered', 'in_transit', 'in_transit']
+        )
+        self.assertFalse(TrackingEvent.objects.filter(package=self.packages[2]).exists())
+        self.assertEqual(TrackingEvent.objects.filter(status='in_transit').count(), 4)
+
+    def test_packages_delivered_after_the_batch_was_read_are_left_alone(self):
+        batches = list(iter_pk_batches(Package.objects.all()))
+        Package.objects.filter(pk=self.packages[0].pk).update(status='delivered')
+        with mock.patch('delivery.bulk.iter_pk_batches', return_value=batches):
+            self.assertEqual(bulk_update_status(Package.objects.all(), 'in_transit', 'Hub A'), 4)
+        self.packages[0].refresh_from_db()
+        self.assertEqual(self.packages[0].status, 'delivered')
+        self.assertFalse(TrackingEvent.objects.filter(package=self.packages[0]).exists())
+        self.assertFalse(StatusNotification.objects.filter(package=self.packages[0]).exists())
+        self.assertEqual(StatusNotification.objects.count(), 4)
+
+    def test_payment_status_moves_revenue_between_facts(self):
+        self.packages[0].payment_status = 'paid'
+        self.packages[0].save()
+        self.assertEqual(bulk_update_payment_status(Package.objects.all(), 'pending', 'paid', batch_size=2), 4)
+        today = timezone.localdate()
+        facts = stored_revenue(today, today)
+        self.assertEqual(facts, raw_revenue(today, today))
+        self.assertEqual(
+            facts, {(today, 'standard', 'paid'): (5, sum(round(package.price * 100) for package in self.packages))}
+        )
+
+
+
+@override_settings(PICKUP_DEFAULT_CAPACITY=2)
+class PickupAllocationTests(TransactionTestCase):
+    """Cached counts are adjusted on commit, so these tests commit for real"""
+
+    def setUp(self):
+        caches[settings.PICKUP_AVAILABILITY_CACHE].clear()
+        self.day, self.window = booking_days()[0], PickupSlot.WINDOW_CHOICES[0][0]
+
+    def remaining(self):
+        remaining = {(option.date, option.window): option.remaining for option in availability('NY')}
+        return remaining[(self.day, self.window)]
+
+    def test_a_full_slot_is_never_overbooked_and_release_frees_a_place(self):
+        self.assertEqual(self.remaining(), 2)
+        slots = [allocate('NY', self.day, self.window) for _ in range(2)]
+        self.assertNotIn(None, slots)
+        self.assertIsNone(allocate('NY', self.day, self.window))
+        self.assertEqual(PickupSlot.objects.get(area='NY').booked, 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.remaining(), 0)
+
+        release(slots[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.remaining(), 1)
+        self.assertIsNotNone(allocate('NY', self.day, self.window))
+        self.assertIsNone(allocate('NY', self.day, self.window))
+        self.assertEqual(PickupSlot.objects.get(area='NY').booked, 2)
+        self.assertEqual(self.remaining(), 0)
+
+
+
+class PricingTests(TestCase):
+
+    def reference_price(self, weight, tier):
+        """What Decimal arithmetic with round(total, 2) charges, as calculate_price always did"""
+        base, rate = settings.PRICING_TARIFFS.get(tier, settings.PRICING_TARIFFS[settings.PRICING_DEFAULT_TIER])
+        return round(Decimal(base) + Decimal(str(weight)) * Decimal(rate), 2)
+
+    def test_quotes_match_decimal_arithmetic(self):
+        # Half a cent rounds to the even cent either way, and a seventh
+        # decimal place is priced with Decimal rather than int64 units.
+        weights = ['0.0025', '0.0075', Decimal('1.25'), 3, 0.1, '2.0000005', '9999.99']
+        tiers = ['standard', 'standard', 'express', 'same_day', 'overnight', 'express', 'same_day']
+        expected = [self.reference_price(weight, tier) for weight, tier in zip(weights, tiers)]
+        self.assertEqual(expected[:2], [Decimal('10.00'), Decimal('10.00')])
+        self.assertEqual(tariff_engine.quote_many(weights, tiers), expected)
+        self.assertEqual([tariff_engine.quote(weight, tier) for weight, tier in zip(weights, tiers)], expected)
+
+    def test_weights_past_the_maximum_are_refused(self):
+        with self.assertRaises(ValueError):
+            tariff_engine.quote_many([MAX_WEIGHT + 1, Decimal('1e15')], ['standard', 'standard'])
+
+    def test_quote_api_validates_every_item(self):
+        api_key = ApiKey(name='Partner', scopes='bulk')
+        raw_key = api_key.generate_key()
+        api_key.save()
+
+        def quote(*items):
+            return self.client.post(reverse('api_quote'), json.dumps({'items': list(items)}),
+                                    content_type='application/json', HTTP_API_KEY=raw_key)
+
+        response = quote({'weight': '0.0025'}, {'weight': 2, 'service_tier': 'express'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['price'] for item in response.json()['data']['quotes']], ['10.00', '25.99'])
+        self.assertEqual(response.json()['data']['total'], '35.99')
+        for item in ({'weight': 0}, {'weight': '10000'}, {'weight': 'NaN'}, {'weight': 'heavy'},
+                     {'weight': 1, 'service_tier': 'overnight'}, {'service_tier': 'standard'}):
+            self.assertEqual(quote({'weight': 1}, item).status_code, 400, item)
+
+
+
+class RevenueFactTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        self.today = timezone.localdate()
+
+    def package(self, **fields):
+        return Package.objects.create(
+            sender=self.customer, receiver=self.customer, description='Books', weight=1, **fields
+        )
+
+    def assertFacts(self, expected):
+        facts = stored_revenue(self.today, self.today)
+        self.assertEqual(facts, raw_revenue(self.today, self.today))
+        self.assertEqual(facts, {(self.today, *key): value for key, value in expected.items()})
+
+    def test_facts_follow_packages_from_creation_to_deletion(self):
+        package = self.package()
+        self.assertFacts({('standard', 'pending'): (1, 1199)})
+
+        package.price = Decimal('15.00')
+        package.save()
+        self.assertFacts({('standard', 'pending'): (1, 1500)})
+
+        package.payment_status = 'paid'
+        package.save(update_fields=['payment_status'])
+        self.assertFacts({('standard', 'paid'): (1, 1500)})
+
+        other = self.package(service_tier='express', payment_status='paid')
+        self.assertFacts({('standard', 'paid'): (1, 1500), ('express', 'paid'): (1, 2299)})
+
+        bulk_update_payment_status(Package.objects.all(), 'paid', 'refunded', batch_size=1)
+        self.assertFacts({('standard', 'refunded'): (1, 1500), ('express', 'refunded'): (1, 2299)})
+
+        package.delete()
+        self.assertFacts({('express', 'refunded'): (1, 2299)})
+        Package.objects.filter(pk=other.pk).delete()
+        self.assertFacts({})
+
+    def test_saves_that_leave_revenue_fields_alone_do_not_move_facts(self):
+        package = self.package()
+        package.description = 'Records'
+        package.save(update_fields=['description'])
+        package.status = 'in_transit'
+        package.save()
+        self.assertFacts({('standard', 'pending'): (1, 1199)})
+
+
+
+class HubRollupTests(TestCase):
+
+    def test_events_are_folded_in_once_across_chunks(self):
+        customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        first, second = [
+            Package.objects.create(sender=customer, receiver=customer, description='Books', weight=1)
+            for _ in range(2)
+        ]
+        hub_a, hub_b = locations.resolve('Hub A'), locations.resolve('Hub B')
+        now = timezone.now()
+        base = truncate_hour(now) - timedelta(hours=3)
+        for package, status, location, minutes in [
+            (first, 'pending', hub_a, 10),
+            (second, 'pending', hub_a, 20),
+            (first, 'in_transit', hub_b, 70),
+            (second, 'picked_up', hub_a, 140),
+        ]:
+            TrackingEvent.objects.create(
+                package=package, status=status, location_id=location, timestamp=base + timedelta(minutes=minutes)
+            )
+
+        # The second chunk finds each package's previous scan in the first.
+        self.assertEqual([update_rollups(chunk_size=2) for _ in range(3)], [2, 2, 0])
+        hour = timedelta(hours=1)
+        self.assertEqual(
+            set(HubHourlyVolume.objects.values_list('hour', 'location', 'status', 'events')),
+            {(base, hub_a, 'pending', 2), (base + hour, hub_b, 'in_transit', 1),
+             (base + 2 * hour, hub_a, 'picked_up', 1)}
+        )
+        # One hour at hub A before the in-transit scan, two before the pickup.
+        self.assertEqual(
+            set(HubDwellTime.objects.values_list('hour', 'location', 'bucket', 'departures', 'dwell_seconds')),
+            {(base + hour, hub_a, 1, 1, 3600), (base + 2 * hour, hub_a, 2, 1, 7200)}
+        )
+
+        summary = hub_summary(hours=24, now=now)
+        self.assertEqual(
+            [(step['status'], step['events'], step['conversion']) for step in summary['funnel']],
+            [('pending', 2, None), ('picked_up', 1, 0.5), ('in_transit', 1, 1.0),
+             ('out_for_delivery', 0, 0.0), ('delivered', 0, None)]
+        )
+        hub = next(hub for hub in summary['hubs'] if hub['location_id'] == hub_a)
+        self.assertEqual((hub['events'], hub['mean_dwell_hours'], hub['dwell_histogram'][:3]), (3, 1.5, [0, 1, 1]))
+
+
+
+@skipUnless(connection.vendor == 'sqlite', "The FTS5 index only exists on SQLite")
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteFTSBackend()
+
+    def customer(self, name, phone='1'):
+        return Customer.objects.create(name=name, email='c@example.com', phone=phone, address='1 Road')
+
+    def package(self, sender, receiver, description='Books'):
+        return Package.objects.create(sender=sender, receiver=receiver, description=description, weight=1)
+
+    def test_saved_packages_and_customers_are_reindexed(self):
+        receiver = self.customer('Ada Lovelace', phone='(555) 010-2030')
+        package = self.package(self.customer('Sender'), receiver, description='Vintage records')
+        self.assertEqual(self.backend.search('lovel').ids, [package.pk])
+        self.assertEqual(self.backend.search('5550102030').ids, [package.pk])
+        self.assertEqual(self.backend.search(package.tracking_number.lower()).ids, [package.pk])
+
+        receiver.name = 'Ada Byron'
+        receiver.save()
+        self.assertEqual(self.backend.search('lovelace').ids, [])
+        self.assertEqual(self.backend.search('ada byron').ids, [package.pk])
+
+        package.description = 'Books'
+        package.save()
+        self.assertEqual(self.backend.search('vintage').ids, [])
+        package.delete()
+        self.assertEqual(self.backend.search('byron'), ([], 0))
+
+    def test_results_are_ranked_by_column_and_paginated(self):
+        nobody = self.customer('Nobody')
+        in_description = self.package(nobody, nobody, description='Hopper manuals')
+        to_receiver = self.package(nobody, self.customer('Grace Hopper'))
+        from_sender = self.package(self.customer('Grace Hopper'), nobody)
+        self.assertEqual(self.backend.search('hopper', limit=2), ([to_receiver.pk, from_sender.pk], 3))
+        self.assertEqual(self.backend.search('hopper', limit=2, offset=2), ([in_description.pk], 3))
+
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        sender = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        receiver = Customer.objects.create(name='Receiver', email='r@example.com', phone='2', address='2 Road')
+        self.packages = [
+            Package.objects.create(sender=sender, receiver=receiver, description=f'Parcel {number}', weight=1)
+            for number in range(3)
+        ]
+        hub = locations.resolve('Hub A')
+        for status in ('pending', 'in_transit'):
+            TrackingEvent.objects.create(package=self.packages[1], status=status, location_id=hub)
+
+    def test_csv_is_streamed_a_buffer_at_a_time(self):
+        stats = ExportStats()
+        with mock.patch('delivery.exports.EXPORT_BUFFER_SIZE', 1):
+            chunks = list(stream_packages(Package.objects.all(), fmt='csv', chunk_size=2, stats=stats))
+        # The header and each package arrive as their own chunk.
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual((stats.rows, stats.bytes), (3, sum(len(chunk) for chunk in chunks)))
+        rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual(
+            [row['tracking_number'] for row in rows], [package.tracking_number for package in self.packages]
+        )
+        self.assertEqual(rows[1]['receiver_email'], 'r@example.com')
+        self.assertEqual(
+            [(event['status'], event['location']) for event in json.loads(rows[1]['tracking_history'])],
+            [('pending', 'Hub A'), ('in_transit', 'Hub A')]
+        )
+
+    def test_ndjson_is_gzipped_one_record_per_line(self):
+        data = gzip.decompress(b''.join(stream_packages(Package.objects.all(), fmt='ndjson', compress=True)))
+        records = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([record['description'] for record in records], ['Parcel 0', 'Parcel 1', 'Parcel 2'])
+        self.assertEqual(records[0]['sender']['name'], 'Sender')
+        self.assertEqual(len(records[1]['tracking_history']), 2)
+        with self.assertRaises(ValueError):
+            list(stream_packages(Package.objects.all(), fmt='xml'))
+
+
+
+class LocationTests(TransactionTestCase):
+    """Ids are cached once committed, and the backfill test migrates the database, so these commit for real"""
+
+    def setUp(self):
+        locations.clear()
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets or executor.loader.graph.leaf_nodes())
+        return MigrationExecutor(connection).loader.project_state(targets).apps if targets else None
+
+    def tearDown(self):
+        self.migrate(None)
+        locations.clear()
+
+    def test_spellings_of_a_location_are_interned_once(self):
+        hub = locations.resolve(' Hub   A ')
+        self.assertEqual(locations.resolve_many(['hub a', 'HUB A', 'Depot', '']), {
+            'hub a': hub, 'HUB A': hub, 'Depot': Location.objects.get(key='depot').pk, '': None,
+        })
+        self.assertEqual(list(Location.objects.order_by('pk').values_list('name', flat=True)), ['Hub A', 'Depot'])
+        self.assertEqual(locations.resolve('', blank='Unknown'), Location.objects.get(name='Unknown').pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(locations.resolve('hub A'), hub)
+
+        # Ids read in a rolled-back transaction are not remembered.
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            locations.resolve('Van 7')
+            raise DatabaseError('rollback')
+        self.assertFalse(Location.objects.filter(key='van 7').exists())
+        self.assertNotIn('van 7', locations._ids)
+
+    def test_backfill_interns_free_text_locations(self):
+        apps = self.migrate([('delivery', '0009_locations')])
+        customer = apps.get_model('delivery', 'Customer').objects.create(
+            name='Sender', email='s@example.com', phone='1', address='1 Road'
+        )
+        Package = apps.get_model('delivery', 'Package')
+        package = Package.objects.create(
+            tracking_number='BACKFILL0001', verification_code='000000', sender=customer, receiver=customer,
+            description='Books', weight=1, current_location='  hub   a',
+        )
+        TrackingEvent = apps.get_model('delivery', 'TrackingEvent')
+        for location in ('Hub A', 'HUB A ', ''):
+            TrackingEvent.objects.create(package=package, status='in_transit', location=location, notes='')
+
+        apps = self.migrate([('delivery', '0011_location_foreign_keys')])
+        package = apps.get_model('delivery', 'Package').objects.get(tracking_number='BACKFILL0001')
+        self.assertEqual(package.current_location.name, 'hub a')
+        events = apps.get_model('delivery', 'TrackingEvent').objects.order_by('pk')
+        self.assertEqual(list(events.values_list('location__name', flat=True)), ['hub a', 'hub a', 'Unknown'])
+
+        # The live registry finds the backfilled rows under every spelling.
+        self.migrate(None)
+        self.assertEqual(locations.resolve('Hub A'), package.current_location_id)
+        self.assertEqual(Location.objects.count(), 2)
+
+
+
+class CourierAssignmentTests(TestCase):
+
+    def setUp(self):
+        self.courier = Courier.objects.create(name='Courier', zone='NY', capacity=1)
+        self.customer = Customer.objects.create(
+            name='Sender', email='s@example.com', phone='1', address='1 Road, Albany, NY 12207'
+        )
+
+    def package(self):
+        return Package.objects.create(sender=self.customer, receiver=self.customer, description='Books', weight=1)
+
+    def test_incremental_run_retries_packages_left_without_a_courier(self):
+        first, second = self.package(), self.package()
+        self.assertEqual(assign_couriers()['unassigned'], 1)
+        Package.objects.filter(pk=first.pk).update(status='in_transit')
+
+        result = assign_couriers(incremental=True)
+        self.assertEqual((result['pickups'], result['unassigned']), (1, 0))
+        second.refresh_from_db()
+        self.assertEqual(second.pickup_courier, self.courier)
+
+    def test_packages_that_moved_on_since_the_read_are_not_written(self):
+        package = self.package()
+        Package.objects.filter(pk=package.pk).update(status='in_transit')
+        write_assignments('pending', {package.pk: self.courier.pk})
+        package.refresh_from_db()
+        self.assertIsNone(package.pickup_courier)
+
+
+
+@override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+    'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+class PageCacheTests(TestCase):
+    """Pages go to a file cache in a scratch directory, which other processes can share"""
+
+    def setUp(self):
+        self.cache_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={**settings.CACHES, 'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.cache_dir,
+        }}))
+
+    def test_hits_carry_the_headers_of_the_miss(self):
+        miss = self.client.get(reverse('home'))
+        hit = self.client.get(reverse('home'))
+        self.assertEqual(miss['X-Page-Cache'], 'MISS')
+        self.assertEqual(hit['X-Page-Cache'], 'HIT')
+        self.assertEqual(hit['X-Frame-Options'], 'DENY')
+        ignored = {'X-Page-Cache', 'Date'}
+        self.assertEqual(
+            {header: value for header, value in miss.items() if header not in ignored},
+            {header: value for header, value in hit.items() if header not in ignored},
+        )
+        self.assertEqual(hit.content, miss.content)
+
+    def test_invalidation_in_another_process_reaches_this_one(self):
+        customer = Customer.objects.create(name='Sender', email='s@example.com', phone='1', address='1 Road')
+        package = Package.objects.create(sender=customer, receiver=customer, description='Books', weight=1)
+        path = reverse('track_package_detail', kwargs={'tracking_number': package.tracking_number})
+        self.client.get(path)
+        self.assertEqual(self.client.get(path)['X-Page-Cache'], 'HIT')
+
+        subprocess.run([
+            sys.executable, '-c',
+            'import django; django.setup(); '
+            'from delivery.page_cache import invalidate_tracking_pages; '
+            f'invalidate_tracking_pages([{package.tracking_number!r}])',
+        ], check=True, cwd=settings.BASE_DIR, env={
+            **os.environ, 'DJANGO_SETTINGS_MODULE': 'swifttrack.settings',
+            'SHARED_CACHE_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'SHARED_CACHE_LOCATION': self.cache_dir,
+        })
+        self.assertEqual(self.client.get(path)['X-Page-Cache'], 'MISS')
+
+    @override_settings(CACHES=settings.CACHES)
+    def test_off_while_the_cache_is_process_local(self):
+        self.client.get(reverse('home'))
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('home')))
+        self.assertIn('delivery.E001', [error.id for error in check_shared_caches(None)])
+
+
+
+class ViewQueryBudgetTests(ViewBudgetTestCase):
+    """Query budgets of the public pages and the package APIs"""
+
+    def setUp(self):
+        super().setUp()
+        api_key = ApiKey(name='Budget partner', scopes='create,track')
+        self.raw_key = api_key.generate_key()
+        api_key.save()
+
+    def test_home(self):
+        self.assertBudget('home', 2, lambda: self.client.get(reverse('home')))
+
+    def test_track_package(self):
+        self.assertBudget('track_package', 2, lambda: self.client.get(
+            reverse('track_package_detail', args=[self.packages[-1].tracking_number])
+        ))
+
+    def test_create_package(self):
+        self.client.force_login(self.user)
+        self.assertBudget('create_package', 12, lambda: self.client.post(reverse('create_package'), {
+            'receiver_name': 'Receiver', 'receiver_email': 'receiver@example.com', 'receiver_phone': '555-0102',
+            'receiver_address': '2 Budget Rd, Testville, TX 75002', 'description': 'Books', 'weight': '1.50',
+            'service_tier': 'standard',
+        }))
+
+    def test_claim_package(self):
+        self.assertBudget('claim_package', 1, lambda: self.client.post(reverse('claim_package'), {
+            'tracking_number': self.packages[-1].tracking_number, 'verification_code': '123456',
+        }))
+
+    def test_api_create_package(self):
+        self.assertBudget('api_create_package', 9, lambda: self.client.post(reverse('api_create_package'), json.dumps({
+            'sender': {'name': 'A', 'email': 'api-a@example.com', 'phone': '1', 'address': '1 Road, Austin, TX'},
+            'receiver': {'name': 'B', 'email': 'api-b@example.com', 'phone': '2', 'address': '2 Road, Dallas, TX'},
+            'description': 'Shoes', 'weight': 1,
+        }), content_type='application/json', HTTP_API_KEY=self.raw_key))
+
+    def test_api_track_package(self):
+        self.assertBudget('api_track_package', 2, lambda: self.client.get(
+            reverse('api_track_package', args=[self.packages[-1].tracking_number]), HTTP_API_KEY=self.raw_key
+        ))
+
+
+class AdminChangelistBudgetTests(ViewBudgetTestCase):
+    """Query budgets of the busiest admin changelists, at sizes where every list runs to several pages"""
+    SIZES = (60, 150, 300)
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+    def assertChangelistBudget(self, model, budget):
+        name = model._meta.model_name
+        self.assertBudget(f'admin_{name}_changelist', budget, lambda: self.client.get(
+            reverse(f'admin:delivery_{name}_changelist')
+        ))
+
+    def test_package_changelist(self):
+        self.assertChangelistBudget(Package, 6)
+
+    def test_tracking_event_changelist(self):
+        self.assertChangelistBudget(TrackingEvent, 6)
+
+    def test_customer_changelist(self):
+        self.assertChangelistBudget(Customer, 6)
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from .models import Package
+from .pagination import estimate_table_rows
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one BLAKE2b digest"""
+
+    def __init__(self, num_bits, num_hashes):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate, max_bytes):
+        """Size a filter for ``capacity`` items at ``fp_rate``, capped at ``max_bytes`` of bits"""
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+        num_bits = min(num_bits, max_bytes * 8)
+        num_hashes = round(num_bits / capacity * math.log(2))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def expected_fp_rate(self):
+        """Theoretical false-positive rate at the current fill"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class TrackingNumberFilter:
+    """
+    In-process front for tracking number lookups.
+
+    A Bloom filter of every issued tracking number answers "definitely not
+    issued" without a query. It is built by the warm-up when the worker
+    starts (or else by the first lookup), rebuilt in a background thread
+    every TRACKING_FILTER_REBUILD_INTERVAL seconds while lookups keep using
+    the old filter, and topped up from packages above the highest primary
+    key it has seen, at most once per TRACKING_FILTER_SYNC_INTERVAL. One
+    thread builds or tops up at a time, reading the database without holding
+    the lock lookups and add() take. Packages created in this process are
+    added immediately and flagged in TRACKING_FILTER_CACHE, which every
+    process shares, so other workers accept them before their next top-up.
+    Filter positives that turn out not to exist are remembered for
+    TRACKING_FILTER_NEGATIVE_TTL seconds.
+    """
+    recent_key = 'tracking-filter:recent:{}'
+    max_negative_entries = 100000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.bloom = None
+        self.high_water_pk = 0
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self._negative = {}
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.lookups = 0
+        self.definite_misses = 0
+        self.negative_hits = 0
+        self.false_positives = 0
+
+    @property
+    def enabled(self):
+        return settings.TRACKING_FILTER_ENABLED
+
+    def _stale(self):
+        return self.bloom is None or time.monotonic() - self.built_at >= settings.TRACKING_FILTER_REBUILD_INTERVAL
+
+    def build(self, only_if_stale=False):
+        """Rebuild the filter from every tracking number in the database"""
+        with self._refresh_lock:
+            if only_if_stale and not self._stale():
+                # Another thread rebuilt the filter while this one waited.
+                return
+            self._build()
+
+    def _build(self):
+        started = time.monotonic()
+        estimate = estimate_table_rows(Package) or 0
+        # Leave room for growth until the next scheduled rebuild.
+        bloom = BloomFilter.for_capacity(
+            int(estimate * 1.5) + 10000,
+            settings.TRACKING_FILTER_FP_RATE,
+            settings.TRACKING_FILTER_MAX_BYTES
+        )
+        high_water_pk = 0
+        rows = Package.objects.order_by().values_list('pk', 'tracking_number').iterator(chunk_size=10000)
+        for pk, tracking_number in rows:
+            bloom.add(tracking_number)
+            high_water_pk = max(high_water_pk, pk)
+
+        with self._lock:
+            self.bloom = bloom
+            self.high_water_pk = high_water_pk
+            self.built_at = self.synced_at = time.monotonic()
+            self._negative.clear()
+        logger.info(
+            "Built tracking number filter in %.2fs: %s",
+            time.monotonic() - started, self.stats()
+        )
+        # Lookup metrics cover one rebuild interval each.
+        self.reset_metrics()
+
+    def sync(self):
+        """Add packages created since the last build or sync, e.g. by other workers or bulk imports"""
+        # One thread refreshes; the others keep answering from the current filter.
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            rows = list(
+                Package.objects.filter(pk__gt=self.high_water_pk)
+                .order_by('pk').values_list('pk', 'tracking_number')
+            )
+            with self._lock:
+                for pk, tracking_number in rows:
+                    self.bloom.add(tracking_number)
+                    self.high_water_pk = pk
+                self.synced_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _rebuild_in_background(self):
+        try:
+            self._build()
+        except Exception:
+            logger.exception("Failed to rebuild the tracking number filter; the old one stays in use")
+        finally:
+            self._refresh_lock.release()
+            connection.close()
+
+    def _ensure_fresh(self):
+        if self.bloom is None:
+            # Nothing to answer from yet, so the first lookups wait for it.
+            self.build(only_if_stale=True)
+        elif self._stale() and self._refresh_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._rebuild_in_background, name='tracking-filter-rebuild', daemon=True
+            ).start()
+
+    def might_exist(self, tracking_number):
+        """Return False only when the tracking number was certainly never issued"""
+        if not self.enabled:
+            return True
+        self._ensure_fresh()
+        self.lookups += 1
+
+        if tracking_number not in self.bloom:
+            if time.monotonic() - self.synced_at >= settings.TRACKING_FILTER_SYNC_INTERVAL:
+                self.sync()
+                if tracking_number in self.bloom:
+                    return True
+            if caches[settings.TRACKING_FILTER_CACHE].get(self.recent_key.format(tracking_number)):
+                return True
+            self.definite_misses += 1
+            return False
+
+        expires = self._negative.get(tracking_number)
+        if expires is not None:
+            if expires > time.monotonic():
+                self.negative_hits += 1
+                return False
+            self._negative.pop(tracking_number, None)
+        return True
+
+    def record_miss(self, tracking_number):
+        """Note that a filter positive was not found in the database"""
+        if not self.enabled:
+            return
+        self.false_positives += 1
+        with self._lock:
+            if len(self._negative) >= self.max_negative_entries:
+                self._negative.clear()
+            self._negative[tracking_number] = time.monotonic() + settings.TRACKING_FILTER_NEGATIVE_TTL
+
+    def add(self, tracking_number):
+        """Register a newly created tracking number"""
+        if not self.enabled:
+            return
+        caches[settings.TRACKING_FILTER_CACHE].set(
+            self.recent_key.format(tracking_number), True,
+            settings.TRACKING_FILTER_SYNC_INTERVAL * 2 + 1
+        )
+        with self._lock:
+            self._negative.pop(tracking_number, None)
+            if self.bloom is not None:
+                self.bloom.add(tracking_number)
+
+    def stats(self):
+        bloom = self.bloom
+        absent_lookups = self.definite_misses + self.false_positives
+        return {
+            'items': bloom.count if bloom else 0,
+            'bytes': bloom.size_bytes if bloom else 0,
+            'hashes': bloom.num_hashes if bloom else 0,
+            'expected_fp_rate': round(bloom.expected_fp_rate(), 6) if bloom else None,
+            'observed_fp_rate': round(self.false_positives / absent_lookups, 6) if absent_lookups else None,
+            'lookups': self.lookups,
+            'definite_misses': self.definite_misses,
+            'negative_cache_hits': self.negative_hits,
+            'false_positives': self.false_positives,
+        }
+
+
+tracking_filter = TrackingNumberFilter()
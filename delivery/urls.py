@@ -7,6 +7,7 @@ urlpatterns = [
     path('track/', views.track_package, name='track_package'),
     path('track/<str:tracking_number>/', views.track_package, name='track_package_detail'),
     path('request-pickup/', views.request_pickup, name='request_pickup'),
+    path('request-pickup/slots.json', views.pickup_slots, name='pickup_slots'),
     path('create-package/', views.create_package, name='create_package'),
     path('package-success/<str:tracking_number>/', views.package_success, name='package_success'),
     path('claim-package/', views.claim_package, name='claim_package'),
@@ -14,8 +15,14 @@ urlpatterns = [
     path('update-status/<str:tracking_number>/', views.update_package_status, name='update_package_status'),
     path('services/', views.services, name='services'),
     path('contact/', views.contact, name='contact'),
+    path('analytics/hubs/', views.hub_analytics, name='hub_analytics'),
+    path('analytics/hubs.json', views.hub_analytics_json, name='hub_analytics_json'),
+    path('reports/revenue.<str:fmt>', views.revenue_report_view, name='revenue_report'),
+    path('dispatch/routes/', views.dispatch_routes, name='dispatch_routes'),
+    path('staff/search/', views.staff_search, name='staff_search'),
     
     # API endpoints
     path('api/packages/create/', api_views.create_package_api, name='api_create_package'),
     path('api/packages/track/<str:tracking_number>', api_views.track_package_api, name='api_track_package'),
+    path('api/quotes/', api_views.quote_api, name='api_quote'),
 ]
@@ -1,10 +1,41 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Package, Customer, TrackingEvent
+import csv
+import mimetypes
+import os
+import re
+from datetime import date
+from urllib.parse import quote
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from .analytics import hub_summary, rollup_status
+from .eta import eta_engine
+from .images import stage_upload
+from .locations import resolve_location
+from .models import Customer, Location, Package, TrackingEvent
+from .notifications import record_status_change
+from .pickups import allocate, allocate_first, availability, pickup_area, pickup_slot_label, pickup_slot_value, release
+from .revenue import REPORT_DIMENSIONS, REPORT_PERIODS, revenue_report
+from .routing import delivery_stops, plan_routes
+from .search import get_search_backend
+from .tasks import process_image, record_tracking_event, send_contact_message
+from .tracking_filter import tracking_filter
 from .forms import TrackingSearchForm, PickupRequestForm, ContactForm, CreatePackageForm, ClaimPackageForm, UpdateTrackingForm
 from django.utils import timezone
-from datetime import datetime, timedelta
+
+
+HOME_STATS_TTL = 300
+
+
+def _home_stats():
+    return Package.objects.count(), Package.objects.filter(status='delivered').count()
 
 
 def home(request):
@@ -12,8 +43,7 @@ def home(request):
     form = TrackingSearchForm()
     
     # Get some statistics for the homepage
-    total_packages = Package.objects.count()
-    delivered_packages = Package.objects.filter(status='delivered').count()
+    total_packages, delivered_packages = cache.get_or_set('home-stats', _home_stats, HOME_STATS_TTL)
     
     context = {
         'form': form,
@@ -28,8 +58,11 @@ def track_package(request, tracking_number=None):
     package = None
     tracking_events = []
     
-    if request.method == 'POST':
-        form = TrackingSearchForm(request.POST)
+    # The search form submits with GET so the page carries no CSRF token and
+    # stays cacheable; POST is still accepted from older pages.
+    search = request.POST if request.method == 'POST' else request.GET
+    if request.method == 'POST' or (not tracking_number and 'tracking_number' in search):
+        form = TrackingSearchForm(search)
         if form.is_valid():
             tracking_number = form.cleaned_data['tracking_number'].upper()
             return redirect('track_package_detail', tracking_number=tracking_number)
@@ -37,10 +70,17 @@ def track_package(request, tracking_number=None):
         form = TrackingSearchForm()
         
         if tracking_number:
-            try:
-                package = Package.objects.get(tracking_number=tracking_number.upper())
-                tracking_events = package.tracking_events.all()
-            except Package.DoesNotExist:
+            normalized = tracking_number.upper()
+            if tracking_filter.might_exist(normalized):
+                package = (
+                    Package.objects.select_related('sender', 'receiver', 'current_location')
+                    .filter(tracking_number=normalized).first()
+                )
+                if package is None:
+                    tracking_filter.record_miss(normalized)
+            if package:
+                tracking_events = package.tracking_events.select_related('location')
+            else:
                 messages.error(request, f'Package with tracking number {tracking_number} not found.')
     
     context = {
@@ -54,44 +94,60 @@ def track_package(request, tracking_number=None):
 def request_pickup(request):
     """Request pickup form page"""
     if request.method == 'POST':
-        form = PickupRequestForm(request.POST)
+        area = pickup_area(request.POST.get('sender_address', ''))
+        form = PickupRequestForm(request.POST, availability=availability(area))
         if form.is_valid():
-            # Create sender customer
-            sender = Customer.objects.create(
-                name=form.cleaned_data['sender_name'],
-                email=form.cleaned_data['sender_email'],
-                phone=form.cleaned_data['sender_phone'],
-                address=form.cleaned_data['sender_address']
-            )
-            
-            # Create receiver customer
-            receiver = Customer.objects.create(
-                name=form.cleaned_data['receiver_name'],
-                email=form.cleaned_data['receiver_email'],
-                phone=form.cleaned_data['receiver_phone'],
-                address=form.cleaned_data['receiver_address']
-            )
-            
-            # Create package
-            estimated_delivery = datetime.now().date() + timedelta(days=3)
-            package = Package.objects.create(
-                sender=sender,
-                receiver=receiver,
-                description=form.cleaned_data['description'],
-                weight=form.cleaned_data['weight'],
-                status='pending',
-                current_location='Awaiting Pickup',
-                estimated_delivery=estimated_delivery
-            )
-            
+            # Book the slot first, in its own short UPDATE, so a full slot
+            # is reported before anything is created.
+            chosen = form.cleaned_data['pickup_slot']
+            slot = allocate(area, *chosen) if chosen else allocate_first(area)
+            if slot is None:
+                form.add_error('pickup_slot', "That pickup slot has just filled up. Please choose another one."
+                               if chosen else "All pickup slots for your area are booked. Please try again later.")
+                form.offer_slots(availability(area))
+                return render(request, 'request_pickup.html', {'form': form})
+
+            try:
+                # Create sender customer
+                sender = Customer.objects.create(
+                    name=form.cleaned_data['sender_name'],
+                    email=form.cleaned_data['sender_email'],
+                    phone=form.cleaned_data['sender_phone'],
+                    address=form.cleaned_data['sender_address']
+                )
+
+                # Create receiver customer
+                receiver = Customer.objects.create(
+                    name=form.cleaned_data['receiver_name'],
+                    email=form.cleaned_data['receiver_email'],
+                    phone=form.cleaned_data['receiver_phone'],
+                    address=form.cleaned_data['receiver_address']
+                )
+
+                # Create package
+                estimated_delivery = eta_engine.estimate(sender.address, receiver.address, 'standard').date
+                package = Package.objects.create(
+                    sender=sender,
+                    receiver=receiver,
+                    description=form.cleaned_data['description'],
+                    weight=form.cleaned_data['weight'],
+                    status='pending',
+                    current_location_id=resolve_location('Awaiting Pickup'),
+                    estimated_delivery=estimated_delivery,
+                    pickup_slot=slot
+                )
+            except Exception:
+                release(slot)
+                raise
+
             # Create initial tracking event
             TrackingEvent.objects.create(
                 package=package,
                 status='pending',
-                location='Pickup Requested',
-                notes=f"Pickup requested for {form.cleaned_data.get('preferred_pickup_date', 'ASAP')}"
+                location_id=resolve_location('Pickup Requested'),
+                notes=f"Pickup booked for {pickup_slot_label(slot.date, slot.window)}"
             )
-            
+
             messages.success(
                 request,
                 f'Pickup request submitted successfully! Your tracking number is: {package.tracking_number}'
@@ -104,6 +160,22 @@ def request_pickup(request):
     return render(request, 'request_pickup.html', context)
 
 
+def pickup_slots(request):
+    """Bookable pickup slots for the area of ``address``, with the pickups each still takes, as JSON"""
+    area = pickup_area(request.GET.get('address', ''))
+    return JsonResponse({
+        'area': area,
+        'slots': [
+            {
+                'value': pickup_slot_value(option.date, option.window),
+                'label': pickup_slot_label(option.date, option.window, option.remaining),
+                'remaining': option.remaining,
+            }
+            for option in availability(area)
+        ],
+    })
+
+
 @login_required
 def create_package(request):
     """Create package view for authenticated users"""
@@ -126,15 +198,16 @@ def create_package(request):
                 address=form.cleaned_data['receiver_address']
             )
             
-            # Calculate delivery time based on service tier
-            tier_days = {
-                'standard': 4,
-                'express': 2,
-                'same_day': 0
-            }
-            days = tier_days.get(form.cleaned_data['service_tier'], 4)
-            estimated_delivery = datetime.now().date() + timedelta(days=days)
+            # Estimate delivery from past transit times on this lane
+            estimated_delivery = eta_engine.estimate(
+                sender.address, receiver.address, form.cleaned_data['service_tier']
+            ).date
             
+            # Store the upload now; re-encoding happens after the response
+            image_name = thumbnail_name = None
+            if form.cleaned_data.get('package_image'):
+                image_name, thumbnail_name = stage_upload(form.cleaned_data['package_image'])
+
             # Create package
             package = Package.objects.create(
                 sender=sender,
@@ -143,19 +216,24 @@ def create_package(request):
                 description=form.cleaned_data['description'],
                 weight=form.cleaned_data['weight'],
                 service_tier=form.cleaned_data['service_tier'],
-                package_image=form.cleaned_data.get('package_image'),
+                package_image=image_name,
+                package_thumbnail=thumbnail_name,
                 status='pending',
-                current_location='Processing',
+                current_location_id=resolve_location('Processing'),
                 estimated_delivery=estimated_delivery,
                 payment_status='paid'  # Simulated payment
             )
             
-            # Create initial tracking event
-            TrackingEvent.objects.create(
-                package=package,
-                status='pending',
-                location='Package Created',
-                notes=f"Package created via user dashboard. Service: {package.get_service_tier_display()}"
+            if image_name and not thumbnail_name:
+                process_image.enqueue(package.pk)
+
+            # Initial tracking event, written by the task worker
+            record_tracking_event.enqueue(
+                package.pk,
+                'pending',
+                'Package Created',
+                f"Package created via user dashboard. Service: {package.get_service_tier_display()}",
+                timezone.now().isoformat()
             )
             
             messages.success(
@@ -211,15 +289,15 @@ def confirm_claim(request, tracking_number):
     package.is_claimed = True
     package.claimed_at = timezone.now()
     package.status = 'delivered'
-    package.current_location = 'Delivered to Receiver'
+    package.current_location_id = resolve_location('Delivered to Receiver')
     package.save()
     
-    # Add tracking event
-    TrackingEvent.objects.create(
-        package=package,
-        status='delivered',
-        location='Destination',
-        notes=f"Package successfully claimed and received by the receiver."
+    # Add tracking event and let the receiver know
+    record_status_change(
+        package,
+        'delivered',
+        'Destination',
+        "Package successfully claimed and received by the receiver."
     )
     
     messages.success(request, f"Package {tracking_number} has been marked as received! 🎉")
@@ -236,7 +314,12 @@ def contact(request):
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
-            # In a real application, you would send an email here
+            send_contact_message.enqueue(
+                form.cleaned_data['name'],
+                form.cleaned_data['email'],
+                form.cleaned_data['subject'],
+                form.cleaned_data['message']
+            )
             messages.success(request, 'Thank you for your message! We will get back to you soon.')
             return redirect('contact')
     else:
@@ -266,23 +349,18 @@ def update_package_status(request, tracking_number):
             
             # Update package
             package.status = status
-            package.current_location = location
+            package.current_location_id = resolve_location(location)
             package.save()
             
-            # Create tracking event
-            TrackingEvent.objects.create(
-                package=package,
-                status=status,
-                location=location,
-                notes=notes or f"Status updated by sender."
-            )
+            # Create tracking event and let the receiver know
+            record_status_change(package, status, location, notes or "Status updated by sender.")
             
             messages.success(request, f"Tracking updated for {tracking_number}!")
             return redirect('dashboard')
     else:
         form = UpdateTrackingForm(initial={
             'status': package.status,
-            'current_location': package.current_location
+            'current_location': package.current_location.name if package.current_location_id else ''
         })
         
     context = {
@@ -292,6 +370,153 @@ def update_package_status(request, tracking_number):
     return render(request, 'delivery/update_status.html', context)
 
 
+def _analytics_window(request):
+    """The (hours, location_id) an analytics request asks for, clamped to what the rollups serve"""
+    try:
+        hours = min(max(int(request.GET.get('hours', 24)), 1), settings.ANALYTICS_MAX_HOURS)
+    except ValueError:
+        hours = 24
+    location = request.GET.get('location', '')
+    return hours, int(location) if location.isdigit() else None
+
+
+@login_required
+def hub_analytics(request):
+    """Per-hub scan volumes, dwell times and status funnel for superusers"""
+    if not request.user.is_superuser:
+        messages.error(request, "You do not have permission to view hub analytics.")
+        return redirect('dashboard')
+
+    hours, location_id = _analytics_window(request)
+    context = {
+        'summary': hub_summary(hours, location_id),
+        'rollups': rollup_status(),
+        'hours': hours,
+        'location_id': location_id,
+        'windows': [24, 24 * 7, 24 * 30],
+    }
+    return render(request, 'delivery/hub_analytics.html', context)
+
+
+@login_required
+def hub_analytics_json(request):
+    """The hub analytics summary as JSON"""
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Superuser access required'}, status=403)
+
+    hours, location_id = _analytics_window(request)
+    summary = hub_summary(hours, location_id)
+    summary['rollups'] = rollup_status()
+    return JsonResponse(summary)
+
+
+@login_required
+def dispatch_routes(request):
+    """Courier routes for a hub's out-for-delivery packages of one day, for staff"""
+    if not request.user.is_staff:
+        messages.error(request, "You do not have permission to plan routes.")
+        return redirect('dashboard')
+
+    hubs = Location.objects.filter(is_hub=True, latitude__isnull=False, longitude__isnull=False)
+    hub = hubs.filter(pk=request.GET['hub']).first() if request.GET.get('hub', '').isdigit() else hubs.first()
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+    except ValueError:
+        day = timezone.localdate()
+    couriers = request.GET.get('couriers', '')
+    couriers = min(int(couriers), 500) if couriers.isdigit() and int(couriers) > 0 else None
+
+    routes, unlocated = [], []
+    if hub is not None:
+        stops, unlocated = delivery_stops(hub, day)
+        routes = plan_routes((float(hub.latitude), float(hub.longitude)), stops, couriers)
+    context = {
+        'hubs': hubs,
+        'hub': hub,
+        'day': day,
+        'couriers': couriers,
+        'routes': routes,
+        'unlocated': unlocated,
+        'total_stops': sum(len(route.stops) for route in routes),
+        'total_km': round(sum(route.distance_km for route in routes), 1),
+    }
+    return render(request, 'delivery/dispatch_routes.html', context)
+
+
+@login_required
+def revenue_report_view(request, fmt):
+    """Packages and revenue per day, week or month by tier and payment status, as JSON or CSV"""
+    if fmt not in ('json', 'csv'):
+        raise Http404("Unknown report format")
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Superuser access required'}, status=403)
+
+    period = request.GET.get('period', 'day')
+    by = [dimension for dimension in request.GET.get('by', ','.join(REPORT_DIMENSIONS)).split(',') if dimension]
+    if period not in REPORT_PERIODS:
+        return JsonResponse({'error': f"period must be one of {', '.join(REPORT_PERIODS)}"}, status=400)
+    if not set(by) <= set(REPORT_DIMENSIONS):
+        return JsonResponse({'error': f"by must list some of {', '.join(REPORT_DIMENSIONS)}"}, status=400)
+    try:
+        start, end = (
+            date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+            for name in ('start', 'end')
+        )
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be dates (YYYY-MM-DD)'}, status=400)
+
+    rows = revenue_report(
+        period, start, end, by,
+        service_tier=request.GET.get('service_tier'),
+        payment_status=request.GET.get('payment_status')
+    )
+    if fmt == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="revenue-by-{period}.csv"'
+        writer = csv.DictWriter(response, fieldnames=['period', *by, 'packages', 'revenue'])
+        writer.writeheader()
+        writer.writerows(rows)
+        return response
+    return JsonResponse({'period': period, 'by': by, 'rows': rows})
+
+
+@login_required
+def staff_search(request):
+    """Packages matching ``q`` by tracking number, description or customer details, best first, as JSON"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'page must be a number'}, status=400)
+    page_size = settings.SEARCH_PAGE_SIZE
+
+    results = get_search_backend().search(query, limit=page_size, offset=(page - 1) * page_size)
+    packages = Package.objects.select_related('sender', 'receiver', 'current_location').in_bulk(results.ids)
+    return JsonResponse({
+        'query': query,
+        'page': page,
+        'pages': -(-results.total // page_size),
+        'total': results.total,
+        'results': [
+            {
+                'tracking_number': package.tracking_number,
+                'status': package.status,
+                'description': package.description,
+                'sender': package.sender.name,
+                'receiver': package.receiver.name,
+                'receiver_address': package.receiver.address,
+                'current_location': package.current_location.name if package.current_location else None,
+                'created_at': package.created_at.isoformat(),
+            }
+            # A package deleted since it was indexed is skipped.
+            for package in (packages.get(pk) for pk in results.ids) if package
+        ],
+    })
+
+
 @login_required
 def package_success(request, tracking_number):
     """Success page after package creation"""
@@ -301,3 +526,42 @@ def package_success(request, tracking_number):
         'package': package,
     }
     return render(request, 'delivery/package_success.html', context)
+
+
+# Uploads named by a content hash never change, so browsers may cache them forever.
+CONTENT_HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+
+
+def media_file(request, path):
+    """Serve an uploaded file, handing the bytes to the front-end server when configured"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Media file not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found")
+
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Last-Modified'] = http_date(stat.st_mtime)
+
+    if CONTENT_HASHED_NAME_RE.search(path):
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=3600)
+    return response
@@ -0,0 +1,56 @@
+import logging
+import time
+from pathlib import Path
+from django.db import DatabaseError
+from django.template import TemplateSyntaxError, engines
+
+logger = logging.getLogger(__name__)
+
+
+def _template_dirs(engine):
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            if hasattr(inner, 'get_dirs'):
+                yield from inner.get_dirs()
+
+
+def iter_template_names(engine):
+    """Yield the name of every .html template visible to a Django template engine"""
+    seen = set()
+    for directory in _template_dirs(engine):
+        root = Path(directory)
+        for path in sorted(root.rglob('*.html')):
+            name = path.relative_to(root).as_posix()
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+
+def warm_templates():
+    """Compile every template into the cached loader so first requests skip parsing"""
+    started = time.monotonic()
+    compiled = 0
+    for engine in engines.all():
+        if not hasattr(engine, 'engine'):
+            continue
+        for name in iter_template_names(engine.engine):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except TemplateSyntaxError:
+                # Fragments that only compile inside another template.
+                logger.debug("Skipped template %s during warm-up", name, exc_info=True)
+    logger.info("Warmed %d templates in %.2fs", compiled, time.monotonic() - started)
+    return compiled
+
+
+def warm_tracking_filter():
+    """Build the tracking number filter so the first lookups do not wait for it"""
+    from .tracking_filter import tracking_filter
+    if not tracking_filter.enabled:
+        return
+    try:
+        tracking_filter.build(only_if_stale=True)
+    except DatabaseError:
+        # E.g. migrations not applied yet; the first lookup builds it instead.
+        logger.exception("Could not build the tracking number filter during warm-up")
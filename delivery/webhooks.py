@@ -0,0 +1,276 @@
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Package, WebhookEvent, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPE = 'package.status_changed'
+SIGNATURE_HEADER = 'X-SwiftTrack-Signature'
+
+
+def queue_webhook_events(changes):
+    """
+    Write outbox rows for status changes of packages that partners subscribed to.
+
+    ``changes`` yields (package_id, status, location, notes, timestamp)
+    tuples. Call it inside the transaction that records the changes, so an
+    event is queued exactly when its change commits. Costs one query when no
+    subscription matches.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    subscriptions = {}
+    rows = (
+        Package.objects.filter(pk__in={change[0] for change in changes}, api_key__webhooks__is_active=True)
+        .values_list('pk', 'tracking_number', 'api_key__webhooks__pk')
+    )
+    for package_id, tracking_number, subscription_id in rows:
+        subscriptions.setdefault(package_id, []).append((tracking_number, subscription_id))
+    if not subscriptions:
+        return
+
+    events = []
+    for package_id, status, location, notes, timestamp in changes:
+        for tracking_number, subscription_id in subscriptions.get(package_id, ()):
+            events.append(WebhookEvent(
+                subscription_id=subscription_id,
+                payload={
+                    'type': EVENT_TYPE,
+                    'tracking_number': tracking_number,
+                    'status': status,
+                    'status_display': Package.STATUS_LABELS.get(status, status),
+                    'location': location,
+                    'notes': notes,
+                    'timestamp': timestamp.isoformat(),
+                },
+            ))
+    WebhookEvent.objects.bulk_create(events)
+
+
+def sign(secret, timestamp, body):
+    """Signature header value: HMAC-SHA256 over "<timestamp>.<body>" with the subscription secret"""
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def verify_signature(secret, header, body, tolerance=300):
+    """Check a signature header as a partner would, rejecting stale timestamps"""
+    try:
+        parts = dict(item.split('=', 1) for item in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), header)
+
+
+class DeliveryError(Exception):
+    pass
+
+
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class HttpClientPool:
+    """
+    Keep-alive HTTP(S) connections, one set per thread, reused across deliveries.
+
+    Each dispatcher thread owns its connections, so no locking is needed and
+    the number of open connections per host is bounded by the thread count.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc):
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = connection
+        return connection
+
+    def post(self, url, body, headers):
+        """POST and return the response status; raises DeliveryError on network failures"""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        # A pooled connection may have been closed by the server since its
+        # last use; retry once on a fresh one before giving up.
+        for attempt in (1, 2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.will_close:
+                    connection.close()
+                return response.status
+            except (http.client.HTTPException, OSError) as exc:
+                connection.close()
+                if attempt == 2 or not isinstance(exc, STALE_CONNECTION_ERRORS):
+                    raise DeliveryError(f"{type(exc).__name__}: {exc}") from exc
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at WEBHOOK_RETRY_MAX seconds"""
+    delay = min(settings.WEBHOOK_RETRY_BASE * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class WebhookDispatcher:
+    """
+    Delivers outbox events in signed batches over pooled connections.
+
+    The main thread claims and settles batches; a pool of
+    ``concurrency`` threads only does HTTP. Each subscription has at most
+    one batch in flight, so one slow partner cannot take more than one
+    thread. Retries can overtake newer events; each event carries its id
+    and timestamp so partners can order them. A batch that gets a 2xx
+    is deleted from the outbox. Otherwise its events are retried with
+    exponential backoff, and dead-lettered after WEBHOOK_MAX_ATTEMPTS.
+    Claims expire after WEBHOOK_LOCK_TIMEOUT seconds, so several
+    dispatcher processes can share the outbox and a crashed one's batches
+    are picked up again.
+    """
+
+    def __init__(self, concurrency=None, batch_size=None, poll_interval=1.0):
+        self.concurrency = concurrency or settings.WEBHOOK_CONCURRENCY
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.poll_interval = poll_interval
+        self.dispatcher_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.client = HttpClientPool(settings.WEBHOOK_TIMEOUT)
+        self.stopping = threading.Event()
+        self.delivered = 0
+        self.failed = 0
+        self.dead = 0
+        self.requests = 0
+
+    def stop(self):
+        self.stopping.set()
+
+    def claim_batch(self, subscription_id, now):
+        """Lock up to batch_size due events of one subscription; return them oldest first"""
+        due = (
+            WebhookEvent.objects.filter(
+                subscription_id=subscription_id,
+                status=WebhookEvent.STATUS_PENDING,
+                next_attempt_at__lte=now,
+            )
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+        )
+        pks = list(due.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+        locked_until = now + timedelta(seconds=settings.WEBHOOK_LOCK_TIMEOUT)
+        if not pks or not due.filter(pk__in=pks).update(locked_until=locked_until, locked_by=self.dispatcher_id):
+            return []
+        return list(
+            WebhookEvent.objects.filter(pk__in=pks, locked_by=self.dispatcher_id, locked_until=locked_until)
+            .order_by('pk')
+        )
+
+    def _due_subscriptions(self, now, busy, limit):
+        return list(
+            WebhookEvent.objects.filter(
+                status=WebhookEvent.STATUS_PENDING,
+                next_attempt_at__lte=now,
+                subscription__is_active=True,
+            )
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+            .exclude(subscription_id__in=busy)
+            .order_by('subscription_id').values_list('subscription_id', flat=True).distinct()[:limit]
+        )
+
+    def _send(self, subscription, events):
+        body = json.dumps(
+            {'delivery_id': uuid.uuid4().hex, 'events': [dict(event.payload, id=event.pk) for event in events]},
+            cls=DjangoJSONEncoder, separators=(',', ':')
+        ).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'SwiftTrack-Webhooks/1.0',
+            SIGNATURE_HEADER: sign(subscription.secret, int(time.time()), body),
+        }
+        status = self.client.post(subscription.url, body, headers)
+        if not 200 <= status < 300:
+            raise DeliveryError(f"HTTP {status}")
+
+    def _settle(self, events, error):
+        mine = WebhookEvent.objects.filter(pk__in=[event.pk for event in events], locked_by=self.dispatcher_id)
+        if error is None:
+            self.delivered += mine.delete()[0]
+            return
+        self.failed += len(events)
+        last_attempt = settings.WEBHOOK_MAX_ATTEMPTS - 1
+        dead = mine.filter(attempts__gte=last_attempt).update(
+            status=WebhookEvent.STATUS_DEAD, attempts=F('attempts') + 1,
+            locked_until=None, locked_by='', last_error=error
+        )
+        if dead:
+            self.dead += dead
+            logger.warning("Dead-lettered %s webhook events for %s: %s", dead, events[0].subscription_id, error)
+        # Events in one batch share their fate, so they share the backoff too.
+        attempts = min(event.attempts for event in events) + 1
+        mine.filter(attempts__lt=last_attempt).update(
+            attempts=F('attempts') + 1, locked_until=None, locked_by='', last_error=error,
+            next_attempt_at=timezone.now() + timedelta(seconds=retry_delay(attempts))
+        )
+
+    def run(self, drain=False):
+        """Deliver until stop() is called, or with ``drain`` until nothing is due"""
+        in_flight = {}
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='webhooks') as pool:
+            while not self.stopping.is_set():
+                close_old_connections()
+                for future in [future for future in in_flight if future.done()]:
+                    subscription, events = in_flight.pop(future)
+                    exc = future.exception()
+                    self._settle(events, None if exc is None else str(exc)[:2000])
+
+                now = timezone.now()
+                busy = {subscription.pk for subscription, _ in in_flight.values()}
+                free = self.concurrency - len(in_flight)
+                claimed = 0
+                for subscription_id in self._due_subscriptions(now, busy, free) if free else ():
+                    events = self.claim_batch(subscription_id, now)
+                    if not events:
+                        continue
+                    subscription = WebhookSubscription.objects.get(pk=subscription_id)
+                    in_flight[pool.submit(self._send, subscription, events)] = (subscription, events)
+                    self.requests += 1
+                    claimed += 1
+
+                if claimed:
+                    continue
+                if not in_flight:
+                    if drain:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                else:
+                    wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+            wait(in_flight)
+            for future, (subscription, events) in in_flight.items():
+                exc = future.exception()
+                self._settle(events, None if exc is None else str(exc)[:2000])
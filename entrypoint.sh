@@ -17,6 +17,9 @@ else
   echo "No pending migrations."
 fi
 
+# Refuse to start with a cache the workers cannot share (see CACHES in settings)
+python manage.py check --deploy --fail-level ERROR
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
@@ -0,0 +1,55 @@
+function showTab(tabName) {
+    // Hide all tabs
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.remove('active');
+    });
+    document.querySelectorAll('.tab-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+
+    // Show selected tab
+    const targetTab = document.getElementById(tabName + '-tab');
+    if (targetTab) targetTab.classList.add('active');
+
+    // Update button state
+    const targetBtn = document.querySelector(`.tab-btn[onclick*="${tabName}"]`);
+    if (targetBtn) targetBtn.classList.add('active');
+}
+
+function filterPackages(status, tabName) {
+    // Switch tab first
+    showTab(tabName);
+
+    // Update active stat card
+    document.querySelectorAll('.stat-card').forEach(card => card.classList.remove('active'));
+    if (status === 'all') {
+        document.getElementById(tabName + '-stat')?.classList.add('active');
+    } else if (status === 'pending') {
+        document.getElementById('pending-stat')?.classList.add('active');
+    }
+
+    // Filter items in that tab
+    const tab = document.getElementById(tabName + '-tab');
+    const items = tab.querySelectorAll('.package-item');
+
+    items.forEach(item => {
+        const itemStatus = item.getAttribute('data-status');
+        if (status === 'all') {
+            item.classList.remove('hidden');
+            item.style.opacity = '1';
+        } else if (status === 'pending') {
+            // For 'pending', we show everything NOT 'delivered'
+            if (itemStatus !== 'delivered') {
+                item.classList.remove('hidden');
+                item.style.opacity = '1';
+            } else {
+                item.classList.add('hidden');
+            }
+        }
+    });
+}
+
+function toggleDetails(header) {
+    const item = header.closest('.package-item');
+    item.classList.toggle('expanded');
+}
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'swifttrack.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from delivery.warmup import warm_templates, warm_tracking_filter  # noqa: E402
+
+if settings.TEMPLATE_WARMUP:
+    warm_templates()
+warm_tracking_filter()
@@ -51,11 +51,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'delivery',
     'accounts',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise
+    'delivery.request_log.RequestLogMiddleware',  # only when REQUEST_LOG_PATH is set
+    'delivery.compression.CompressionMiddleware',
+    'delivery.page_cache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,7 +74,7 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
+        'APP_DIRS': DEBUG,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -82,6 +86,17 @@ TEMPLATES = [
     },
 ]
 
+# Production template mode: compiled templates are kept for the life of the
+# worker and every template is compiled at boot (see delivery.warmup).
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+TEMPLATE_WARMUP = os.getenv('TEMPLATE_WARMUP', str(not DEBUG)) == 'True'
+
 WSGI_APPLICATION = 'swifttrack.wsgi.application'
 
 
@@ -91,11 +106,39 @@ WSGI_APPLICATION = 'swifttrack.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db' / 'db.sqlite3',
+        'NAME': os.getenv('DATABASE_PATH', BASE_DIR / 'db' / 'db.sqlite3'),
+        'OPTIONS': {
+            # Concurrent writers (gunicorn workers, the task and webhook
+            # processes) queue for the write lock instead of failing with
+            # "database is locked"; readers never wait for a writer.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# Cache
+# 'default' may be local to each process. 'shared' holds what every gunicorn
+# worker and the task worker must agree on, such as cached pages and their
+# invalidation, API rate limit counters and remaining pickup counts; point
+# SHARED_CACHE_BACKEND/SHARED_CACHE_LOCATION at Redis or Memcached in
+# production (docker-compose.yml does). `check --deploy` fails while it is
+# process-local, and the page cache stays off.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'shared': {
+        'BACKEND': os.getenv('SHARED_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', 'shared'),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -132,16 +175,18 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATIC_ROOT = BASE_DIR / 'staticfiles'  # For collectstatic
+STATIC_ROOT = os.getenv('STATIC_ROOT', BASE_DIR / 'staticfiles')  # For collectstatic
 
 # Whitenoise settings for optimized static file serving
-WHITENOISE_USE_FINDERS = True
+# In production only collected files are served: minified, fingerprinted and
+# precompressed, with far-future immutable caching for the hashed names.
+WHITENOISE_USE_FINDERS = DEBUG
 STORAGES = {
     'default': {
         'BACKEND': 'django.core.files.storage.FileSystemStorage',
     },
     'staticfiles': {
-        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+        'BACKEND': 'delivery.storage.MinifiedManifestStaticFilesStorage',
     },
 }
 
@@ -154,6 +199,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# How media responses are produced: 'django' streams the file from a worker,
+# 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd) only send
+# headers and let the front-end server send the bytes. For nginx, map
+# MEDIA_ACCEL_PREFIX to MEDIA_ROOT in an `internal` location (see the README)
+# before switching; the shipped containers run gunicorn with no front-end.
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600  # for content-hashed file names
+
+# Package images are re-encoded as bounded JPEGs with a thumbnail
+PACKAGE_IMAGE_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+PACKAGE_IMAGE_MAX_PIXELS = 40_000_000
+PACKAGE_IMAGE_MAX_DIMENSION = 1600
+PACKAGE_THUMBNAIL_SIZE = 320
+PACKAGE_IMAGE_QUALITY = 82
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -182,3 +243,112 @@ LOGGING = {
         },
     },
 }
+
+# API keys
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', '60'))  # seconds a verified key is trusted without a query
+API_KEY_NEGATIVE_CACHE_TTL = 5
+API_USAGE_FLUSH_INTERVAL = 10  # seconds between usage counter writes
+API_RATELIMIT_CACHE = 'shared'  # counted across all workers
+
+# Tracking number filter (in-process Bloom filter in front of tracking lookups)
+TRACKING_FILTER_ENABLED = os.getenv('TRACKING_FILTER_ENABLED', 'True') == 'True'
+TRACKING_FILTER_MAX_BYTES = int(os.getenv('TRACKING_FILTER_MAX_BYTES', str(16 * 1024 * 1024)))
+TRACKING_FILTER_FP_RATE = 0.01
+TRACKING_FILTER_SYNC_INTERVAL = 1  # seconds between top-ups from newer packages
+TRACKING_FILTER_REBUILD_INTERVAL = 3600
+TRACKING_FILTER_NEGATIVE_TTL = 30
+TRACKING_FILTER_CACHE = 'shared'  # flags numbers created since the other workers' last top-up
+
+# Delivery estimates learned from tracking histories (delivery/eta.py)
+ETA_WINDOW_DAYS = 90  # deliveries older than this are forgotten
+ETA_MIN_SAMPLES = 20  # per lane or tier before its own distribution is trusted
+ETA_SYNC_INTERVAL = 300  # seconds between top-ups from newer deliveries
+ETA_REBUILD_INTERVAL = 86400
+
+# Hub analytics, read from rollup tables kept current by `python manage.py update_rollups`
+ANALYTICS_ROLLUP_CHUNK_SIZE = 5000  # tracking events folded in per transaction
+ANALYTICS_MAX_HOURS = 24 * 90  # longest window the analytics page will sum
+
+# Prices per service tier: (base price, price per kg) in USD, as strings so
+# they stay exact. Quotes are rounded half to even to the cent.
+PRICING_TARIFFS = {
+    'standard': ('9.99', '2.00'),
+    'express': ('19.99', '3.00'),
+    'same_day': ('39.99', '4.00'),
+}
+PRICING_DEFAULT_TIER = 'standard'  # charged for unknown tiers
+QUOTE_MAX_ITEMS = 10000  # per request to the quote API
+
+# Pickup slots offered by the pickup request form (delivery/pickups.py)
+PICKUP_DEFAULT_CAPACITY = 40  # pickups per area and window until an admin sets a slot's own
+PICKUP_BOOKING_DAYS = 14  # days ahead that can be booked, starting tomorrow
+PICKUP_AVAILABILITY_TIMEOUT = 300  # seconds a cached remaining count may be trusted
+PICKUP_AVAILABILITY_CACHE = 'shared'  # so every worker shows the same remaining counts
+
+# Courier routes for out-for-delivery packages (delivery/routing.py)
+ROUTE_MAX_STOPS = 120  # stops per courier when the dispatcher does not set a courier count
+ROUTE_TWO_OPT_PASSES = 20  # improvement passes over each route at most
+
+# Courier assignment by `python manage.py assign_couriers` (delivery/assignment.py)
+COURIER_ASSIGNMENT_BATCH_SIZE = 500  # packages per UPDATE statement
+
+# Package search for the admin and the staff endpoint (delivery/search.py)
+SEARCH_BACKEND = 'delivery.search.SQLiteFTSBackend'  # DatabaseSearchBackend on other databases
+SEARCH_PAGE_SIZE = 20  # results per page of the staff endpoint
+SEARCH_ADMIN_MAX_RESULTS = 1000  # best-ranked matches the admin list shows
+
+# Anonymous full-page cache: URL name -> seconds a page is shared by the cache
+# and upstream proxies. Tracking pages are also invalidated on every change.
+PAGE_CACHE_ALIAS = 'shared'  # off unless this cache is shared by all processes
+PAGE_CACHE_TIMEOUTS = {
+    'home': 300,
+    'services': 3600,
+    'contact': 3600,
+    'track_package': 3600,
+    'track_package_detail': 60,
+}
+PAGE_CACHE_VARIANTS = ['', 'gzip', 'br']  # one cached copy per content coding
+
+# Compression of dynamic responses (static files are precompressed by whitenoise)
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11; higher qualities cost too much CPU per request
+
+# Background tasks, run by `python manage.py run_tasks` alongside the web workers
+TASKS_ALWAYS_EAGER = os.getenv('TASKS_ALWAYS_EAGER', 'False') == 'True'  # run in-process after commit, without a worker
+TASKS_POLL_INTERVAL = 1.0  # seconds between polls while idle
+TASKS_VISIBILITY_TIMEOUT = 300  # seconds before a claimed task may be run again
+TASKS_MAX_ATTEMPTS = 3
+TASKS_RETRY_DELAY = 10  # seconds before the first retry, doubled for each further one
+
+# Email (written to EMAIL_FILE_PATH until a real backend is configured)
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'SwiftTrack <noreply@swifttrack.local>')
+CONTACT_EMAIL = os.getenv('CONTACT_EMAIL', 'support@swifttrack.local')
+
+# Customer notifications for package status changes
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')  # for links in emails
+NOTIFICATION_BACKEND = 'delivery.notifications.EmailNotificationBackend'
+NOTIFICATION_COALESCE_WINDOW = 300  # seconds changes are collected before a batch is sent
+NOTIFICATION_MAX_PER_HOUR = 4  # batches per recipient; further changes wait and coalesce
+
+# Partner webhooks, delivered from the outbox by the dispatch_webhooks command
+WEBHOOK_BATCH_SIZE = 100  # events per request
+WEBHOOK_CONCURRENCY = 8  # requests in flight, at most one per subscription
+WEBHOOK_TIMEOUT = 5  # seconds to connect and to wait for a response
+WEBHOOK_MAX_ATTEMPTS = 8  # before an event is dead-lettered
+WEBHOOK_RETRY_BASE = 10  # seconds before the first retry, doubled for each further one
+WEBHOOK_RETRY_MAX = 3600
+WEBHOOK_LOCK_TIMEOUT = 60  # seconds before another dispatcher may take over a claimed batch
+
+# Structured request log for replay_requests; empty disables it
+REQUEST_LOG_PATH = os.getenv('REQUEST_LOG_PATH', '')
+
+# View performance tests (see delivery.benchmarks.ViewBudgetTestCase)
+PERFORMANCE_BASELINE = BASE_DIR / 'delivery' / 'performance_baseline.json'  # median ms per view
+PERFORMANCE_TIME_TOLERANCE = float(os.getenv('PERFORMANCE_TIME_TOLERANCE', '0'))  # allowed multiple of the baseline; 0 skips timing
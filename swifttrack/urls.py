@@ -17,13 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from delivery.views import media_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('delivery.urls')),
     path('accounts/', include('accounts.urls')),
+    # Served in every environment; see MEDIA_SERVE_MODE for front-end server handoff
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', media_file, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
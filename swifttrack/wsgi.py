@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'swifttrack.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+from delivery.warmup import warm_templates, warm_tracking_filter  # noqa: E402
+
+if settings.TEMPLATE_WARMUP:
+    warm_templates()
+warm_tracking_filter()
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Admin configuration for queued and failed background tasks"""
+    list_display = ['name', 'status', 'priority', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['=name']
+    readonly_fields = ['attempts', 'locked_until', 'locked_by', 'last_error', 'created_at']
+    actions = ['retry']
+
+    @admin.action(description="Retry selected tasks now")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Task.STATUS_RUNNING).update(
+            status=Task.STATUS_QUEUED,
+            attempts=0,
+            run_after=timezone.now(),
+            last_error=''
+        )
+        self.message_user(request, f"{updated} tasks queued for retry.")
@@ -0,0 +1,24 @@
+import signal
+from django.core.management.base import BaseCommand
+from taskqueue.queue import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks on a thread pool until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Tasks run concurrently')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls while idle')
+        parser.add_argument('--drain', action='store_true', help='Exit once no task is runnable')
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'])
+        # Finish the tasks in hand, then exit, on Ctrl-C or a container stop.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"Worker {worker.worker_id} running {options['threads']} threads")
+        worker.run(drain=options['drain'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker stopped: {worker.succeeded} succeeded, {worker.failed} failed"
+        ))
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    """A function registered with @task; call it directly or defer it with enqueue()"""
+
+    def __init__(self, func, name, priority, max_attempts, timeout):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        """Defer a call with these JSON-serialisable arguments"""
+        return self.enqueue_with(args, kwargs)
+
+    def enqueue_with(self, args=(), kwargs=None, priority=None, delay=0):
+        """
+        Defer a call, optionally overriding the priority or delaying it by seconds.
+
+        The task row is written in the caller's transaction, so it is queued
+        only if the surrounding work commits. With TASKS_ALWAYS_EAGER the call
+        runs in-process once the transaction commits and None is returned.
+        """
+        queued = self.enqueue_many([args], [kwargs], priority=priority, delay=delay)
+        return queued[0] if queued else None
+
+    def pending_first_args(self, values):
+        """Those of ``values`` that are the first argument of a queued or running call of this task"""
+        return set(
+            Task.objects.filter(
+                name=self.name, status__in=[Task.STATUS_QUEUED, Task.STATUS_RUNNING], args__0__in=list(values)
+            ).values_list('args__0', flat=True)
+        )
+
+    def enqueue_many(self, arg_lists, kwarg_dicts=None, priority=None, delay=0):
+        """Defer one call per argument list with a single multi-row INSERT"""
+        # Round-trip through JSON so eager and queued calls see the same arguments.
+        calls = json.loads(json.dumps([
+            [list(args), kwargs or {}]
+            for args, kwargs in zip(arg_lists, kwarg_dicts or [None] * len(arg_lists))
+        ]))
+        if settings.TASKS_ALWAYS_EAGER:
+            for args, kwargs in calls:
+                transaction.on_commit(lambda args=args, kwargs=kwargs: self.func(*args, **kwargs))
+            return []
+        run_after = timezone.now() + timedelta(seconds=delay)
+        return Task.objects.bulk_create([
+            Task(
+                name=self.name,
+                args=args,
+                kwargs=kwargs,
+                priority=self.priority if priority is None else priority,
+                max_attempts=self.max_attempts,
+                timeout=self.timeout,
+                run_after=run_after,
+            )
+            for args, kwargs in calls
+        ])
+
+
+def task(func=None, *, name=None, priority=Task.PRIORITY_NORMAL, max_attempts=None, timeout=None):
+    """
+    Register a function as a background task.
+
+    Tasks run at least once: a task whose worker dies, or that outlives its
+    visibility timeout, is run again, so task functions must be idempotent.
+    """
+    def decorator(func):
+        task_function = TaskFunction(
+            func,
+            name or f'{func.__module__}.{func.__qualname__}',
+            priority,
+            max_attempts or settings.TASKS_MAX_ATTEMPTS,
+            timeout or settings.TASKS_VISIBILITY_TIMEOUT,
+        )
+        _registry[task_function.name] = task_function
+        return task_function
+
+    return decorator(func) if func is not None else decorator
+
+
+def get_task(name):
+    return _registry.get(name)
+
+
+def claim_tasks(worker_id, limit):
+    """
+    Claim up to ``limit`` runnable tasks for a worker, most urgent first.
+
+    Runnable tasks are queued ones that are due, and running ones whose
+    visibility timeout expired. Each claim is a conditional UPDATE on the
+    state that was read, so concurrent workers on any database never claim
+    the same task; the loser simply moves on to the next candidate.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    runnable = (
+        Q(status=Task.STATUS_QUEUED, run_after__lte=now)
+        | Q(status=Task.STATUS_RUNNING, locked_until__lt=now)
+    )
+    candidates = (
+        Task.objects.filter(runnable)
+        .order_by('priority', 'run_after', 'pk')
+        .values_list('pk', 'status', 'locked_until', 'attempts', 'max_attempts', 'timeout')[:limit * 2]
+    )
+
+    claimed = []
+    for pk, status, locked_until, attempts, max_attempts, timeout in candidates:
+        if len(claimed) >= limit:
+            break
+        observed = Task.objects.filter(pk=pk, status=status, locked_until=locked_until)
+        if attempts >= max_attempts:
+            # Its last attempt timed out, most likely by killing its worker.
+            observed.update(
+                status=Task.STATUS_FAILED, locked_until=None, locked_by='',
+                last_error=f"Visibility timeout expired on attempt {attempts}"
+            )
+            continue
+        if observed.update(
+            status=Task.STATUS_RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed).order_by('priority', 'run_after', 'pk'))
+
+
+def run_task(task_row, worker_id):
+    """Run a claimed task; delete it on success, schedule a retry or mark it failed otherwise"""
+    task_function = get_task(task_row.name)
+    try:
+        if task_function is None:
+            raise LookupError(f"No task registered as {task_row.name!r}")
+        task_function.func(*task_row.args, **task_row.kwargs)
+    except Exception:
+        retry = task_row.attempts < task_row.max_attempts
+        delay = settings.TASKS_RETRY_DELAY * 2 ** (task_row.attempts - 1)
+        Task.objects.filter(pk=task_row.pk, locked_by=worker_id).update(
+            status=Task.STATUS_QUEUED if retry else Task.STATUS_FAILED,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            locked_until=None,
+            locked_by='',
+            last_error=traceback.format_exc()[-10000:],
+        )
+        logger.exception(
+            "Task %s #%s failed on attempt %s/%s%s", task_row.name, task_row.pk,
+            task_row.attempts, task_row.max_attempts, ", will retry" if retry else ""
+        )
+        return False
+    Task.objects.filter(pk=task_row.pk, locked_by=worker_id).delete()
+    return True
+
+
+class Worker:
+    """
+    Polls the task table and runs tasks on a thread pool.
+
+    The main thread claims as many tasks as there are idle threads, so a
+    worker never holds claims it cannot start. It polls every
+    TASKS_POLL_INTERVAL seconds while idle and immediately after a task
+    finishes.
+    """
+
+    def __init__(self, threads=4, poll_interval=None):
+        self.threads = threads
+        self.poll_interval = settings.TASKS_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stopping = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+
+    def stop(self):
+        self.stopping.set()
+
+    def _execute(self, task_row):
+        try:
+            succeeded = run_task(task_row, self.worker_id)
+        except Exception:
+            # Bookkeeping failed, e.g. the database went away; the claim
+            # expires and the task runs again.
+            logger.exception("Could not record the outcome of task %s #%s", task_row.name, task_row.pk)
+            succeeded = False
+        finally:
+            connections.close_all()
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def run(self, drain=False):
+        """Run until stop() is called, or with ``drain`` until no task is runnable"""
+        in_flight = set()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='task-worker') as pool:
+            while not self.stopping.is_set():
+                close_old_connections()
+                in_flight = {future for future in in_flight if not future.done()}
+                claimed = claim_tasks(self.worker_id, self.threads - len(in_flight))
+                for task_row in claimed:
+                    in_flight.add(pool.submit(self._execute, task_row))
+
+                if claimed:
+                    continue
+                if not in_flight:
+                    if drain:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                else:
+                    wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+            # Let running tasks finish; their claims would otherwise expire and rerun.
+            wait(in_flight)
+        close_old_connections()
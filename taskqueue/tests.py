@@ -0,0 +1,154 @@
+import io
+import tempfile
+from datetime import timedelta
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from delivery.models import Package
+from .models import Task
+from .queue import Worker, claim_tasks, run_task, task
+
+calls = []
+
+
+@task
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False, TASKS_RETRY_DELAY=0)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_stores_json_arguments(self):
+        queued = remember.enqueue({'a': 1})
+        self.assertEqual(queued.name, 'taskqueue.tests.remember')
+        self.assertEqual(queued.args, [{'a': 1}])
+        self.assertEqual(queued.status, Task.STATUS_QUEUED)
+        self.assertEqual(calls, [])
+
+    def test_enqueue_rejects_unserialisable_arguments(self):
+        with self.assertRaises(TypeError):
+            remember.enqueue(object())
+
+    def test_claims_by_priority(self):
+        remember.enqueue_with(['low'], priority=Task.PRIORITY_LOW)
+        remember.enqueue_with(['high'], priority=Task.PRIORITY_HIGH)
+        claimed = claim_tasks('w1', 1)
+        self.assertEqual([row.args for row in claimed], [['high']])
+
+    def test_delayed_tasks_wait(self):
+        remember.enqueue_with([1], delay=60)
+        self.assertEqual(claim_tasks('w1', 5), [])
+
+    def test_claimed_task_is_invisible_to_other_workers(self):
+        remember.enqueue(1)
+        self.assertEqual(len(claim_tasks('w1', 5)), 1)
+        self.assertEqual(claim_tasks('w2', 5), [])
+
+    def test_expired_claim_is_reclaimed(self):
+        remember.enqueue(1)
+        claim_tasks('w1', 1)
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_tasks('w2', 1)
+        self.assertEqual(len(reclaimed), 1)
+        self.assertEqual(reclaimed[0].locked_by, 'w2')
+        self.assertEqual(reclaimed[0].attempts, 2)
+
+    def test_expired_claim_on_last_attempt_fails(self):
+        explode.enqueue()
+        claim_tasks('w1', 1)
+        Task.objects.update(attempts=2, locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_tasks('w2', 1), [])
+        self.assertEqual(Task.objects.get().status, Task.STATUS_FAILED)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        explode.enqueue()
+        [row] = claim_tasks('w1', 1)
+        self.assertFalse(run_task(row, 'w1'))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Task.STATUS_QUEUED)
+        self.assertIn('boom', row.last_error)
+
+        [row] = claim_tasks('w1', 1)
+        self.assertFalse(run_task(row, 'w1'))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Task.STATUS_FAILED)
+        self.assertEqual(row.attempts, 2)
+
+    def test_unknown_task_fails(self):
+        Task.objects.create(name='missing.task', max_attempts=1)
+        [row] = claim_tasks('w1', 1)
+        self.assertFalse(run_task(row, 'w1'))
+        self.assertEqual(Task.objects.get().status, Task.STATUS_FAILED)
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(remember.enqueue(3))
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [3])
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False, TASKS_RETRY_DELAY=0)
+class WorkerTests(TransactionTestCase):
+    """Worker threads use their own connections, so these tests commit for real"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_and_deletes_tasks(self):
+        remember.enqueue(1)
+        remember.enqueue(2)
+        worker = Worker(threads=1, poll_interval=0)
+        worker.run(drain=True)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertEqual(worker.succeeded, 2)
+        self.assertFalse(Task.objects.exists())
+
+    def test_contact_form_enqueues_email(self):
+        response = self.client.post(reverse('contact'), {
+            'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Hello', 'message': 'Where is my parcel?'
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+
+        Worker(threads=1, poll_interval=0).run(drain=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].reply_to, ['ada@example.com'])
+
+    def test_create_package_defers_event_and_image(self):
+        user = User.objects.create_user('sender', 'sender@example.com', 'password')
+        self.client.force_login(user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (2400, 1800), (20, 120, 200)).save(buffer, 'PNG')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('create_package'), {
+                'receiver_name': 'Receiver', 'receiver_email': 'r@example.com',
+                'receiver_phone': '555', 'receiver_address': '1 Road',
+                'description': 'Books', 'weight': '2', 'service_tier': 'standard',
+                'package_image': SimpleUploadedFile('photo.png', buffer.getvalue(), 'image/png'),
+            })
+            self.assertEqual(response.status_code, 302)
+            package = Package.objects.get()
+            self.assertFalse(package.tracking_events.exists())
+            self.assertFalse(package.package_thumbnail)
+
+            Worker(threads=2, poll_interval=0).run(drain=True)
+            package.refresh_from_db()
+            self.assertEqual(package.tracking_events.get().location.name, 'Package Created')
+            with Image.open(package.package_image.path) as image:
+                self.assertLessEqual(max(image.size), 1600)
+            with Image.open(package.package_thumbnail.path) as thumbnail:
+                self.assertLessEqual(max(thumbnail.size), 320)